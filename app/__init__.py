@@ -3,6 +3,10 @@ from flask import Flask
 def create_app():
     app = Flask(__name__)
 
+    # Migrations run at deploy time (python app/migrations.py), never from a request
+    from app import db
+    db.MIGRATE_ON_OPEN = False
+
     from app.routes import main
     app.register_blueprint(main)
 
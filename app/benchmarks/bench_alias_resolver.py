@@ -0,0 +1,101 @@
+# bench_alias_resolver.py
+# -----------------------
+# Measures resolving the raw labels of a bulk import to standardized metric names:
+#   - before: the previous helpers.get_standardized_metric_name, one metric_aliases query per label
+#   - after:  helpers.AliasResolver.resolve_many, dictionary lookups after one load
+# Both must resolve every label spelled as stored to the same name; the resolver also resolves the labels
+# with another case, diacritics or spacing.
+#
+# Usage (from the repository root):
+#   python app/benchmarks/bench_alias_resolver.py [aliases=20000] [labels=50000]
+
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+# helpers.py uses flat imports (it is run from app/)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench_common import create_bench_database
+from db import read_connection
+from helpers import AliasResolver
+
+WORDS = ["datorii", "curente", "purtătoare", "dobândă", "împrumuturi", "bancare", "termen", "lung", "scurt",
+         "venituri", "cheltuieli", "profit", "active", "imobilizate", "creanțe", "stocuri", "numerar"]
+
+
+def fill_aliases(conn, count, seed=8):
+    rng = random.Random(seed)
+    aliases = {}
+    while len(aliases) < count:
+        alias = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))).capitalize()
+        aliases[alias] = f"Standard metric {len(aliases) % (count // 10 or 1)}"
+    conn.executemany("""
+        INSERT INTO metric_aliases (alias, standardized_metric, language, country, source)
+        VALUES (?, ?, 'ro', 'Romania', 'auto_generated')
+    """, aliases.items())
+    conn.commit()
+    return list(aliases)
+
+
+def resolve_per_label(db_path, labels):
+    """The previous get_standardized_metric_name, called once per label."""
+    results = []
+    for label in labels:
+        with read_connection(db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT standardized_metric FROM metric_aliases WHERE alias = ?", (label,))
+            result = cursor.fetchone()
+        results.append(result[0] if result else None)
+    return results
+
+
+def _respell(label, rng):
+    roll = rng.random()
+    if roll < 0.3:
+        return label.upper()
+    if roll < 0.6:
+        return "  " + label.replace(" ", "   ") + " "
+    return label.replace("ă", "a").replace("â", "a").replace("î", "i").replace("ț", "t")
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        result = func()
+    elapsed = time.perf_counter() - start
+    print(f"   {label:<45} {elapsed * 1000:10.0f} ms")
+    return result, elapsed
+
+
+def main():
+    count, total = [int(a) for a in sys.argv[1:3]] + [20000, 50000][len(sys.argv[1:3]):]
+    rng = random.Random(9)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        conn = create_bench_database(db_path)
+        aliases = fill_aliases(conn, count)
+        conn.close()
+        labels = [rng.choice(aliases) for _ in range(total)]
+        print(f"📊 {count} aliases, {total} labels to resolve")
+
+        before, before_time = timed("before: one query per label", lambda: resolve_per_label(db_path, labels))
+        resolver = AliasResolver(db_path)
+        timed("after: first load", lambda: resolver.refresh(force=True))
+        after, after_time = timed("after: resolve_many", lambda: resolver.resolve_many(labels))
+        respelled = [_respell(label, rng) for label in labels]
+        fuzzy, _ = timed("after: resolve_many, respelled labels", lambda: resolver.resolve_many(respelled))
+
+    assert before == after, "different standardized names"
+    assert fuzzy == after, "respelled labels resolve differently"
+    print(f"⚡ Speed-up: {before_time / after_time:.0f}x")
+    print(f"✅ Same standardized names for {total} labels, and for their respelled variants")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# bench_analysis_page.py
+# ----------------------
+# Measures the per-request data loading latency of the /analysis/<ticker> page:
+#   - before: every data_handler call opens its own connection (the old route)
+#   - after:  get_analysis_page_data() assembles the page through one connection
+#
+# Usage (from the repository root):
+#   python app/benchmarks/bench_analysis_page.py AQ 50
+
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from statistics import mean, median
+
+# Add the repository root to Python's module search path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.data_handler import (
+    get_company_details_from_db,
+    get_latest_stock_indicators,
+    get_latest_net_income,
+    get_next_earnings_date,
+    get_latest_variation_changes,
+    get_latest_price_variation,
+    get_historical_stock_data,
+    get_revenue_qtl_and_change_data,
+    get_chart_comment,
+    get_financial_statement,
+    get_grouped_financial_ratios,
+    get_dividends,
+    get_analysis_page_data,
+    ANALYSIS_CHART_COMMENTS,
+    ANALYSIS_STATEMENTS,
+)
+
+
+def load_page_per_call(ticker, period_type="annual", aggr_type="cml"):
+    """The old /analysis/<ticker> sequence: one connection per data_handler call."""
+    get_company_details_from_db(ticker)
+    get_latest_stock_indicators(ticker)
+    get_latest_net_income(ticker)
+    get_next_earnings_date(ticker)
+    get_latest_variation_changes(ticker)
+    get_latest_price_variation(ticker)
+    get_historical_stock_data(ticker)
+    revenue_data = get_revenue_qtl_and_change_data(ticker)
+    latest_quarter = revenue_data["periods"][-1] if revenue_data and revenue_data["periods"] else "N/A"
+    for chart_type in ANALYSIS_CHART_COMMENTS.values():
+        get_chart_comment(ticker, chart_type, latest_quarter)
+    for statement_name in ANALYSIS_STATEMENTS.values():
+        get_financial_statement(ticker, statement_name, period_type, aggr_type)
+    get_grouped_financial_ratios(ticker, period_type, aggr_type)
+    get_dividends(ticker)
+
+
+def load_page_bundle(ticker, period_type="annual", aggr_type="cml"):
+    get_analysis_page_data(ticker, period_type, aggr_type)
+
+
+def time_loader(loader, ticker, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):  # data_handler prints a lot of debug output
+            loader(ticker)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    ticker = sys.argv[1] if len(sys.argv) > 1 else "AQ"
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    # Warm-up so both variants run against a hot page cache
+    time_loader(load_page_per_call, ticker, 2)
+    time_loader(load_page_bundle, ticker, 2)
+
+    print(f"📊 /analysis/{ticker} data loading, {iterations} iterations")
+    results = {}
+    for label, loader in [("before (connection per call)", load_page_per_call),
+                          ("after (single connection)", load_page_bundle)]:
+        timings = time_loader(loader, ticker, iterations)
+        results[label] = median(timings)
+        print(f"   {label:<30} mean {mean(timings):8.2f} ms | median {median(timings):8.2f} ms | min {min(timings):8.2f} ms")
+
+    before, after = results.values()
+    print(f"⚡ Speed-up (median): {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# bench_bulk_statements.py
+# ------------------------
+# Measures loading the three statements of many companies on a synthetic universe:
+#   - before: one get_financial_statement call per ticker and statement (what a peer-comparison screen
+#             does through /pl_data, /bs_data and /cf_data)
+#   - after:  get_bulk_financial_statements (one query, one pivot), as streamed by /statements_data
+# Both must return the same rows. Also reports how soon the first company is ready.
+#
+# Usage (from the repository root):
+#   python app/benchmarks/bench_bulk_statements.py [companies=30] [years=20] [metrics=60]
+
+import io
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+# data_handler.py uses flat imports when run from app/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench_common import create_bench_database
+from bench_display_periods import STATEMENTS, fill_synthetic_universe
+from data_handler import get_bulk_financial_statements, get_financial_statement
+from migrations import apply_migrations
+
+
+def per_ticker_calls(conn, tickers, period_type, aggr_type):
+    return {
+        ticker: {
+            statement_name: get_financial_statement(ticker, statement_name, period_type, aggr_type, conn=conn)
+            for statement_name in STATEMENTS
+        }
+        for ticker in tickers
+    }
+
+
+def bulk_call(conn, tickers, period_type, aggr_type):
+    return dict(get_bulk_financial_statements(tickers, STATEMENTS, period_type, aggr_type, conn=conn))
+
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        result = func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"   {label:<45} {elapsed * 1000:10.1f} ms")
+    return result, elapsed
+
+
+def main():
+    companies, years, metrics = [int(a) for a in sys.argv[1:4]] + [30, 20, 60][len(sys.argv[1:4]):]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = create_bench_database(os.path.join(tmp, "bench.db"))
+        tickers, rows = fill_synthetic_universe(conn, companies, years, metrics, ratios=3)
+        with redirect_stdout(io.StringIO()):
+            apply_migrations(conn)
+        print(f"📊 Synthetic universe: {companies} companies × {years} years × {metrics} metrics = {rows:,} rows")
+
+        for period_type, aggr_type in [("annual", "cml"), ("quarter", "qtl")]:
+            print(f"🔎 {period_type}/{aggr_type}, 3 statements × {companies} tickers")
+            before, before_time = timed(f"before: {3 * companies} per-statement calls", per_ticker_calls,
+                                        conn, tickers, period_type, aggr_type)
+            after, after_time = timed("after: one bulk call", bulk_call, conn, tickers, period_type, aggr_type)
+            _, first_time = timed("after: first company ready", lambda: next(iter(
+                get_bulk_financial_statements(tickers, STATEMENTS, period_type, aggr_type, conn=conn))))
+            assert before == after, "bulk and per-statement rows differ"
+            print(f"⚡ Speed-up: {before_time / after_time:.1f}x")
+        conn.close()
+
+    print("✅ Bulk rows identical to the per-statement endpoints")
+
+
+if __name__ == "__main__":
+    main()
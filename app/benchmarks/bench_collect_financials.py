@@ -0,0 +1,173 @@
+# bench_collect_financials.py
+# ---------------------------
+# Measures the extraction of a decade of quarterly reports (PL, BS and CF sheets) for one ticker:
+#   - before: the previous extract_data_to_list, file by file and statement by statement: load_workbook to list
+#             the sheets, pd.read_excel per sheet, one rapidfuzz extractOne per new row against every value of the
+#             mapping (every prompt answered "y", the mapping file rewritten on every change)
+#   - after:  collect_financials.collect_batch: one read-only pass per workbook for all statements, a process
+#             pool, one cdist per file
+# Both must export the same statements and end with the same metric mapping.
+#
+# The workbooks are synthetic: the metric names of the WINE_*_extracted.xlsx files at the repository root,
+# with random spelling variations (diacritics, case, typos) so that fuzzy matching has work to do.
+#
+# Usage (from the repository root):
+#   python app/benchmarks/bench_collect_financials.py [quarters=40] [workers=4]
+
+import io
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import date
+
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from rapidfuzz import fuzz, process
+
+# collect_financials.py is a script run from app/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import collect_financials as cf
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+STATEMENTS = ["PL", "BS", "CF"]
+DIACRITICS = {"a": "ă", "i": "î", "s": "ș", "t": "ț"}
+
+
+def _variant(name, rng):
+    """The name as a report might spell it: diacritics, capitalised, or with a typo."""
+    roll = rng.random()
+    if roll < 0.3:
+        return "".join(DIACRITICS.get(c, c) if rng.random() < 0.3 else c for c in name)
+    if roll < 0.5:
+        return name.capitalize()
+    if roll < 0.6 and len(name) > 12:
+        i = rng.randrange(len(name) - 1)
+        return name[:i] + name[i + 1:]
+    return name
+
+
+def write_reports(folder, quarters, seed=3):
+    rng = random.Random(seed)
+    names = {
+        stmt: [n for n in pd.read_excel(os.path.join(ROOT, f"WINE_{stmt}_extracted.xlsx")).iloc[:, 0] if isinstance(n, str)]
+        for stmt in STATEMENTS
+    }
+    ends = pd.date_range(end=date(2024, 12, 31), periods=quarters, freq="QE")
+    for end in ends:
+        wb = Workbook()
+        wb.remove(wb.active)
+        for stmt in STATEMENTS:
+            ws = wb.create_sheet(f"{stmt}_{end:%Y%m%d}")
+            ws.append(["Indicator", end.strftime("%d.%m.%Y"), (end - pd.DateOffset(years=1)).strftime("%d.%m.%Y")])
+            for name in names[stmt]:
+                ws.append([_variant(name, rng), rng.randint(-10**8, 10**8), rng.choice([rng.randint(-10**8, 10**8), None, "-"])])
+        wb.save(os.path.join(folder, f"WINE_{end:%d.%m.%Y}.xlsx"))
+    return len(ends)
+
+
+def clean_metric_name_before(raw):
+    mapping = {'ă':'a','â':'a','î':'i','ș':'s','ş':'s','ț':'t','ţ':'t',
+               'Ă':'A','Â':'A','Î':'I','Ș':'S','Ş':'S','Ț':'T','Ţ':'T'}
+    no_diac = ''.join(mapping.get(c, c) for c in raw.strip().lower())
+    return re.sub(r'[^a-z0-9 ]+', '', no_diac)
+
+
+def fuzzy_find_or_insert_metric_before(raw_name, values, interactive=True, threshold=cf.GLOBAL_MATCHING_THRESHOLD):
+    """fuzzy_find_or_insert_metric as it was, reduced to the branches taken when every prompt is answered "y"."""
+    if not cf.is_valid_line(raw_name, values):
+        return None
+    cleaned = clean_metric_name_before(raw_name)
+    if cleaned in cf.metric_mapping:
+        return cf.metric_mapping[cleaned]
+    if not interactive:
+        cf.metric_mapping[cleaned] = cleaned
+        return cleaned
+    existing = list(cf.metric_mapping.values())
+    if existing:
+        match, score, _ = process.extractOne(cleaned, existing, scorer=fuzz.token_sort_ratio)
+        if score >= threshold:
+            cf.metric_mapping[cleaned] = match
+            cf.save_metric_mappings()
+            return match
+    cf.metric_mapping[cleaned] = cleaned
+    cf.save_metric_mappings()
+    return cleaned
+
+
+def extract_data_to_list_before(fp, stmt, interactive=True):
+    """extract_data_to_list as it was: the workbook opened twice, every sheet read again with pandas."""
+    wb = load_workbook(fp, data_only=True)
+    records = []
+    for sh in wb.sheetnames:
+        if not re.match(rf"{stmt}_\d{{8}}", sh): continue
+        df = pd.read_excel(fp, sheet_name=sh)
+        df.columns = [df.columns[0]] + [cf.normalize_period_string(c) for c in df.columns[1:]]
+        for idx, row in df.iterrows():
+            raw = str(row.iloc[0])
+            vals = [row.iloc[1], row.iloc[2]]
+            norm = fuzzy_find_or_insert_metric_before(raw, vals, interactive)
+            if not norm: continue
+            for col, val in zip(df.columns[1:], vals):
+                if pd.isna(val): continue
+                dnorm = cf.normalize_period_string(col)
+                if not dnorm: continue
+                records.append({'metric_name_ro': norm, 'period_end': dnorm, 'value': cf.parse_value(val)})
+    return records
+
+
+def collect_before(folder):
+    cf.metric_mapping.clear()
+    cf.metric_mapping.update(cf.load_metric_mappings())
+    pivots = {}
+    for stmt in STATEMENTS:
+        records = []
+        for i, fp in enumerate(cf.list_report_files(folder)):
+            records.extend(extract_data_to_list_before(fp, stmt, interactive=i > 0))
+        pivots[stmt] = cf.export_records(records, "WINE", stmt)
+    cf.save_metric_mappings()
+    return pivots, dict(cf.metric_mapping)
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        result = func()
+    elapsed = time.perf_counter() - start
+    print(f"   {label:<45} {elapsed * 1000:10.0f} ms")
+    return result, elapsed
+
+
+def main():
+    quarters, workers = [int(a) for a in sys.argv[1:3]] + [40, 4][len(sys.argv[1:3]):]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        reports = os.path.join(tmp, "reports")
+        os.makedirs(reports)
+        files = write_reports(reports, quarters)
+        print(f"📊 {files} synthetic quarterly workbooks × {len(STATEMENTS)} statements")
+
+        cwd = os.getcwd()
+        os.chdir(tmp)  # exports and metric_mapping.json land here
+        try:
+            (before, before_mapping), before_time = timed("before: sequential, two reads per workbook", lambda: collect_before(reports))
+            os.remove(cf.METRIC_MAPPING_FILE)
+            after, after_time = timed(f"after: collect_batch, {workers} workers",
+                                      lambda: cf.collect_batch("WINE", STATEMENTS, reports, workers))
+            after_mapping = dict(cf.metric_mapping)
+        finally:
+            os.chdir(cwd)
+
+    for stmt in STATEMENTS:
+        pd.testing.assert_frame_equal(before[stmt], after[stmt])
+    assert before_mapping == after_mapping, "different metric mappings"
+    print(f"⚡ Speed-up: {before_time / after_time:.1f}x")
+    print(f"✅ Same {len(STATEMENTS)} exported statements and the same {len(after_mapping)} metric mappings")
+
+
+if __name__ == "__main__":
+    main()
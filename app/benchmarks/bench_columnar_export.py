@@ -0,0 +1,135 @@
+# bench_columnar_export.py
+# ------------------------
+# Measures the columnar snapshot (columnar_export.py) on a synthetic universe:
+#   - export: a full export, a refresh with nothing changed, and a refresh after one ticker's latest year
+#     changed, another ticker's prices were updated and a third ticker was deleted
+#   - reads:  a whole table and every (ticker, year) slice, as SQL queries vs from the memory-mapped snapshot
+# After each refresh every exported table must hold exactly the rows of the database, and a snapshot opened
+# before the refresh must still read its own generation.
+#
+# Usage (from the repository root, needs pyarrow):
+#   python app/benchmarks/bench_columnar_export.py [companies=80] [years=20] [metrics=40] [ratios=30]
+
+import io
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench_common import create_bench_database
+from bench_display_periods import fill_synthetic_universe
+from columnar_export import EXPORT_TABLES, ColumnarSnapshot, export_columnar
+from data_versions import bump_data_version
+from db import close_all, read_connection
+
+
+def fill_prices(conn, tickers, years, seed=7):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(f"{2025 - years}-01-01", "2024-12-31").strftime("%Y-%m-%d")
+    conn.executemany("""
+        INSERT INTO stock_data (company_ticker, date, close_price, volume, source)
+        VALUES (?, ?, ?, ?, 'bench')
+    """, [
+        (ticker, date, float(price), int(volume))
+        for ticker in tickers
+        for date, price, volume in zip(dates, rng.lognormal(3, 0.2, len(dates)), rng.integers(0, 10**6, len(dates)))
+    ])
+    conn.commit()
+
+
+def change_some_tickers(conn, tickers):
+    conn.execute("""
+        UPDATE financial_data SET value = value * 1.01, last_updated = '2025-01-15 10:00:00'
+        WHERE company_ticker = ? AND period_end >= '2024-01-01'
+    """, (tickers[0],))
+    conn.execute("UPDATE stock_data SET close_price = close_price + 1 WHERE company_ticker = ? AND date >= '2024-06-01'",
+                 (tickers[1],))
+    for table in ("financial_data", "financial_ratios", "stock_data"):
+        conn.execute(f"DELETE FROM {table} WHERE company_ticker = ?", (tickers[2],))
+    bump_data_version(conn, tickers[:3])
+    conn.commit()
+
+
+def assert_same_as_database(db_path, directory):
+    snapshot = ColumnarSnapshot(directory)
+    with read_connection(db_path) as conn:
+        for table in EXPORT_TABLES:
+            exported = snapshot.read_frame(table)
+            stored = pd.read_sql_query(f"SELECT * FROM {table}", conn)
+            key = [c for c in stored.columns if c not in ("value", "close_price", "volume")]
+            exported = exported.sort_values(key).reset_index(drop=True)
+            stored = stored.sort_values(key).reset_index(drop=True)
+            assert exported.astype(str).equals(stored.astype(str)), f"{table} differs from the database"
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        result = func()
+    elapsed = time.perf_counter() - start
+    print(f"   {label:<45} {elapsed * 1000:10.0f} ms")
+    return result, elapsed
+
+
+def main():
+    companies, years, metrics, ratios = [int(a) for a in sys.argv[1:5]] + [80, 20, 40, 30][len(sys.argv[1:5]):]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        directory = os.path.join(tmp, "columnar")
+        conn = create_bench_database(db_path)
+        tickers, rows = fill_synthetic_universe(conn, companies, years, metrics, ratios)
+        fill_prices(conn, tickers, years)
+        print(f"📊 {companies} companies × {years} years: {rows:,} financial_data rows, prices per business day")
+        with redirect_stdout(io.StringIO()), read_connection(db_path):
+            pass  # the first open runs the migrations: keep them out of the timings
+
+        timed("export: full", lambda: export_columnar(db_path, directory))
+        assert_same_as_database(db_path, directory)
+        summary, _ = timed("export: refresh, nothing changed", lambda: export_columnar(db_path, directory))
+        assert not any(s["written"] for s in summary.values()), "unchanged partitions were rewritten"
+        opened_before = ColumnarSnapshot(directory)
+        expected = opened_before.read_table("financial_data", tickers=[tickers[0]])
+        change_some_tickers(conn, tickers)
+        summary, _ = timed("export: refresh after 3 tickers changed", lambda: export_columnar(db_path, directory))
+        assert_same_as_database(db_path, directory)
+        assert opened_before.read_table("financial_data", tickers=[tickers[0]]).equals(expected), \
+            "a snapshot opened before the refresh lost its partitions"
+        for table, counts in summary.items():
+            print(f"      {table}: {counts['written']} partition(s) written, {counts['removed']} removed")
+
+        snapshot = ColumnarSnapshot(directory)
+        with read_connection(db_path) as read:
+            before, before_time = timed("before: SELECT * FROM financial_data",
+                                        lambda: pd.read_sql_query("SELECT * FROM financial_data", read))
+            after, after_time = timed("after: snapshot.read_frame('financial_data')",
+                                      lambda: snapshot.read_frame("financial_data"))
+            timed("after: snapshot.read_table (no pandas)", lambda: snapshot.read_table("financial_data"))
+
+            slices = [(ticker, year) for ticker in snapshot.tickers("financial_ratios") for year in range(2025 - years, 2025)]
+            _, slices_before = timed(f"before: {len(slices)} SQL reads per ticker and year", lambda: [
+                pd.read_sql_query("""
+                    SELECT * FROM financial_ratios WHERE company_ticker = ? AND period_end BETWEEN ? AND ?
+                """, read, params=(ticker, f"{year}-01-01", f"{year}-12-31"))
+                for ticker, year in slices
+            ])
+            _, slices_after = timed(f"after: {len(slices)} snapshot reads", lambda: [
+                snapshot.read_table("financial_ratios", tickers=[ticker], years=[year]) for ticker, year in slices
+            ])
+        close_all()
+        conn.close()
+
+    assert len(before) == len(after), "different row counts"
+    print(f"⚡ Speed-up: {before_time / after_time:.1f}x for the whole table, "
+          f"{slices_before / slices_after:.1f}x for the per ticker and year reads")
+    print("✅ Every exported table matched the database after the full export and after the incremental refresh")
+
+
+if __name__ == "__main__":
+    main()
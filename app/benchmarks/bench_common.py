@@ -0,0 +1,28 @@
+# bench_common.py
+# ---------------
+# Helpers shared by the benchmark scripts.
+
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from db import DB_PATH
+
+
+def create_bench_database(path):
+    """Empty database with the schema of financials.db."""
+    source = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+    statements = source.execute("""
+        SELECT sql FROM sqlite_master
+        WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+        ORDER BY CASE type WHEN 'table' THEN 0 WHEN 'index' THEN 1 WHEN 'view' THEN 2 ELSE 3 END
+    """).fetchall()
+    source.close()
+
+    target = sqlite3.connect(path)
+    for (sql,) in statements:
+        target.execute(sql)
+    target.commit()
+    return target
@@ -0,0 +1,147 @@
+# bench_display_periods.py
+# ------------------------
+# Measures the view_financial_* chart reads on a synthetic universe:
+#   - before: the strftime() views (period filter and display_period computed for every row read)
+#   - after:  migration 8 (stored fiscal_year / fiscal_quarter / period_months / display_period
+#             columns, views as plain filters on them, covering indexes)
+# The same chart_series.compute_chart_series calls run in both cases and must return the same series.
+#
+# Usage (from the repository root):
+#   python app/benchmarks/bench_display_periods.py [companies=80] [years=20] [metrics=40] [ratios=20]
+
+import io
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+import numpy as np
+import pandas as pd
+
+# migrations.py uses flat imports (it is run from app/)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench_common import create_bench_database
+from chart_series import CHART_PERIOD_VIEWS, CHART_SERIES, compute_chart_series
+from migrations import MIGRATIONS, apply_migrations
+
+STATEMENTS = ["Profit&Loss", "Balance Sheet", "Cash Flow"]
+
+# (period_type, aggr_type, period_start "MM-DD", period_end "MM-DD") as stored by update_db
+PERIOD_SHAPES = [
+    ("quarter", "cml", "01-01", "03-31"),
+    ("quarter", "cml", "01-01", "06-30"),
+    ("quarter", "cml", "01-01", "09-30"),
+    ("annual", "cml", "01-01", "12-31"),
+    ("quarter", "qtl", "04-01", "06-30"),
+    ("quarter", "qtl", "07-01", "09-30"),
+    ("quarter", "qtl", "10-01", "12-31"),
+]
+
+
+def _periods(years):
+    return [
+        (f"{year}-{start}", f"{year}-{end}", period_type, aggr_type)
+        for year in range(2025 - years, 2025)
+        for period_type, aggr_type, start, end in PERIOD_SHAPES
+    ]
+
+
+def fill_synthetic_universe(conn, companies, years, metrics, ratios, seed=42):
+    """
+    financial_data, financial_metrics and financial_ratios rows for `companies` tickers, with the metrics
+    spread over the three statements. The first metrics and ratios are the ones the fundamentals charts
+    read, the rest are filler.
+    """
+    rng = np.random.default_rng(seed)
+    tickers = [f"T{i:03d}" for i in range(companies)]
+    periods = _periods(years)
+    chart_metrics = [metric for metric, _, _, _ in CHART_SERIES.values()]
+    chart_ratios = [ratio for _, ratio, _, _ in CHART_SERIES.values()]
+    metric_names = chart_metrics + [f"Metric {m:02d}" for m in range(metrics - len(chart_metrics))]
+    ratio_names = chart_ratios + [f"Ratio {r:02d}" for r in range(ratios - len(chart_ratios))]
+
+    conn.executemany("""
+        INSERT INTO financial_metrics (company_ticker, metric_name_ro, metric_name_eng, generalized_metric_eng, statement_name)
+        VALUES (?, ?, ?, ?, ?)
+    """, [
+        (ticker, f"{name} RO", name, name, STATEMENTS[m % len(STATEMENTS)])
+        for ticker in tickers
+        for m, name in enumerate(metric_names)
+    ])
+
+    data = [
+        (ticker, STATEMENTS[m % len(STATEMENTS)], "consolidated", start, end, period_type, aggr_type, "RON", f"{name} RO", value)
+        for ticker in tickers
+        for m, name in enumerate(metric_names)
+        for (start, end, period_type, aggr_type), value in zip(periods, rng.normal(1e6, 2.5e5, size=len(periods)))
+    ]
+    conn.executemany("""
+        INSERT INTO financial_data (company_ticker, statement_name, statement_type, period_start, period_end,
+                                    period_type, aggr_type, currency, metric_name_ro, value)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, data)
+
+    conn.executemany("""
+        INSERT INTO financial_ratios (company_ticker, period_start, period_end, period_type, aggr_type,
+                                      ratio_name_eng, ratio_name_ro, measure_unit, value, category)
+        VALUES (?, ?, ?, ?, ?, ?, ?, '%', ?, 'Bench')
+    """, [
+        (ticker, start, end, period_type, aggr_type, name, name, value)
+        for ticker in tickers
+        for name in ratio_names
+        for (start, end, period_type, aggr_type), value in zip(periods, rng.normal(10, 3, size=len(periods)))
+    ])
+    conn.commit()
+    return tickers, len(data)
+
+
+def read_all_charts(conn, tickers):
+    return {
+        (ticker, chart_type, period_type): compute_chart_series(conn, ticker, chart_type, period_type)
+        for ticker in tickers
+        for chart_type in CHART_SERIES
+        for period_type in CHART_PERIOD_VIEWS
+    }
+
+
+def timed(label, func, *args, repeat=1):
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            result = func(*args)
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"   {label:<45} {elapsed * 1000:10.1f} ms")
+    return result, elapsed
+
+
+def main():
+    companies, years, metrics, ratios = (
+        [int(a) for a in sys.argv[1:5]] + [80, 20, 40, 20][len(sys.argv[1:5]):]
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = create_bench_database(os.path.join(tmp, "bench.db"))
+        tickers, rows = fill_synthetic_universe(conn, companies, years, metrics, ratios)
+        print(f"📊 Synthetic universe: {companies} companies × {years} years: "
+              f"{rows:,} financial_data rows, {companies * ratios * years * len(PERIOD_SHAPES):,} ratio rows")
+
+        with redirect_stdout(io.StringIO()):
+            apply_migrations(conn, [m for m in MIGRATIONS if m[0] < 8])
+        one = tickers[:1]
+        _, before_one = timed("before: 6 charts of one ticker", read_all_charts, conn, one, repeat=20)
+        before, before_all = timed(f"before: 6 charts × {companies} tickers", read_all_charts, conn, tickers)
+
+        timed("migration 8 (add + backfill columns, views)", apply_migrations, conn)
+        _, after_one = timed("after: 6 charts of one ticker", read_all_charts, conn, one, repeat=20)
+        after, after_all = timed(f"after: 6 charts × {companies} tickers", read_all_charts, conn, tickers)
+        conn.close()
+
+    assert before == after, "stored-column views return different chart series"
+    print(f"⚡ Speed-up: {before_one / after_one:.1f}x per ticker, {before_all / after_all:.1f}x for the universe")
+    print(f"✅ {len(after)} chart series identical before and after")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# bench_industry_stats.py
+# -----------------------
+# Measures the industry percentile column of the analysis page ratios on a synthetic universe:
+#   - before: per request, load every peer's ratios for the period type and compute the industry median,
+#             quartiles and the company's percentile with pandas
+#   - after:  data_handler.get_industry_stats, one indexed read of the precomputed
+#             industry_stats / industry_percentiles rows (industry_stats.py)
+# Both must give the same medians, quartiles and percentiles. Also reports the batch refresh time.
+#
+# Usage (from the repository root):
+#   python app/benchmarks/bench_industry_stats.py [companies=80] [years=20] [ratios=20] [industries=8] [repeat=50]
+
+import io
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# data_handler.py uses flat imports when run from app/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench_common import create_bench_database
+from bench_display_periods import fill_synthetic_universe
+from data_handler import get_industry_stats
+from industry_stats import refresh_industry_stats
+from migrations import apply_migrations
+
+PERIOD_TYPE, AGGR_TYPE = "annual", "cml"
+
+
+def industry_stats_per_request(conn, ticker, period_type, aggr_type):
+    """What the page would do without the precompute: load the peers' ratios and aggregate them."""
+    df = pd.read_sql_query("""
+        SELECT r.company_ticker, r.ratio_name_ro, r.period_end, r.value
+        FROM financial_ratios r
+        JOIN companies c ON c.company_ticker = r.company_ticker
+        WHERE c.industry = (SELECT industry FROM companies WHERE company_ticker = ?)
+          AND r.period_type = ? AND r.aggr_type = ? AND r.value IS NOT NULL
+    """, conn, params=[ticker, period_type, aggr_type])
+
+    grouped = df.groupby(["ratio_name_ro", "period_end"])
+    quartiles = grouped["value"].quantile([0.25, 0.5, 0.75]).unstack()
+    df["percentile"] = grouped["value"].rank(pct=True) * 100
+    percentiles = df[df["company_ticker"] == ticker].set_index(["ratio_name_ro", "period_end"])["percentile"]
+
+    result = {}
+    for (ratio_name, period_end), row in quartiles.iterrows():
+        period = datetime.strptime(period_end, "%Y-%m-%d").strftime("%d-%m-%Y")
+        result.setdefault(ratio_name, {})[period] = (row[0.25], row[0.5], row[0.75], percentiles.get((ratio_name, period_end)))
+    return result
+
+
+def precomputed(conn, ticker, period_type, aggr_type):
+    stats = get_industry_stats(ticker, period_type, aggr_type, conn=conn)
+    return {
+        ratio_name: {period: (s["q1"], s["median"], s["q3"], s["percentile"]) for period, s in periods.items()}
+        for ratio_name, periods in stats["ratios"].items()
+    }
+
+
+def timed(label, func, repeat=1):
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            result = func()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"   {label:<45} {elapsed * 1000:10.3f} ms")
+    return result, elapsed
+
+
+def main():
+    companies, years, ratios, industries, repeat = (
+        [int(a) for a in sys.argv[1:6]] + [80, 20, 20, 8, 50][len(sys.argv[1:6]):]
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = create_bench_database(os.path.join(tmp, "bench.db"))
+        with redirect_stdout(io.StringIO()):
+            tickers, _ = fill_synthetic_universe(conn, companies, years, metrics=6, ratios=ratios)
+            conn.executemany("INSERT INTO companies (company_name, company_ticker, industry) VALUES (?, ?, ?)",
+                             [(f"Company {t}", t, f"Industry {i % industries}") for i, t in enumerate(tickers)])
+            conn.commit()
+            apply_migrations(conn)
+        print(f"📊 Synthetic universe: {companies} companies in {industries} industries × {years} years × {ratios} ratios")
+
+        timed("batch: refresh_industry_stats (whole universe)", lambda: refresh_industry_stats(conn))
+        conn.commit()
+
+        ticker = tickers[0]
+        before, before_time = timed("before: peer statistics per request",
+                                    lambda: industry_stats_per_request(conn, ticker, PERIOD_TYPE, AGGR_TYPE), repeat)
+        after, after_time = timed("after: precomputed lookup",
+                                  lambda: precomputed(conn, ticker, PERIOD_TYPE, AGGR_TYPE), repeat)
+        conn.close()
+
+    assert before.keys() == after.keys(), "different ratios"
+    for ratio_name, periods in before.items():
+        assert periods.keys() == after[ratio_name].keys(), f"different periods for {ratio_name}"
+        for period, values in periods.items():
+            assert np.allclose(values, after[ratio_name][period]), f"{ratio_name} {period}: {values} != {after[ratio_name][period]}"
+
+    print(f"⚡ Speed-up: {before_time / after_time:.1f}x per analysis page request")
+    print(f"✅ Same industry quartiles and percentiles for {sum(len(p) for p in after.values())} ratio periods")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# bench_metric_matcher.py
+# -----------------------
+# Measures metric-name matching against a large mapping (tens of thousands of canonical names):
+#   - before: what fuzzy_find_or_insert_metric did per name: process.extractOne against every value of the
+#             mapping, and process.extract(limit=len(existing)) to list the candidates
+#   - after:  metric_matcher.MetricMatcher: one batch best() (token index + cdist) and top_k()
+# Both must return the same best names, scores and top candidates. Also reports the index build / load time.
+#
+# Usage (from the repository root):
+#   python app/benchmarks/bench_metric_matcher.py [names=30000] [queries=500] [k=10]
+
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from metric_matcher import MetricMatcher, load_matcher, normalize_metric_name
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+
+def synthetic_mapping(size, seed=5):
+    """{cleaned name: canonical name} built from the words of the WINE / SNP statement names."""
+    rng = random.Random(seed)
+    words = sorted({
+        word
+        for f in ["WINE_PL", "WINE_BS", "WINE_CF", "SNP_BS", "SNP_CF"]
+        for name in pd.read_excel(os.path.join(ROOT, f"{f}_extracted.xlsx")).iloc[:, 0] if isinstance(name, str)
+        for word in normalize_metric_name(name).split()
+    })
+    mapping = {}
+    while len(mapping) < size:
+        name = " ".join(rng.choice(words) for _ in range(rng.randint(2, 7)))
+        mapping[name] = name
+    return mapping, words
+
+
+def queries_for(mapping, words, count, seed=6):
+    """Names as they come out of new reports: known ones reordered or with a typo, and new ones."""
+    rng = random.Random(seed)
+    names = list(mapping.values())
+    queries = []
+    for _ in range(count):
+        name = rng.choice(names).split()
+        roll = rng.random()
+        if roll < 0.3:
+            rng.shuffle(name)
+        elif roll < 0.7:
+            name[rng.randrange(len(name))] = rng.choice(words)
+        else:
+            name = [rng.choice(words) for _ in range(rng.randint(2, 7))]
+        queries.append(" ".join(name))
+    return queries
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        result = func()
+    elapsed = time.perf_counter() - start
+    print(f"   {label:<45} {elapsed * 1000:10.0f} ms")
+    return result, elapsed
+
+
+def main():
+    size, count, k = [int(a) for a in sys.argv[1:4]] + [30000, 500, 10][len(sys.argv[1:4]):]
+    mapping, words = synthetic_mapping(size)
+    queries = queries_for(mapping, words, count)
+    existing = list(mapping.values())
+    print(f"📊 {len(mapping)} canonical names, {count} queries")
+
+    before_best, best_time = timed("before: extractOne per query",
+                                   lambda: [process.extractOne(q, existing, scorer=fuzz.token_sort_ratio)[:2] for q in queries])
+    listed = queries[:max(1, count // 10)]
+    before_top, top_time = timed(f"before: extract(limit=all) × {len(listed)}",
+                                 lambda: [process.extract(q, existing, scorer=fuzz.token_sort_ratio, limit=len(existing)) for q in listed])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "metric_mapping.index.json")
+        timed("index: build and save", lambda: load_matcher(mapping, path))
+        matcher, _ = timed("index: load", lambda: load_matcher(mapping, path))
+
+    after_best, after_best_time = timed("after: best() for all queries", lambda: matcher.best(queries))
+    after_top, after_top_time = timed(f"after: top_k(k={k}) × {len(listed)}", lambda: matcher.top_k(listed, k=k))
+
+    assert [tuple(b) for b in before_best] == after_best, "different best matches"
+    assert [[m[:2] for m in full[:k]] for full in before_top] == after_top, "different top-k candidates"
+    print(f"⚡ Speed-up: {best_time / after_best_time:.0f}x for best matches, {top_time / after_top_time:.0f}x for the candidate lists")
+    print(f"✅ Same best matches for {count} queries and the same top {k} candidates for {len(listed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# bench_price_download.py
+# -----------------------
+# Daily refresh of a synthetic universe through price_downloader.download_prices, using a local fake
+# provider instead of Yahoo Finance:
+#   - every call sleeps `latency` seconds (a network round trip) and fails now and then (retries)
+#   - the first run loads the full history, the second run is the daily refresh (one new trading day)
+#   - an interrupted run is resumed from its checkpoints
+#   - after a dividend re-adjusts one ticker's history, the daily refresh must store the whole new series
+#
+# Usage (from the repository root):
+#   python app/benchmarks/bench_price_download.py [companies=80] [latency_ms=300] [years=10]
+
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+
+import numpy as np
+import pandas as pd
+
+# price_downloader.py uses flat imports (it is run from app/)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench_common import create_bench_database
+from db import close_all
+from price_downloader import download_prices
+from stock_data import SHARES_BY_TICKER
+
+
+class FakeProvider:
+    """
+    provider(ticker, start) over an in-memory price history in the yf.download layout. The history ends at
+    `self.today`; every `fail_every`-th call raises, like a dropped connection.
+    """
+
+    def __init__(self, tickers, years, latency, fail_every=7, seed=42):
+        rng = np.random.default_rng(seed)
+        dates = pd.bdate_range(end="2025-06-30", periods=years * 252 + 10)
+        self.history = {
+            ticker: pd.DataFrame({
+                "Close": 10 * np.exp(np.cumsum(rng.normal(0, 0.01, size=len(dates)))),
+                "Volume": rng.integers(1_000, 100_000, size=len(dates)),
+            }, index=pd.Index(dates, name="Date"))
+            for ticker in tickers
+        }
+        self.today = dates[-10]
+        self.latency = latency
+        self.fail_every = fail_every
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, ticker, start=None):
+        with self._lock:
+            self.calls += 1
+            fail = self.calls % self.fail_every == 0
+        time.sleep(self.latency)
+        if fail:
+            raise ConnectionError("connection reset by peer")
+        df = self.history[ticker]
+        df = df[df.index <= self.today]
+        return df[df.index >= pd.Timestamp(start)] if start else df
+
+    def adjust_for_dividend(self, ticker, factor):
+        """Rescales the closes before `self.today`, as Yahoo does with adjusted prices after an ex-dividend day."""
+        df = self.history[ticker]
+        df.loc[df.index < self.today, "Close"] *= factor
+
+
+def assert_same_closes(path, provider, ticker):
+    conn = sqlite3.connect(path)
+    stored = pd.read_sql_query("SELECT date, close_price FROM stock_data WHERE company_ticker = ? ORDER BY date",
+                               conn, params=(ticker,))
+    conn.close()
+    expected = provider.history[ticker]["Close"]
+    expected = expected[expected.index <= provider.today].round(4).to_numpy()
+    assert np.array_equal(stored["close_price"].to_numpy(), expected), f"{ticker}: stored closes mix price bases"
+
+
+def timed(label, func, *args, **kwargs):
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    rows = sum(r for _, r in result.values())
+    failed = sum(status == "failed" for status, _ in result.values())
+    print(f"   {label:<42} {elapsed * 1000:9.1f} ms  {rows:>9,} rows  {failed} failed")
+    return result
+
+
+def main():
+    companies, latency_ms, years = [int(a) for a in sys.argv[1:4]] + [80, 300, 10][len(sys.argv[1:4]):]
+    tickers = [f"T{i:03d}" for i in range(companies)]
+    SHARES_BY_TICKER.update({ticker: 100_000_000 for ticker in tickers})
+    provider = FakeProvider(tickers, years, latency_ms / 1000)
+    print(f"📊 {companies} tickers × {years} years of daily prices, {latency_ms} ms per provider call")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        create_bench_database(path).close()
+        options = dict(provider=provider, db_path=path, backoff=0.05)
+
+        timed("initial load (full history)", download_prices, tickers, run_id="day-1", **options)
+
+        provider.today += pd.offsets.BDay(1)
+        timed("interrupted daily refresh (first half)", download_prices, tickers[:companies // 2], run_id="day-2", **options)
+        timed("resumed daily refresh (all tickers)", download_prices, tickers, run_id="day-2", **options)
+        timed("re-run of a completed refresh", download_prices, tickers, run_id="day-2", **options)
+
+        provider.today += pd.offsets.BDay(1)
+        timed("daily refresh, 8 workers", download_prices, tickers, run_id="day-3", **options)
+
+        provider.today += pd.offsets.BDay(1)
+        timed("daily refresh, 1 worker", download_prices, tickers, run_id="day-4", max_workers=1, **options)
+
+        provider.today += pd.offsets.BDay(1)
+        provider.adjust_for_dividend(tickers[0], 0.97)
+        timed("daily refresh after a dividend re-adjustment", download_prices, tickers, run_id="day-5", **options)
+        assert_same_closes(path, provider, tickers[0])
+        print(f"✅ {tickers[0]}: the whole history was refetched on its new price basis")
+        close_all()
+
+
+if __name__ == "__main__":
+    main()
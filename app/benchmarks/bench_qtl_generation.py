@@ -0,0 +1,128 @@
+# bench_qtl_generation.py
+# -----------------------
+# Measures QTL generation (update_db.generate_qtl_from_cml) on a synthetic universe:
+#   - before: the old row loop (iterrows + MultiIndex .loc lookup + relativedelta per row)
+#   - after:  compute_qtl_from_cml (one merge over the whole universe)
+# and the full generate_qtl_from_cml run (read + compute + bulk upsert) against a temporary database.
+#
+# The old loop is far too slow for the full universe, so it runs on the first few companies only
+# and is compared per 1,000 rows.
+#
+# Usage (from the repository root):
+#   python app/benchmarks/bench_qtl_generation.py [companies=80] [years=20] [metrics=40] [legacy_companies=3]
+
+import io
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+# update_db.py uses flat imports (it is run from app/)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench_common import create_bench_database
+from db import close_all
+from update_db import compute_qtl_from_cml, generate_qtl_from_cml
+
+
+def build_synthetic_cml(companies, years, metrics, seed=42):
+    """
+    CML rows in financial_data layout: 3M/6M/9M quarter rows and a FY annual row per metric and year,
+    split between Profit&Loss and Cash Flow.
+    """
+    rng = np.random.default_rng(seed)
+    tickers = [f"T{i:03d}" for i in range(companies)]
+    first_year = 2025 - years
+    rows = []
+    for ticker in tickers:
+        for m in range(metrics):
+            statement = "Profit&Loss" if m % 2 == 0 else "Cash Flow"
+            quarterly = rng.normal(1_000_000, 250_000, size=years * 4)
+            for y in range(years):
+                year = first_year + y
+                cumulative = np.cumsum(quarterly[y * 4:(y + 1) * 4])
+                for q, month_end in enumerate(["03-31", "06-30", "09-30", "12-31"]):
+                    rows.append((
+                        ticker, statement, "consolidated", f"{year}-01-01", f"{year}-{month_end}",
+                        "annual" if q == 3 else "quarter", "cml", "RON", f"metric_{m:02d}", float(cumulative[q]),
+                    ))
+    return pd.DataFrame(rows, columns=[
+        "company_ticker", "statement_name", "statement_type", "period_start", "period_end",
+        "period_type", "aggr_type", "currency", "metric_name_ro", "value",
+    ])
+
+
+def legacy_qtl_rows(df):
+    """The previous generate_qtl_from_cml loop, without the database write."""
+    df = df.copy()
+    df["period_end"] = pd.to_datetime(df["period_end"]).dt.normalize()
+    df = df.sort_values("period_end")
+    lookup = df.set_index(["company_ticker", "statement_name", "statement_type", "currency", "metric_name_ro", "period_end"])
+    rows = []
+    for _, curr in df.iterrows():
+        curr_end = pd.to_datetime(curr["period_end"]).normalize()
+        if curr_end.month == 3 and curr_end.day == 31:
+            continue
+        prior_end = (curr_end - relativedelta(months=3)).replace(day=1) + pd.offsets.MonthEnd(0)
+        key = (curr["company_ticker"], curr["statement_name"], curr["statement_type"],
+               curr["currency"], curr["metric_name_ro"], prior_end)
+        try:
+            prev = lookup.loc[key]
+        except KeyError:
+            continue
+        rows.append((curr["company_ticker"], curr_end, curr["value"] - prev["value"]))
+    return rows
+
+
+def timed(label, func, *args, **kwargs):
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    print(f"   {label:<45} {elapsed * 1000:10.1f} ms")
+    return result, elapsed
+
+
+def main():
+    companies, years, metrics, legacy_companies = (
+        [int(a) for a in sys.argv[1:5]] + [80, 20, 40, 3][len(sys.argv[1:5]):]
+    )
+
+    df = build_synthetic_cml(companies, years, metrics)
+    print(f"📊 Synthetic universe: {companies} companies × {years} years × {metrics} metrics = {len(df):,} CML rows")
+
+    legacy_df = df[df["company_ticker"].isin(df["company_ticker"].unique()[:legacy_companies])]
+    legacy_rows, legacy_time = timed(f"before: row loop ({len(legacy_df):,} rows)", legacy_qtl_rows, legacy_df)
+    qtl, vector_time = timed(f"after: compute_qtl_from_cml ({len(df):,} rows)", compute_qtl_from_cml, df)
+
+    legacy_check = compute_qtl_from_cml(legacy_df)
+    assert len(legacy_check) == len(legacy_rows), "vectorized and legacy row counts differ"
+
+    legacy_per_k = legacy_time / len(legacy_df) * 1000
+    vector_per_k = vector_time / len(df) * 1000
+    print(f"   per 1,000 CML rows: before {legacy_per_k * 1000:.2f} ms | after {vector_per_k * 1000:.3f} ms")
+    print(f"⚡ Speed-up (per row): {legacy_per_k / vector_per_k:.0f}x")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        conn = create_bench_database(path)
+        df.to_sql("financial_data", conn, if_exists="append", index=False)
+        conn.close()
+
+        timed("full run: generate_qtl_from_cml (first)", generate_qtl_from_cml, path)
+        timed("full run: generate_qtl_from_cml (no changes)", generate_qtl_from_cml, path)
+        last_year = df["period_end"].max()[:4]
+        timed(f"scoped run: 1 ticker since {last_year}-01-01", generate_qtl_from_cml, path,
+              tickers=[df["company_ticker"].iloc[0]], since=f"{last_year}-01-01")
+        close_all()
+
+    print(f"✅ {len(qtl):,} QTL rows generated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# bench_response_cache.py
+# -----------------------
+# Compares the response cache backends (cache.py) under several worker processes, as with gunicorn:
+#   - every worker requests the same chart responses; a miss "renders" the response (sleeps `render_ms`)
+#   - then the data version of every ticker is bumped once and the workers request everything again
+# With the memory backend each worker renders every response itself; with the sqlite backend a response
+# rendered by one worker is served to the others, and a version bump invalidates it for all of them.
+#
+# Usage (from the repository root):
+#   python app/benchmarks/bench_response_cache.py [workers=4] [responses=200] [render_ms=10]
+
+import os
+import random
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+# cache.py uses flat imports when run from app/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from cache import create_cache
+
+ENDPOINTS = ["revenue_qtl_and_change_data", "net_profit_annual_and_margin_data", "ratios_data", "dividends_dps_and_growth"]
+
+
+def worker(args):
+    backend, path, responses, render_ms, version, seed = args
+    cache = create_cache(backend, **({"path": path} if backend == "sqlite" else {}))
+    renders = 0
+    start = time.perf_counter()
+    order = list(range(responses))
+    for round_version in (version, version + 1):
+        random.Random(seed + round_version).shuffle(order)  # workers serve different pages at any moment
+        for i in order:
+            key = (ENDPOINTS[i % len(ENDPOINTS)], f"T{i // len(ENDPOINTS):03d}", (), ())
+            if cache.get(key, round_version) is None:
+                time.sleep(render_ms / 1000)
+                renders += 1
+                cache.set(key, round_version, (b'{"labels": [], "values": []}' * 50, "application/json", 200))
+    return renders, time.perf_counter() - start
+
+
+def main():
+    workers, responses, render_ms = [int(a) for a in sys.argv[1:4]] + [4, 200, 10][len(sys.argv[1:4]):]
+    print(f"📊 {workers} workers × {responses} responses × 2 data versions, {render_ms} ms per render")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in ("memory", "sqlite"):
+            path = os.path.join(tmp, f"{backend}.db")
+            with Pool(workers) as pool:
+                results = pool.map(worker, [(backend, path, responses, render_ms, 1, w) for w in range(workers)])
+            renders = sum(r for r, _ in results)
+            slowest = max(t for _, t in results)
+            print(f"   {backend:<7} {renders:>6} renders ({renders / workers:.0f} per worker)   slowest worker {slowest:6.2f} s")
+
+    print(f"✅ Minimum possible: {2 * responses} renders (each response once per data version)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# bench_screener.py
+# -----------------
+# Measures a cross-company screen ("ROE > 15 and [Net debt] / EBITDA < 2", latest FY) on a synthetic universe:
+#   - before: one SQL query per company for its latest FY values, conditions checked in Python
+#   - after:  screener.run_screen on the in-memory columnar snapshot
+# Both must select the same companies. Also reports the snapshot (re)load time after a data version bump.
+#
+# Usage (from the repository root):
+#   python app/benchmarks/bench_screener.py [companies=80] [years=20] [ratios=40] [repeat=200]
+
+import io
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+import numpy as np
+
+# screener.py uses flat imports when run from app/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench_common import create_bench_database
+from bench_display_periods import PERIOD_SHAPES, fill_synthetic_universe
+from data_versions import bump_data_version
+from migrations import apply_migrations
+from screener import run_screen
+
+SCREEN = "ROE > 15 and [Net debt] / EBITDA < 2"
+DERIVED = ["EBITDA", "Net debt"]
+
+
+def add_screen_fields(conn, tickers, years, seed=7):
+    """ROE in financial_ratios and EBITDA / Net debt in derived_metrics for every ticker and period."""
+    rng = np.random.default_rng(seed)
+    periods = [
+        (f"{year}-{start}", f"{year}-{end}", period_type, aggr_type)
+        for year in range(2025 - years, 2025)
+        for period_type, aggr_type, start, end in PERIOD_SHAPES
+    ]
+    conn.executemany("""
+        INSERT INTO financial_ratios (company_ticker, period_start, period_end, period_type, aggr_type,
+                                      ratio_name_eng, ratio_name_ro, measure_unit, value, category)
+        VALUES (?, ?, ?, ?, ?, 'ROE', 'ROE', '%', ?, 'Profitabilitate')
+    """, [(t, *p, float(v)) for t in tickers for p, v in zip(periods, rng.normal(12, 8, len(periods)))])
+    conn.executemany("""
+        INSERT INTO derived_metrics (company_ticker, period_start, period_end, period_type, aggr_type,
+                                     metric_name_eng, metric_name_ro, value)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (t, *p, name, name, float(v))
+        for t in tickers for name in DERIVED
+        for p, v in zip(periods, rng.normal(1e8, 5e7, len(periods)))
+    ])
+    conn.executemany("INSERT INTO companies (company_name, company_ticker, industry) VALUES (?, ?, '')",
+                     [(f"Company {t}", t) for t in tickers])
+    conn.commit()
+
+
+def screen_per_company(conn, tickers):
+    """One query per company for its latest FY values."""
+    matched = []
+    for ticker in tickers:
+        rows = conn.execute("""
+            SELECT name, value FROM (
+                SELECT ratio_name_eng AS name, value, period_end FROM financial_ratios
+                WHERE company_ticker = ? AND period_type = 'annual' AND ratio_name_eng = 'ROE'
+                UNION ALL
+                SELECT metric_name_eng, value, period_end FROM derived_metrics
+                WHERE company_ticker = ? AND period_type = 'annual' AND metric_name_eng IN ('EBITDA', 'Net debt')
+            )
+            WHERE period_end = (SELECT MAX(period_end) FROM financial_ratios
+                                WHERE company_ticker = ? AND period_type = 'annual')
+        """, (ticker, ticker, ticker)).fetchall()
+        values = dict(rows)
+        roe, net_debt, ebitda = values.get("ROE"), values.get("Net debt"), values.get("EBITDA")
+        if None in (roe, net_debt, ebitda) or ebitda == 0:
+            continue
+        if roe > 15 and net_debt / ebitda < 2:
+            matched.append(ticker)
+    return matched
+
+
+def timed(label, func, repeat=1):
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            result = func()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"   {label:<45} {elapsed * 1000:10.3f} ms")
+    return result, elapsed
+
+
+def main():
+    companies, years, ratios, repeat = [int(a) for a in sys.argv[1:5]] + [80, 20, 40, 200][len(sys.argv[1:5]):]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = create_bench_database(os.path.join(tmp, "bench.db"))
+        with redirect_stdout(io.StringIO()):
+            tickers, _ = fill_synthetic_universe(conn, companies, years, metrics=3, ratios=ratios)
+            add_screen_fields(conn, tickers, years)
+            apply_migrations(conn)
+        print(f"📊 Synthetic universe: {companies} companies × {years} years × {ratios + 1} ratios + {len(DERIVED)} derived metrics")
+        print(f"🔎 {SCREEN} (latest FY)")
+
+        before, before_time = timed(f"before: {companies} per-company queries", lambda: screen_per_company(conn, tickers), 5)
+        timed("snapshot load (first call)", lambda: run_screen(SCREEN, conn=conn))
+        after, after_time = timed("after: run_screen on the snapshot", lambda: run_screen(SCREEN, conn=conn, limit=companies), repeat)
+
+        bump_data_version(conn, tickers[:1])
+        conn.commit()
+        timed("snapshot reload after a version bump", lambda: run_screen(SCREEN, conn=conn))
+        conn.close()
+
+    assert sorted(r["ticker"] for r in after["results"]) == sorted(before), "screener and per-company results differ"
+    print(f"⚡ Speed-up: {before_time / after_time:.0f}x ({after['count']} of {companies} companies match)")
+    print("✅ Same companies selected")
+
+
+if __name__ == "__main__":
+    main()
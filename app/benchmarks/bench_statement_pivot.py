@@ -0,0 +1,94 @@
+# bench_statement_pivot.py
+# ------------------------
+# Measures building one large statement response from its long rows (what /pl_data does per request):
+#   - before: the old pivot (dayfirst reparse of the ISO dates, a Python loop per metric and per cell)
+#   - after:  data_handler._statement_blocks + _statement_rows (same list-of-rows shape)
+#   - after:  the columnar block serialized by fast_json (orjson when installed)
+# The rows must be identical to the old ones.
+#
+# Usage (from the repository root):
+#   python app/benchmarks/bench_statement_pivot.py [metrics=200] [years=25] [repeat=5]
+
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# data_handler.py uses flat imports when run from app/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import fast_json
+from data_handler import _build_statement_rows, _statement_blocks
+
+
+def build_synthetic_statement(metrics, years, seed=42):
+    """Long rows of one quarterly statement; each metric misses a few periods, as real statements do."""
+    rng = np.random.default_rng(seed)
+    ends = pd.date_range(end="2024-12-31", periods=years * 4, freq="QE").strftime("%Y-%m-%d")
+    df = pd.DataFrame({
+        "metric_id": np.repeat(np.arange(1, metrics + 1), len(ends)),
+        "metric_name": np.repeat([f"Metric {m}" for m in range(1, metrics + 1)], len(ends)),
+        "value": rng.normal(1e6, 2.5e5, size=metrics * len(ends)).round(2),
+        "period_end": np.tile(ends, metrics),
+    })
+    return df[rng.random(len(df)) > 0.05].reset_index(drop=True)
+
+
+def legacy_statement_rows(df):
+    """The previous _build_statement_rows."""
+    df = df.copy()
+    df["period_end"] = pd.to_datetime(df["period_end"], errors="coerce", dayfirst=True)
+    df = df.sort_values(by=["metric_id", "period_end"], ascending=[True, True])
+    df_pivot = df.pivot(index="metric_id", columns="period_end", values="value")
+    df_pivot.columns = pd.to_datetime(df_pivot.columns).strftime("%d-%m-%Y")
+    df_pivot = df_pivot.merge(df[["metric_id", "metric_name"]].drop_duplicates(), on="metric_id").set_index("metric_id")
+    df_pivot.columns = [str(col) for col in df_pivot.columns]
+
+    final_list = []
+    for metric_id in df_pivot.index:
+        row = df_pivot.loc[metric_id]
+        metric_name = row["metric_name"]
+        row_data = row.drop(labels=["metric_name"]).dropna()
+        sorted_periods = sorted(row_data.index, key=lambda x: datetime.strptime(x, "%d-%m-%Y"))
+        period_values = OrderedDict()
+        for period_col in sorted_periods:
+            period_values[period_col] = str(row_data[period_col])
+        final_list.append({"metric_id": metric_id, "metric_name": metric_name, "values": period_values})
+    return final_list
+
+
+def timed(label, func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"   {label:<50} {elapsed * 1000:10.1f} ms")
+    return result, elapsed
+
+
+def main():
+    metrics, years, repeat = [int(a) for a in sys.argv[1:4]] + [200, 25, 5][len(sys.argv[1:4]):]
+    df = build_synthetic_statement(metrics, years)
+    print(f"📊 Synthetic statement: {metrics} metrics × {years * 4} quarters = {len(df):,} values")
+
+    # json.dumps(sort_keys=True) is what flask.jsonify does with the rows
+    legacy, legacy_time = timed("before: old pivot + per-cell loop + json",
+                                lambda: json.dumps(legacy_statement_rows(df), sort_keys=True), repeat)
+    rows, rows_time = timed("after: vectorized rows + json",
+                            lambda: json.dumps(_build_statement_rows(df), sort_keys=True), repeat)
+    serializer = "orjson" if fast_json.orjson is not None else "json fallback"
+    _, columnar_time = timed(f"after: columnar block + fast_json ({serializer})",
+                             lambda: fast_json.dumps(_statement_blocks(df)[()]), repeat)
+
+    assert rows == legacy, "vectorized rows differ from the old ones"
+    print(f"⚡ Speed-up: rows {legacy_time / rows_time:.1f}x, columnar {legacy_time / columnar_time:.1f}x")
+    print("✅ Rows identical to the old pivot")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+# bench_update_db.py
+# ------------------
+# Measures loading a statement workbook into financial_data (update_db.py), for a first load and for a reload
+# of the same statement with some values changed, some blanked and some metrics dropped:
+#   - before: the previous pipeline: Excel → CSV → long CSV on disk, read back, one executemany upsert,
+#             the stale rows found in Python and deleted one by one
+#   - after:  read_statement_workbook + statement_to_long_format + update_financials_db: in memory, a staging
+#             table and set-based merge / delete
+# Both must leave the same financial_data and the same change log (financial_data_changes).
+#
+# Usage (from the repository root):
+#   python app/benchmarks/bench_update_db.py [metrics=400] [periods=80]
+
+import io
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+
+import pandas as pd
+
+# update_db.py uses flat imports (it is run from app/)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench_common import create_bench_database
+from chart_series import refresh_chart_series
+from data_versions import bump_data_version
+from db import close_all, read_connection, write_connection
+from display_periods import PERIOD_COLUMNS, period_columns
+from latest_snapshot import refresh_latest_snapshot
+from numeric_values import normalize_numeric_column, quarantine_rows
+from update_db import (
+    FINANCIAL_DATA_COLUMNS, FINANCIAL_DATA_KEY, _to_records, read_statement_workbook,
+    statement_to_long_format, update_financials_db,
+)
+
+METADATA = ["company_ticker", "statement_name", "statement_type", "period_start", "period_end",
+            "period_type", "aggr_type", "currency", "unit", "source"]
+
+
+def statement_sheet(metrics, periods, seed, changed=0.0, dropped=0.0):
+    """A wide Profit&Loss sheet: quarterly and annual CML periods, a few values as text or unparsable."""
+    rng = random.Random(seed)
+    ends = pd.date_range(end="2024-12-31", periods=periods, freq="QE")
+    columns = []
+    for end in ends:
+        period_type = "annual" if end.month == 12 else "quarter"
+        columns.append(["BENCH", "Profit&Loss", "consolidated", pd.Timestamp(end.year, 1, 1), end,
+                        period_type, "cml", "RON", "lei", "bench"])
+    rows = [[label] + [column[i] for column in columns] for i, label in enumerate(METADATA)]
+
+    values = random.Random(1)
+    for m in range(int(metrics * (1 - dropped))):
+        row = [f"Indicator {m:04d}"]
+        for _ in ends:
+            value = round(values.uniform(-1e8, 1e8), 2)
+            roll = rng.random()
+            if roll < changed:
+                value = round(value * 1.1, 2)
+            elif roll < changed * 1.5:
+                value = None
+            elif roll < 0.01:
+                value = f"{value:,.2f}"
+            elif roll < 0.011:
+                value = "n.d."
+            row.append(value)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def update_before(folder, excel_file, db_path, ticker, statement_name):
+    """The previous convert_excel_to_csv + convert_csv_to_long_format + update_financials_db_from_csv."""
+    csv_file = os.path.join(folder, "history.csv")
+    output_file = os.path.join(folder, "history_long.csv")
+    pd.read_excel(excel_file, header=None).to_csv(csv_file, index=False, header=False)
+
+    df = pd.read_csv(csv_file, header=None)
+    metadata = df.iloc[:10]
+    df_metrics = df.iloc[10:].copy()
+    df_metrics[0] = df_metrics[0].astype(str).str.strip()
+    transposed = df_metrics.set_index(0).T
+    for i in range(10):
+        transposed[metadata.iloc[i, 0]] = metadata.iloc[i, 1:].values
+    metadata_columns = list(metadata.iloc[:, 0])
+    metric_columns = transposed.columns.difference(metadata_columns, sort=False).tolist()
+    df_long = transposed[metadata_columns + metric_columns].melt(
+        id_vars=metadata_columns, var_name="metric_name_ro", value_name="value")
+    df_long["line_order"] = df_long["metric_name_ro"].map({name: i for i, name in enumerate(metric_columns)})
+    df_long.dropna(subset=["metric_name_ro", "value"], how="all").to_csv(output_file, index=False)
+
+    df = pd.read_csv(output_file)
+    df["company_ticker"] = df["company_ticker"].astype(str).str.strip().str.upper()
+    df["statement_name"] = statement_name
+    df["metric_name_ro"] = df["metric_name_ro"].astype(str).str.strip()
+    for column in ("period_start", "period_end"):
+        df[column] = pd.to_datetime(df[column], format="%Y-%m-%d %H:%M:%S", errors="coerce").dt.strftime("%Y-%m-%d")
+    df[PERIOD_COLUMNS] = period_columns(df)
+    with read_connection(db_path) as conn:
+        metric_map = dict(conn.execute(
+            "SELECT metric_name_ro, metric_parent FROM financial_metrics WHERE metric_parent IS NOT NULL").fetchall())
+    df["metric_parent"] = df["metric_name_ro"].map(metric_map)
+    df["last_updated"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    df["raw_value"] = df["value"]
+    df["value"], unparsable = normalize_numeric_column(df["value"])
+    records = _to_records(df.loc[df["value"].notna(), FINANCIAL_DATA_COLUMNS])
+    new_keys = set(_to_records(df.loc[df["value"].notna() | unparsable, FINANCIAL_DATA_KEY]))
+    periods_in_file = set(zip(df["period_type"], df["aggr_type"]))
+
+    with write_connection(db_path) as conn:
+        conn.executemany(f"""
+            INSERT INTO financial_data ({', '.join(FINANCIAL_DATA_COLUMNS)})
+            VALUES ({', '.join('?' for _ in FINANCIAL_DATA_COLUMNS)})
+            ON CONFLICT ({', '.join(FINANCIAL_DATA_KEY)}) DO UPDATE SET
+                value = excluded.value, metric_parent = excluded.metric_parent,
+                last_updated = excluded.last_updated, line_order = excluded.line_order,
+                fiscal_year = excluded.fiscal_year, fiscal_quarter = excluded.fiscal_quarter,
+                period_months = excluded.period_months, display_period = excluded.display_period
+            WHERE financial_data.value IS NOT excluded.value
+               OR financial_data.metric_parent IS NOT excluded.metric_parent
+               OR financial_data.line_order IS NOT excluded.line_order
+               OR financial_data.display_period IS NOT excluded.display_period
+        """, records)
+        quarantine_rows(conn, df[unparsable], "bench")
+        existing = conn.execute(f"""
+            SELECT id, {', '.join(FINANCIAL_DATA_KEY)} FROM financial_data
+            WHERE company_ticker = ? AND statement_name = ?
+        """, (ticker, statement_name)).fetchall()
+        stale = [(row[0],) for row in existing if row[1:] not in new_keys and (row[6], row[7]) in periods_in_file]
+        conn.executemany("DELETE FROM financial_data WHERE id = ?", stale)
+        refresh_latest_snapshot(conn, [ticker])
+        refresh_chart_series(conn, [ticker])
+        bump_data_version(conn, [ticker])
+
+
+def update_after(folder, excel_file, db_path, ticker, statement_name):
+    df_long = statement_to_long_format(read_statement_workbook(excel_file))
+    return update_financials_db(df_long, db_path, ticker, statement_name, "bench")
+
+
+def snapshot(db_path):
+    """financial_data and the change log, without ids and timestamps."""
+    conn = sqlite3.connect(db_path)
+    columns = [c for c in FINANCIAL_DATA_COLUMNS if c != "last_updated"]
+    data = conn.execute(f"SELECT {', '.join(columns)} FROM financial_data ORDER BY {', '.join(FINANCIAL_DATA_KEY)}").fetchall()
+    changes = conn.execute("""
+        SELECT company_ticker, statement_name, period_end, period_type, aggr_type, metric_name_ro,
+               change_type, old_value, new_value
+        FROM financial_data_changes ORDER BY 1, 2, 3, 4, 5, 6, 7, 8, 9
+    """).fetchall()
+    quarantined = conn.execute("SELECT COUNT(*) FROM financial_data_quarantine").fetchone()[0]
+    conn.close()
+    return data, changes, quarantined
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        result = func()
+    elapsed = time.perf_counter() - start
+    print(f"   {label:<45} {elapsed * 1000:10.0f} ms")
+    return result, elapsed
+
+
+def main():
+    metrics, periods = [int(a) for a in sys.argv[1:3]] + [400, 80][len(sys.argv[1:3]):]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        first = os.path.join(tmp, "first.xlsx")
+        reload = os.path.join(tmp, "reload.xlsx")
+        statement_sheet(metrics, periods, seed=1).to_excel(first, header=False, index=False)
+        statement_sheet(metrics, periods, seed=2, changed=0.05, dropped=0.03).to_excel(reload, header=False, index=False)
+        print(f"📊 {metrics} metrics × {periods} periods, first load then a reload with ~5% of values changed")
+
+        paths = {}
+        totals = {}
+        for label, update in (("before", update_before), ("after", update_after)):
+            paths[label] = os.path.join(tmp, f"{label}.db")
+            create_bench_database(paths[label]).close()
+            totals[label] = 0.0
+            for step, excel_file in (("first load", first), ("reload", reload)):
+                counts, elapsed = timed(f"{label}: {step}",
+                                        lambda: update(tmp, excel_file, paths[label], "BENCH", "Profit&Loss"))
+                totals[label] += elapsed
+            close_all()
+        print(f"   after, reload: {counts}")
+
+        before, after = snapshot(paths["before"]), snapshot(paths["after"])
+
+    assert before[0] == after[0], "different financial_data"
+    assert before[1] == after[1], "different change log"
+    assert before[2] == after[2], "different quarantine"
+    print(f"⚡ Speed-up: {totals['before'] / totals['after']:.1f}x")
+    print(f"✅ Same {len(after[0])} financial_data rows, {len(after[1])} change log entries "
+          f"and {after[2]} quarantined values")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# bench_variations.py
+# -------------------
+# Measures the YoY / YTD price-change computation (stock_data.update_variations) on a synthetic
+# daily price history:
+#   - before: the old df.apply(axis=1) that scanned the whole history for every row
+#   - after:  compute_yoy / compute_ytd (merge_asof on the sorted dates)
+#
+# The old computation is quadratic, so it runs on the last few years only.
+#
+# Usage (from the repository root):
+#   python app/benchmarks/bench_variations.py [years=25] [legacy_years=3]
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# stock_data.py uses flat imports (it is run from app/)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from stock_data import compute_yoy, compute_ytd
+
+
+def build_synthetic_prices(years, seed=42):
+    """Business-day closes for `years` years ending 2025-06-30."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end="2025-06-30", periods=years * 252)
+    prices = 10 * np.exp(np.cumsum(rng.normal(0, 0.01, size=len(dates))))
+    return pd.DataFrame({"date": dates, "close_price": prices.round(4)})
+
+
+def _legacy_closest(df, target, threshold_days):
+    delta = (df["date"] - target).abs()
+    idx = delta.idxmin()
+    return None if delta[idx].days > threshold_days else df.at[idx, "close_price"]
+
+
+def legacy_variations(df, threshold_days=5):
+    """The previous compute_yoy / compute_ytd row loop."""
+    def change(row, target):
+        base = _legacy_closest(df, target, threshold_days)
+        return (row["close_price"] - base) / base * 100 if base else None
+
+    yoy = df.apply(lambda row: change(row, row["date"] - timedelta(days=365)), axis=1)
+    ytd = df.apply(lambda row: change(row, datetime(row["date"].year, 1, 1)), axis=1)
+    return yoy, ytd
+
+
+def main():
+    years, legacy_years = ([int(a) for a in sys.argv[1:3]] + [25, 3][len(sys.argv[1:3]):])
+
+    df = build_synthetic_prices(years)
+    legacy_df = df.tail(legacy_years * 252).reset_index(drop=True)
+    print(f"📊 Synthetic history: {len(df):,} daily closes ({years} years)")
+
+    start = time.perf_counter()
+    legacy_yoy, legacy_ytd = legacy_variations(legacy_df)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compute_yoy(df)
+    compute_ytd(df)
+    vector_time = time.perf_counter() - start
+
+    check_yoy, check_ytd = compute_yoy(legacy_df), compute_ytd(legacy_df)
+    assert np.allclose(check_yoy.to_numpy(float), legacy_yoy.to_numpy(float), equal_nan=True)
+    assert np.allclose(check_ytd.to_numpy(float), legacy_ytd.to_numpy(float), equal_nan=True)
+
+    print(f"   before: row loop ({len(legacy_df):,} rows)          {legacy_time * 1000:10.1f} ms")
+    print(f"   after:  merge_asof ({len(df):,} rows)            {vector_time * 1000:10.1f} ms")
+    print("✅ Same YoY / YTD values as the row loop")
+
+
+if __name__ == "__main__":
+    main()
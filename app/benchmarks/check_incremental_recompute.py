@@ -0,0 +1,85 @@
+# check_incremental_recompute.py
+# ------------------------------
+# Checks that incremental.run_incremental_recompute stores the same derived metrics and ratios as a full
+# recompute after a financial_data row is deleted. The check runs on a temporary copy of financials.db:
+#   1. full recompute, so the copy starts consistent
+#   2. delete one row (default: AQ 2023-12-31 annual "Imprumuturi bancare pe termen scurt") and run the
+#      incremental recompute
+#   3. full recompute again: derived_metrics and financial_ratios must not change
+#
+# Usage (from the repository root):
+#   python app/benchmarks/check_incremental_recompute.py [financial_data id=290]
+
+import io
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from contextlib import redirect_stdout
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from db import DB_PATH, close_all, write_connection
+from derived_metrics import run_all_derived_calculations
+from incremental import run_incremental_recompute
+from ratios import run_all_ratios
+
+TABLES = {
+    "derived_metrics": ["company_ticker", "period_end", "period_type", "aggr_type", "metric_name_eng"],
+    "financial_ratios": ["company_ticker", "period_end", "period_type", "aggr_type", "ratio_name_eng"],
+}
+
+
+def stored_results(db_path):
+    conn = sqlite3.connect(db_path)
+    results = {
+        table: pd.read_sql_query(f"SELECT * FROM {table}", conn)
+        .drop(columns="calculated_at").sort_values(key).reset_index(drop=True)
+        for table, key in TABLES.items()
+    }
+    conn.close()
+    return results
+
+
+def full_recompute(db_path):
+    run_all_derived_calculations(db_path, None)
+    run_all_ratios(db_path)
+    run_incremental_recompute(db_path)  # moves the change-log cursor past the changes the full run covered
+
+
+def main():
+    row_id = int(sys.argv[1]) if len(sys.argv) > 1 else 290
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "financials.db")
+        shutil.copyfile(DB_PATH, db_path)
+
+        with redirect_stdout(io.StringIO()):
+            full_recompute(db_path)
+            with write_connection(db_path) as conn:
+                deleted = conn.execute("""
+                    SELECT company_ticker, period_end, period_type, aggr_type, metric_name_ro
+                    FROM financial_data WHERE id = ?
+                """, (row_id,)).fetchone()
+                conn.execute("DELETE FROM financial_data WHERE id = ?", (row_id,))
+            run_incremental_recompute(db_path)
+        if deleted is None:
+            sys.exit(f"❌ No financial_data row with id {row_id}")
+        print(f"🗑️ Deleted {' | '.join(deleted)} and ran the incremental recompute")
+        incremental = stored_results(db_path)
+
+        with redirect_stdout(io.StringIO()):
+            full_recompute(db_path)
+        full = stored_results(db_path)
+        close_all()
+
+    for table in TABLES:
+        pd.testing.assert_frame_equal(incremental[table], full[table], check_dtype=False, obj=table)
+        print(f"✅ {table}: {len(full[table])} rows, identical after the incremental and the full recompute")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+# cache.py
+# --------
+# Response cache for the JSON chart endpoints in routes.py.
+#
+# ✅ Keyed by (endpoint, ticker, params) and tagged with the ticker's data version (data_versions.py):
+#    a write to the ticker's data invalidates its entries on the next request
+# ✅ ETag / Last-Modified on every response, and 304 Not Modified when the client already has it,
+#    without running the view at all
+# ✅ Two interchangeable backends with the same get(key, version) / set(key, version, value) interface,
+#    where value is a (body bytes, mimetype, status) response:
+#      memory — LRU + TTL inside the process (default; each gunicorn worker warms its own copy)
+#      sqlite — LRU + TTL in a local SQLite file shared by every worker on the machine, so a response
+#               computed by one worker is served by all of them. It stores the body as a plain BLOB
+#               (no pickle), so the file holds data only
+#
+# Configuration (environment variables, read at import time):
+#   RESPONSE_CACHE_BACKEND       memory | sqlite              (default: memory)
+#   RESPONSE_CACHE_PATH          file for the sqlite backend  (default: data/response_cache.db)
+#   RESPONSE_CACHE_MAX_ENTRIES   default 2048
+#   RESPONSE_CACHE_TTL           seconds, default 3600
+#
+# Usage:
+#   @main.route("/revenue_data/<ticker>")
+#   @cached_json_response
+#   def revenue_data(ticker): ...
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request
+from werkzeug.http import is_resource_modified
+
+try:
+    from .data_versions import get_data_version
+    from .db import DATA_DIR, read_connection
+except ImportError:
+    from data_versions import get_data_version
+    from db import DATA_DIR, read_connection
+
+BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory").lower()
+CACHE_PATH = os.environ.get("RESPONSE_CACHE_PATH", os.path.join(DATA_DIR, "response_cache.db"))
+MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 2048))
+TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL", 3600))
+
+
+class MemoryCache:
+    """
+    Thread-safe LRU cache whose entries expire after `ttl` seconds or when their version tag changes.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    The MemoryCache semantics on a local SQLite file, so every process opening the same `path` shares the entries.
+    Each thread keeps its own connection; the file runs in WAL mode without fsync (it is only a cache).
+    Eviction of the least recently used entries runs every `evict_every` writes.
+    Values are (body, mimetype, status) and are stored as columns, never unpickled.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS, evict_every=64):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evict_every = evict_every
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        conn = self._connection()
+        # Files written by earlier versions held pickled values: drop that layout
+        if "value" in {row[1] for row in conn.execute("PRAGMA table_info(response_cache)")}:
+            conn.execute("DROP TABLE response_cache")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS response_cache (
+                cache_key TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                body BLOB NOT NULL,
+                mimetype TEXT NOT NULL,
+                status INTEGER NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_access ON response_cache (last_access)")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = OFF")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _hash(key):
+        return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+
+    def get(self, key, version):
+        conn = self._connection()
+        cache_key = self._hash(key)
+        row = conn.execute(
+            "SELECT version, expires_at, body, mimetype, status FROM response_cache WHERE cache_key = ?", (cache_key,)
+        ).fetchone()
+        now = time.time()
+        if row is None or row[0] != version or row[1] < now:
+            if row is not None:
+                conn.execute("DELETE FROM response_cache WHERE cache_key = ?", (cache_key,))
+            with self._stats_lock:
+                self.misses += 1
+            return None
+        conn.execute("UPDATE response_cache SET last_access = ? WHERE cache_key = ?", (now, cache_key))
+        with self._stats_lock:
+            self.hits += 1
+        return bytes(row[2]), row[3], row[4]
+
+    def set(self, key, version, value):
+        body, mimetype, status = value
+        conn = self._connection()
+        now = time.time()
+        conn.execute("""
+            INSERT OR REPLACE INTO response_cache (cache_key, version, expires_at, last_access, body, mimetype, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (self._hash(key), version, now + self.ttl, now, sqlite3.Binary(body), mimetype, status))
+        with self._stats_lock:
+            self._writes += 1
+            evict = self._writes % self.evict_every == 0
+        if evict:
+            conn.execute("""
+                DELETE FROM response_cache WHERE cache_key IN (
+                    SELECT cache_key FROM response_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def clear(self):
+        self._connection().execute("DELETE FROM response_cache")
+        with self._stats_lock:
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+
+def create_cache(backend=BACKEND, **options):
+    """
+    Returns a cache backend by name ("memory" or "sqlite"); `options` go to its constructor.
+    """
+    backends = {"memory": MemoryCache, "sqlite": SQLiteCache}
+    if backend not in backends:
+        raise ValueError(f"Unknown cache backend '{backend}' (expected one of: {', '.join(backends)})")
+    return backends[backend](**options)
+
+
+response_cache = create_cache()
+
+
+def _etag(key, version):
+    return hashlib.sha1(repr((key, version)).encode("utf-8")).hexdigest()
+
+
+def cached_json_response(view):
+    """
+    Wraps a Flask view that returns JSON for a `ticker` URL parameter. Successful responses are cached
+    per data version; the client gets an ETag / Last-Modified pair and a 304 when it revalidates.
+    """
+    @wraps(view)
+    def wrapper(**view_args):
+        # Versions are bumped under the uppercase ticker: /aq/ and /AQ/ share one version and one entry
+        ticker = view_args.get("ticker")
+        if ticker is not None:
+            ticker = ticker.strip().upper()
+        with read_connection() as conn:
+            version, updated_at = get_data_version(conn, ticker)
+
+        key_args = {**view_args, "ticker": ticker} if "ticker" in view_args else view_args
+        key = (request.endpoint, ticker, tuple(sorted(key_args.items())), tuple(sorted(request.args.items(multi=True))))
+        etag = _etag(key, version)
+
+        if not is_resource_modified(request.environ, etag=etag, last_modified=updated_at):
+            response = Response(status=304)
+        else:
+            cached = response_cache.get(key, version)
+            if cached is not None:
+                body, mimetype, status = cached
+                response = Response(body, status=status, mimetype=mimetype)
+            else:
+                response = make_response(view(**view_args))
+                if response.status_code != 200:
+                    return response
+                response_cache.set(key, version, (response.get_data(), response.mimetype, response.status_code))
+
+        response.set_etag(etag)
+        if updated_at is not None:
+            response.last_modified = updated_at
+        # Clients may keep the response but must revalidate it (a cheap 304) before reusing it
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+        return response
+
+    return wrapper
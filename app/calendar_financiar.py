@@ -3,18 +3,15 @@ from selenium.webdriver.common.by import By
 from bs4 import BeautifulSoup
 import sqlite3
 import time
-import os
 import re
 from datetime import datetime
 from urllib.parse import urljoin
+from db import write_connection
 
 
 #===== TO DO ======
 #de fixat faptul ca inca mai apare "macro" la category acolo exista ticker
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Path to app/ directory
-DATA_DIR = os.path.join(BASE_DIR, "data")  # Path to data/
-DB_PATH = os.path.join(DATA_DIR, "financials.db")  # Full path to database
 INSSE_BASE_URL = "https://insse.ro"
 
 # Define the BET Index Ticker List
@@ -28,15 +25,12 @@ BET_INDEX_TICKERS = [
 
 def clear_old_events():
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM financial_events")
-        conn.commit()
-        print("Cleared old events from financial_events table.")
+        with write_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM financial_events")
+            print("Cleared old events from financial_events table.")
     except sqlite3.Error as e:
         print(f"Database Error while clearing old events: {e}")
-    finally:
-        conn.close()
 
 def parse_romania_date(date_string):
     try:
@@ -159,122 +153,110 @@ def scrape_bvb():
 
 def process_and_insert_bvb_events(bvb_events):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        for event in bvb_events:
-            ticker = event.get("Ticker")
-            event_date = event.get("Date")
-            title = event.get("Event name")
-            description = title
-
-            # Correct category logic
-            category = "company" if ticker in BET_INDEX_TICKERS else "macro"
-            normalized_title = re.sub(r"\s+", " ", title.lower().strip())
-
-            # Improved event type detection
-            if re.search(r"teleconferin(ț|t)a|înt(â|a)lnire cu anali(ș|s)ti", normalized_title):
-                event_type = "earnings_conf_call"
-            elif re.search(r"ex-data dividend", normalized_title):
-                event_type = "ex_date"
-            elif re.search(r"aga ordinar(ă|a) anual(ă|a)", normalized_title):
-                event_type = "annual_ogsm"
-            elif re.search(r"rezultate financiare", normalized_title):
-                event_type = "earnings_release"
-            elif re.search(r"dividend", normalized_title):
-                event_type = "dividend"
-            else:
-                event_type = "unknown"
-
-            # Extract period reference for certain event types
-            period_reference, period_start, period_end = parse_period_reference(title) if event_type in ["earnings_release", "earnings_conf_call"] else (None, None, None)
-
-            # Insert into the database
-            cursor.execute("""
-                INSERT OR IGNORE INTO financial_events 
-                (company_ticker, event_date, event_type, title, description, period_reference, period_start, period_end, category, source)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (ticker, event_date, event_type, title, description, period_reference, period_start, period_end, category, "BVB"))
-
-            conn.commit()
-            print(f"✅ Event added/updated: {title} ({event_date}) - Ticker: {ticker}, Type: {event_type}, Category: {category}")
+        with write_connection() as conn:
+            cursor = conn.cursor()
+
+            for event in bvb_events:
+                ticker = event.get("Ticker")
+                event_date = event.get("Date")
+                title = event.get("Event name")
+                description = title
+
+                # Correct category logic
+                category = "company" if ticker in BET_INDEX_TICKERS else "macro"
+                normalized_title = re.sub(r"\s+", " ", title.lower().strip())
+
+                # Improved event type detection
+                if re.search(r"teleconferin(ț|t)a|înt(â|a)lnire cu anali(ș|s)ti", normalized_title):
+                    event_type = "earnings_conf_call"
+                elif re.search(r"ex-data dividend", normalized_title):
+                    event_type = "ex_date"
+                elif re.search(r"aga ordinar(ă|a) anual(ă|a)", normalized_title):
+                    event_type = "annual_ogsm"
+                elif re.search(r"rezultate financiare", normalized_title):
+                    event_type = "earnings_release"
+                elif re.search(r"dividend", normalized_title):
+                    event_type = "dividend"
+                else:
+                    event_type = "unknown"
+
+                # Extract period reference for certain event types
+                period_reference, period_start, period_end = parse_period_reference(title) if event_type in ["earnings_release", "earnings_conf_call"] else (None, None, None)
+
+                # Insert into the database
+                cursor.execute("""
+                    INSERT OR IGNORE INTO financial_events 
+                    (company_ticker, event_date, event_type, title, description, period_reference, period_start, period_end, category, source)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (ticker, event_date, event_type, title, description, period_reference, period_start, period_end, category, "BVB"))
 
+                print(f"✅ Event added/updated: {title} ({event_date}) - Ticker: {ticker}, Type: {event_type}, Category: {category}")
     except sqlite3.Error as e:
         print(f"❌ Database Error: {e}")
-    finally:
-        conn.close()
 
 def process_and_insert_bnr_events(bnr_events):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        for event in bnr_events:
-            event_type = event.get("Event type")
-            # Filter only "Comunicat de presă" and convert it to "press_release"
-            if "comunicat de presă" not in event_type.lower():
-                print(f"⚠️ Skipping non-press release event: {event_type}")
-                continue
+        with write_connection() as conn:
+            cursor = conn.cursor()
+
+            for event in bnr_events:
+                event_type = event.get("Event type")
+                # Filter only "Comunicat de presă" and convert it to "press_release"
+                if "comunicat de presă" not in event_type.lower():
+                    print(f"⚠️ Skipping non-press release event: {event_type}")
+                    continue
             
-            # Convert to standardized event type
-            event_type = "press_release"
-
-            # Extract and transform fields
-            event_date = parse_romania_date(event.get("Date"))
-            event_name = event.get("Event name")
-
-            # Split title by dash and take only the first part
-            event_title = event_name.split(" – ")[0].strip()
-
-            # Set description as the same as the event title
-            description = event_title
-
-            # Lowercase the period reference
-            period_reference = event.get("Period").lower() if event.get("Period") else "unknown"
-            category = "macro"
-            source = "BNR"
-
-            # Insert into the database
-            cursor.execute("""
-                INSERT OR IGNORE INTO financial_events 
-                (company_ticker, event_date, event_type, title, description, period_reference, category, source)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (None, event_date, event_type, event_title, description, period_reference, category, source))
-            conn.commit()
-            print(f"✅ BNR Event added: {event_title} ({event_date}) - Type: {event_type}, Period: {period_reference}")
-
+                # Convert to standardized event type
+                event_type = "press_release"
+
+                # Extract and transform fields
+                event_date = parse_romania_date(event.get("Date"))
+                event_name = event.get("Event name")
+
+                # Split title by dash and take only the first part
+                event_title = event_name.split(" – ")[0].strip()
+
+                # Set description as the same as the event title
+                description = event_title
+
+                # Lowercase the period reference
+                period_reference = event.get("Period").lower() if event.get("Period") else "unknown"
+                category = "macro"
+                source = "BNR"
+
+                # Insert into the database
+                cursor.execute("""
+                    INSERT OR IGNORE INTO financial_events 
+                    (company_ticker, event_date, event_type, title, description, period_reference, category, source)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (None, event_date, event_type, event_title, description, period_reference, category, source))
+                print(f"✅ BNR Event added: {event_title} ({event_date}) - Type: {event_type}, Period: {period_reference}")
     except sqlite3.Error as e:
         print(f"❌ Database Error while processing BNR events: {e}")
-    finally:
-        conn.close()
 
 def process_and_insert_insse_events(insse_events):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        for event in insse_events:
-            event_date = event.get("Date")
-            event_title = event.get("Event name")
-            description = event_title
-            period_reference = event.get("Period").lower() if event.get("Period") else "unknown"
-            category = "macro"
-            source = "INS"
-            event_type = "press_release"
-
-            # Insert into the database
-            cursor.execute("""
-                INSERT OR IGNORE INTO financial_events 
-                (company_ticker, event_date, event_type, title, description, period_reference, category, source)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (None, event_date, event_type, event_title, description, period_reference, category, source))
-            conn.commit()
-            print(f"✅ INSSE Event added: {event_title} ({event_date}) - Type: {event_type}, Period: {period_reference}")
-
+        with write_connection() as conn:
+            cursor = conn.cursor()
+
+            for event in insse_events:
+                event_date = event.get("Date")
+                event_title = event.get("Event name")
+                description = event_title
+                period_reference = event.get("Period").lower() if event.get("Period") else "unknown"
+                category = "macro"
+                source = "INS"
+                event_type = "press_release"
+
+                # Insert into the database
+                cursor.execute("""
+                    INSERT OR IGNORE INTO financial_events 
+                    (company_ticker, event_date, event_type, title, description, period_reference, category, source)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (None, event_date, event_type, event_title, description, period_reference, category, source))
+                print(f"✅ INSSE Event added: {event_title} ({event_date}) - Type: {event_type}, Period: {period_reference}")
     except sqlite3.Error as e:
         print(f"❌ Database Error while processing INSSE events: {e}")
-    finally:
-        conn.close()
 
 
 def scrape_bnr():
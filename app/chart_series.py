@@ -0,0 +1,112 @@
+# chart_series.py
+# ---------------
+# Ready-to-serve JSON for the fundamentals charts (revenue / operating profit / net profit with their
+# growth or margin, quarterly and annual), one row per (ticker, chart_type, period_type).
+#
+# Each chart used to run two queries against the view_financial_* views on every request, intersect
+# the periods and parse the values in Python. The same work now runs when the data changes: update_db
+# and the ratio engine call refresh_chart_series() on their write connection, in the same transaction,
+# and the endpoints return the stored JSON with a single primary-key read.
+
+import json
+from datetime import datetime
+
+CREATE_CHART_SERIES = """
+    CREATE TABLE IF NOT EXISTS chart_series (
+        company_ticker TEXT NOT NULL,
+        chart_type TEXT NOT NULL,
+        period_type TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        updated_at TEXT,
+        PRIMARY KEY (company_ticker, chart_type, period_type)
+    )
+"""
+
+# chart_type: (generalized metric, ratio, JSON key of the metric, JSON key of the ratio)
+CHART_SERIES = {
+    "revenue": ("Revenue", "Revenue growth y/y", "revenues", "change_rate"),
+    "operating_profit": ("Operating profit", "Operating profit margin", "operating_profit", "operating_margin"),
+    "net_profit": ("Net profit a.m.", "Net profit margin", "net_profit", "net_margin"),
+}
+
+# period_type: (financial_data view, financial_ratios view)
+CHART_PERIOD_VIEWS = {
+    "qtl": ("view_financial_qtl", "view_financial_ratios_qtl"),
+    "annual": ("view_financial_annual", "view_financial_ratios_annual"),
+}
+
+SERIES_LENGTH = 8  # Latest periods shown per chart
+
+
+def serialize_chart_series(payload):
+    """Compact JSON with sorted keys, byte-for-byte what flask.jsonify sends for the same payload."""
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"))
+
+
+def compute_chart_series(conn, ticker, chart_type, period_type):
+    """
+    Returns {"periods": [...], <metric key>: [...], <ratio key>: [...]} for the latest SERIES_LENGTH periods
+    that have both the metric and the ratio, or None when there are none.
+    """
+    metric, ratio, metric_key, ratio_key = CHART_SERIES[chart_type]
+    data_view, ratio_view = CHART_PERIOD_VIEWS[period_type]
+
+    metric_rows = conn.execute(f"""
+        SELECT v.period_end, v.display_period, v.value
+        FROM {data_view} v
+        JOIN financial_metrics m
+        ON v.metric_name_ro = m.metric_name_ro
+        AND v.company_ticker = m.company_ticker
+        WHERE v.company_ticker = ?
+        AND m.generalized_metric_eng = ?
+        ORDER BY v.period_end ASC
+    """, (ticker, metric)).fetchall()
+
+    ratio_rows = conn.execute(f"""
+        SELECT period_end, display_period, value
+        FROM {ratio_view}
+        WHERE company_ticker = ? AND ratio_name_eng = ?
+        ORDER BY period_end ASC
+    """, (ticker, ratio)).fetchall()
+
+    metric_by_period = {row[0]: (row[1], row[2]) for row in metric_rows}  # period_end: (display_period, value)
+    ratio_by_period = {row[0]: row[2] for row in ratio_rows}
+
+    common_periods = sorted(
+        p for p in (set(metric_by_period) & set(ratio_by_period))
+        if ratio_by_period[p] is not None and metric_by_period[p][1] is not None
+    )[-SERIES_LENGTH:]
+
+    if not common_periods:
+        return None
+
+    return {
+        "periods": [metric_by_period[p][0] for p in common_periods],
+        metric_key: [float(metric_by_period[p][1]) for p in common_periods],
+        ratio_key: [float(ratio_by_period[p]) for p in common_periods],
+    }
+
+
+def refresh_chart_series(conn, tickers=None):
+    """
+    Recomputes every chart series of `tickers` (all tickers with financials when None) on the caller's
+    connection (no commit).
+    """
+    if tickers is None:
+        tickers = [row[0] for row in conn.execute("SELECT DISTINCT company_ticker FROM financial_data")]
+    elif isinstance(tickers, str):
+        tickers = [tickers]
+
+    updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    rows = [
+        (ticker, chart_type, period_type,
+         serialize_chart_series(compute_chart_series(conn, ticker, chart_type, period_type)), updated_at)
+        for ticker in sorted(set(tickers))
+        for chart_type in CHART_SERIES
+        for period_type in CHART_PERIOD_VIEWS
+    ]
+    conn.executemany("""
+        INSERT OR REPLACE INTO chart_series (company_ticker, chart_type, period_type, payload, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
+    return len(rows)
@@ -1,16 +1,36 @@
+# collect_financials.py
+# ---------------------
+# Extracts the statements (PL / BS / CF) of a ticker from its cleaned quarterly report workbooks into
+# {ticker}_{stmt}_extracted.xlsx, mapping every metric name to a canonical one (metric_mapping.json).
+#
+#   python collect_financials.py                          # interactive: asks before every new mapping
+#   python collect_financials.py --batch AQ [PL BS CF]    # non-interactive, all files in parallel
+#
+# ✅ every workbook is read once, in openpyxl's read-only (streaming) mode, for all requested statements
+# ✅ names are matched through metric_matcher.py: canonical names preprocessed once into an index
+#    persisted next to the mapping (metric_mapping.index.json), top-k suggestions instead of the whole list
+# ✅ batch mode fans the workbooks out over a process pool; each worker fuzzy-matches all of a file's new
+#    metric names at once (one cdist) against the mapping loaded when the run started
+# ✅ batch mode resolves the names in file order, as the interactive mode would if every prompt was
+#    answered "y": a close enough match (GLOBAL_MATCHING_THRESHOLD) is accepted, anything else is added as new
+
+import argparse
 import os
 import re
 import json
+import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from openpyxl import load_workbook
-from rapidfuzz import fuzz, process
+from metric_matcher import METRIC_INDEX_FILE, MetricMatcher, load_matcher, normalize_metric_name
 
 # --- CONFIG ---
 DB_PATH = r"C:\Irina\Mosaiq8\app\data\financials.db"
 BASE_DIR_TEMPLATE = r"C:\Users\irina\Project Element\Data source\{ticker}\{ticker}_raw\{ticker}_clean_tables"
 GLOBAL_MATCHING_THRESHOLD = 95
 METRIC_MAPPING_FILE = "metric_mapping.json"
+MATCH_SUGGESTIONS = 10
 
 # --- UTILITIES ---
 
@@ -28,15 +48,8 @@ def get_user_inputs():
     return ticker, statement, input_dir
 
 
-def remove_diacritics(text):
-    mapping = {'ă':'a','â':'a','î':'i','ș':'s','ş':'s','ț':'t','ţ':'t',
-               'Ă':'A','Â':'A','Î':'I','Ș':'S','Ş':'S','Ț':'T','Ţ':'T'}
-    return ''.join(mapping.get(c, c) for c in text)
-
-
 def clean_metric_name(raw):
-    no_diac = remove_diacritics(raw.strip().lower())
-    return re.sub(r'[^a-z0-9 ]+', '', no_diac)
+    return normalize_metric_name(raw)
 
 
 def is_valid_line(metric, vals):
@@ -49,6 +62,7 @@ def is_valid_line(metric, vals):
 
 # --- MAPPING ---
 metric_mapping = {}
+matcher = MetricMatcher()  # the canonical names (values) of metric_mapping
 
 
 def load_metric_mappings():
@@ -64,6 +78,19 @@ def save_metric_mappings():
     json.dump(metric_mapping, open(METRIC_MAPPING_FILE,'w',encoding='utf-8'), ensure_ascii=False, indent=4)
 
 
+def load_mapping_and_matcher():
+    global matcher
+    metric_mapping.clear()
+    metric_mapping.update(load_metric_mappings())
+    matcher = load_matcher(metric_mapping, METRIC_INDEX_FILE)
+
+
+def set_mapping(cleaned, canonical):
+    metric_mapping[cleaned] = canonical
+    matcher.add(canonical)
+    return canonical
+
+
 def fuzzy_find_or_insert_metric(raw_name, values, interactive=True, threshold=GLOBAL_MATCHING_THRESHOLD):
     if not is_valid_line(raw_name, values):
         print(f"⚠️ Skipping invalid line: '{raw_name}' with values {values}")
@@ -74,38 +101,36 @@ def fuzzy_find_or_insert_metric(raw_name, values, interactive=True, threshold=GL
         return metric_mapping[cleaned]
     # first file: seed silently
     if not interactive:
-        metric_mapping[cleaned] = cleaned
-        return cleaned
+        return set_mapping(cleaned, cleaned)
     # try fuzzy match
-    existing = list(metric_mapping.values())
-    if existing:
-        match, score, _ = process.extractOne(cleaned, existing, scorer=fuzz.token_sort_ratio)
+    if len(matcher):
+        match, score = matcher.best([cleaned])[0]
         if score >= threshold:
             ans = input(f"\n🆕 New metric '{raw_name}'. Replace with '{match}'? (y/n): ").strip().lower()
             if ans == 'y':
-                metric_mapping[cleaned] = match
+                set_mapping(cleaned, match)
                 save_metric_mappings()
                 return match
     # no auto-match
     ans = input(f"\n🆕 Metric '{raw_name}' new. Add as new (y) or match existing (n)? ").strip().lower()
     if ans == 'y':
-        metric_mapping[cleaned] = cleaned
+        set_mapping(cleaned, cleaned)
         save_metric_mappings()
         return cleaned
-    # propose all matches
-    possible = process.extract(cleaned, existing, scorer=fuzz.token_sort_ratio, limit=len(existing))
+    # propose the closest matches
+    possible = matcher.top_k([cleaned], k=MATCH_SUGGESTIONS)[0]
     print("\n🔄 Possible Matches:")
-    for i, (m, s, _) in enumerate(possible, 1):
+    for i, (m, s) in enumerate(possible, 1):
         print(f"{i}. {m} (score={s})")
     while True:
         choice = input("Choose number or enter new name: ").strip()
         if choice.isdigit() and 1 <= int(choice) <= len(possible):
             sel = possible[int(choice)-1][0]
-            metric_mapping[cleaned] = sel
+            set_mapping(cleaned, sel)
             save_metric_mappings()
             return sel
         if choice:
-            metric_mapping[cleaned] = choice
+            set_mapping(cleaned, choice)
             save_metric_mappings()
             return choice
         print("Invalid choice.")
@@ -157,46 +182,175 @@ def parse_value(c):
     try: return float(c)
     except: return None
 
+# --- READ ---
+def read_statement_sheets(fp, statements):
+    """
+    Reads the `{stmt}_YYYYMMDD` sheets of `statements` from one workbook in a single read-only pass.
+    Returns {stmt: [(raw metric name, [(period, value), (period, value)]), ...]}: the first two value columns
+    of every row (current and comparative period), periods normalized to dd/mm/YYYY (None if unparseable).
+    """
+    sheets = {stmt: [] for stmt in statements}
+    wb = load_workbook(fp, read_only=True, data_only=True)
+    try:
+        for sh in wb.sheetnames:
+            stmt = next((st for st in statements if re.match(rf"{st}_\d{{8}}", sh)), None)
+            if stmt is None: continue
+            rows = wb[sh].iter_rows(values_only=True)
+            header = list(next(rows, ())) + [None] * 3
+            periods = [normalize_period_string(c) for c in header[1:3]]
+            for row in rows:
+                row = list(row) + [None] * 3
+                raw = 'nan' if row[0] is None else str(row[0])  # as pandas reads an empty cell
+                vals = [np.nan if v is None else v for v in row[1:3]]
+                sheets[stmt].append((raw, list(zip(periods, vals))))
+    finally:
+        wb.close()
+    return sheets
+
+
+def period_records(norm, cells):
+    return [
+        {'metric_name_ro':norm,'period_end':period,'value':parse_value(val)}
+        for period, val in cells
+        if not pd.isna(val) and period
+    ]
+
+
+def list_report_files(input_dir):
+    return sorted([os.path.join(input_dir,f) for f in os.listdir(input_dir) if f.endswith('.xlsx')], key=extract_date_from_filename)
+
 # --- EXTRACT ---
 def extract_data_to_list(fp, stmt, interactive=True):
-    wb = load_workbook(fp, data_only=True)
     records = []
-    for sh in wb.sheetnames:
-        if not re.match(rf"{stmt}_\d{{8}}", sh): continue
-        df = pd.read_excel(fp, sheet_name=sh)
-        df.columns = [df.columns[0]] + [normalize_period_string(c) for c in df.columns[1:]]
-        for idx,row in df.iterrows():
-            raw = str(row.iloc[0])
-            vals = [row.iloc[1], row.iloc[2]]
-            norm = fuzzy_find_or_insert_metric(raw, vals, interactive)
-            if not norm: continue
-            for col,val in zip(df.columns[1:], vals):
-                if pd.isna(val): continue
-                dnorm = normalize_period_string(col)
-                if not dnorm: continue
-                records.append({'metric_name_ro':norm,'period_end':dnorm,'value':parse_value(val)})
+    for raw, cells in read_statement_sheets(fp, [stmt])[stmt]:
+        norm = fuzzy_find_or_insert_metric(raw, [val for _, val in cells], interactive)
+        if not norm: continue
+        records.extend(period_records(norm, cells))
     return records
 
+# --- EXPORT ---
+def export_records(records, ticker, stmt):
+    """Writes {ticker}_{stmt}_extracted.xlsx: one row per metric (first-seen order), one column per period."""
+    df = pd.DataFrame(records)
+    if df.empty:
+        print(f"⚠️ No {stmt} data extracted for {ticker}")
+        return None
+    order = df['metric_name_ro'].drop_duplicates().tolist()
+    pivot = df.pivot_table(index='metric_name_ro', columns='period_end', values='value', aggfunc='first')
+    pivot = pivot.reindex(order)
+    cols = sorted(pivot.columns, key=lambda x: datetime.strptime(x, '%d/%m/%Y'))
+    pivot = pivot[cols]
+    out = f"{ticker}_{stmt}_extracted.xlsx"
+    pivot.to_excel(out)
+    print(f"✅ Exported to {out}")
+    return pivot
+
+# --- BATCH ---
+# Set in every pool worker: the mapping as loaded at the start of the run, and the matcher of its canonical names
+_worker_mapping = {}
+_worker_matcher = MetricMatcher()
+
+
+def _init_batch_worker(mapping, matcher):
+    global _worker_mapping, _worker_matcher
+    _worker_mapping = mapping
+    _worker_matcher = matcher
+
+
+def _extract_file_batch(fp, statements):
+    """
+    Pool worker: reads one workbook and returns {stmt: (lines, skipped, matches)}, where lines are
+    (cleaned metric name, cells) for every valid line and matches the best existing mapping for each new name.
+    """
+    result = {}
+    for stmt, rows in read_statement_sheets(fp, statements).items():
+        lines = [(clean_metric_name(raw), cells) for raw, cells in rows if is_valid_line(raw, [v for _, v in cells])]
+        new_names = list(dict.fromkeys(name for name, _ in lines if name not in _worker_mapping))
+        # the pool already uses every core: one scorer thread per worker
+        matches = dict(zip(new_names, _worker_matcher.best(new_names, workers=1)))
+        result[stmt] = (lines, len(rows) - len(lines), matches)
+    return result
+
+
+def resolve_metric_batch(cleaned, best, added, seed, threshold=GLOBAL_MATCHING_THRESHOLD):
+    """
+    fuzzy_find_or_insert_metric without prompts. `best` is the worker's match among the names loaded at the start
+    of the run, `added` the matcher of the canonical names added since; `seed` is True for the first file of a statement.
+    """
+    if cleaned in metric_mapping:
+        return metric_mapping[cleaned]
+    if not seed:
+        match, score = best or (None, -1)
+        if len(added):
+            candidate, candidate_score = added.best([cleaned], workers=1)[0]
+            if candidate_score > score:  # on a tie the name loaded first wins, as in a single list
+                match, score = candidate, candidate_score
+        if match is not None and score >= threshold:
+            return set_mapping(cleaned, match)
+    added.add(cleaned)
+    return set_mapping(cleaned, cleaned)
+
+
+def collect_batch(ticker, statements=("PL", "BS", "CF"), input_dir=None, max_workers=None, threshold=GLOBAL_MATCHING_THRESHOLD):
+    """
+    Non-interactive extraction of `statements` for `ticker`: the workbooks are read in parallel, the metric names
+    resolved in file order, one {ticker}_{stmt}_extracted.xlsx written per statement.
+    Returns {stmt: pivot DataFrame (None when nothing was extracted)}.
+    """
+    input_dir = input_dir or BASE_DIR_TEMPLATE.format(ticker=ticker)
+    if not os.path.isdir(input_dir):
+        print(f"Directory not found: {input_dir}")
+        return {}
+    files = list_report_files(input_dir)
+    load_mapping_and_matcher()
+    print(f"📂 {len(files)} file(s) in {input_dir}, statements: {', '.join(statements)}")
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_batch_worker, initargs=(dict(metric_mapping), matcher)) as pool:
+        extracted = list(pool.map(_extract_file_batch, files, [list(statements)] * len(files)))
+
+    known = len(metric_mapping)
+    added = MetricMatcher()
+    pivots = {}
+    for stmt in statements:
+        records = []
+        for i, (fp, result) in enumerate(zip(files, extracted)):
+            lines, skipped, matches = result[stmt]
+            if skipped:
+                print(f"⚠️ {os.path.basename(fp)} ({stmt}): skipped {skipped} invalid line(s)")
+            for cleaned, cells in lines:
+                norm = resolve_metric_batch(cleaned, matches.get(cleaned), added, i == 0, threshold)
+                records.extend(period_records(norm, cells))
+        pivots[stmt] = export_records(records, ticker, stmt)
+
+    save_metric_mappings()
+    matcher.save(METRIC_INDEX_FILE)
+    print(f"🔗 {len(metric_mapping) - known} new mapping(s), {len(added)} new metric name(s) added to {METRIC_MAPPING_FILE}")
+    return pivots
+
 # --- MAIN ---
-if __name__ == '__main__':
+def run_interactive():
     ticker, stmt, inp = get_user_inputs()
-    metric_mapping.clear()
-    metric_mapping.update(load_metric_mappings())
+    load_mapping_and_matcher()
     all_records = []
-    files = sorted([os.path.join(inp,f) for f in os.listdir(inp) if f.endswith('.xlsx')], key=extract_date_from_filename)
-    for i,fp in enumerate(files):
+    for i,fp in enumerate(list_report_files(inp)):
         interactive = (i > 0)
         print(f"📄 Processing {'first' if i==0 else 'subsequent'} file: {os.path.basename(fp)}")
         recs = extract_data_to_list(fp, stmt, interactive)
         all_records.extend(recs)
-    df = pd.DataFrame(all_records)
-    if not df.empty:
-        order = df['metric_name_ro'].drop_duplicates().tolist()
-        pivot = df.pivot_table(index='metric_name_ro', columns='period_end', values='value', aggfunc='first')
-        pivot = pivot.reindex(order)
-        cols = sorted(pivot.columns, key=lambda x: datetime.strptime(x, '%d/%m/%Y'))
-        pivot = pivot[cols]
-        out = f"{ticker}_{stmt}_extracted.xlsx"
-        pivot.to_excel(out)
-        print(f"✅ Exported to {out}")
+    export_records(all_records, ticker, stmt)
     save_metric_mappings()
+    matcher.save(METRIC_INDEX_FILE)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Extract PL / BS / CF statements from the cleaned report workbooks.")
+    parser.add_argument("--batch", metavar="TICKER", help="non-interactive mode for TICKER (otherwise asks for the inputs)")
+    parser.add_argument("statements", nargs="*", default=["PL", "BS", "CF"], choices=["PL", "BS", "CF"], help="batch mode statements")
+    parser.add_argument("--input-dir", help="batch mode: folder with the workbooks (default: BASE_DIR_TEMPLATE)")
+    parser.add_argument("--workers", type=int, help="batch mode: worker processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    if args.batch:
+        collect_batch(args.batch.strip().upper(), args.statements, args.input_dir, args.workers)
+    else:
+        run_interactive()
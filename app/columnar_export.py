@@ -0,0 +1,359 @@
+# columnar_export.py
+# ------------------
+# Columnar snapshot of the analytics tables, for notebooks and batch jobs that read whole tables at once.
+#
+# ✅ financial_data, derived_metrics, financial_ratios, stock_data and dividends are exported to Arrow IPC
+#    (default: uncompressed, memory-mapped without copying on read) or Parquet files, one per ticker and year:
+#      data/columnar/<table>/<ticker>/<year>-<generation>.arrow
+# ✅ manifest.json lists every partition with its row count and change marker, the column types and the
+#    universe data version (data_versions.py) the export started from
+# ✅ refreshes are incremental: one GROUP BY per table gives each (ticker, year) its row count and latest
+#    last_updated / calculated_at; only the partitions whose count or timestamp moved are read and rewritten.
+#    stock_data and dividends have no timestamp column, so their partitions follow the ticker's data version
+# ✅ new files never overwrite old ones: the manifest is written last (atomically), and a file is deleted only
+#    once neither the new manifest nor the previous one lists it. A reader holding the previous manifest keeps
+#    a consistent set until the next export; ColumnarSnapshot reloads the manifest if its files are gone
+#
+# pyarrow is optional (pip install pyarrow): the webapp and the pipeline do not need it, only this module does.
+#
+# Usage:
+#   python columnar_export.py [--format arrow|parquet] [--full] [--dir PATH] [--tables financial_data ...]
+#
+#   from columnar_export import ColumnarSnapshot
+#   snapshot = ColumnarSnapshot()
+#   snapshot.read_frame("financial_ratios", tickers=["AQ"], years=range(2020, 2025))
+#   snapshot.read_table("financial_data", columns=["company_ticker", "metric_name_ro", "value"])  # pyarrow.Table
+#   snapshot.is_current()       # False once any data version moved after the export
+
+import argparse
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    from .data_versions import get_universe_data_version
+    from .db import DATA_DIR, DB_PATH, read_connection
+except ImportError:
+    from data_versions import get_universe_data_version
+    from db import DATA_DIR, DB_PATH, read_connection
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+COLUMNAR_DIR = os.path.join(DATA_DIR, "columnar")
+MANIFEST_FILE = "manifest.json"
+FORMATS = {"arrow": ".arrow", "parquet": ".parquet"}
+UNDATED = "undated"
+
+# table: date column that gives the partition year, change marker column (None: the ticker's data version)
+EXPORT_TABLES = {
+    "financial_data": {"date": "period_end", "updated": "last_updated"},
+    "derived_metrics": {"date": "period_end", "updated": "calculated_at"},
+    "financial_ratios": {"date": "period_end", "updated": "calculated_at"},
+    "stock_data": {"date": "date", "updated": None},
+    "dividends": {"date": "ex_dividend_date", "updated": None},
+}
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("The columnar export needs pyarrow: pip install pyarrow")
+
+
+def _arrow_type(declared_type):
+    """SQLite declared type → Arrow type, by SQLite's affinity rules (dates are stored as ISO text)."""
+    declared = (declared_type or "").upper()
+    if "INT" in declared:
+        return pa.int64()
+    if "REAL" in declared or "FLOA" in declared or "DOUB" in declared:
+        return pa.float64()
+    return pa.string()
+
+
+def table_schema(conn, table):
+    """The Arrow schema of `table`, from its declared column types."""
+    return pa.schema([(name, _arrow_type(declared)) for _, name, declared, *_ in conn.execute(f"PRAGMA table_info({table})")])
+
+
+def _schema_from_manifest(columns):
+    return pa.schema([(name, pa.type_for_alias(type_name)) for name, type_name in columns.items()])
+
+
+def partition_signatures(conn, table):
+    """
+    {"<ticker>/<year>": {"rows": count, "updated": latest timestamp, "version": ticker data version}} for
+    every partition of `table`. Only one of "updated" / "version" is set, depending on the table.
+    """
+    spec = EXPORT_TABLES[table]
+    if spec["updated"]:
+        marker, join = f"MAX(t.{spec['updated']})", ""
+        columns = ("updated", "version")
+    else:
+        marker, join = "MAX(v.version)", "LEFT JOIN data_versions v ON v.company_ticker = t.company_ticker"
+        columns = ("version", "updated")
+
+    rows = conn.execute(f"""
+        SELECT t.company_ticker, COALESCE(SUBSTR(t.{spec['date']}, 1, 4), '{UNDATED}'), COUNT(*), {marker}
+        FROM {table} t {join}
+        GROUP BY 1, 2
+    """).fetchall()
+    return {
+        f"{ticker}/{year}": {"rows": count, columns[0]: mark, columns[1]: None}
+        for ticker, year, count, mark in rows
+    }
+
+
+def _column_array(values, arrow_type):
+    """
+    One column as an Arrow array of its declared type. SQLite does not enforce types, so a value of another
+    type is converted: to text in text columns, to a number (or null) in numeric ones.
+    """
+    try:
+        return pa.array(values, type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        if pa.types.is_string(arrow_type):
+            return pa.array([None if v is None else str(v) for v in values], type=arrow_type)
+        numbers = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce")
+        print(f"⚠️ {numbers.isna().sum() - sum(v is None for v in values)} non-numeric value(s) exported as null")
+        return pa.array(numbers, from_pandas=True).cast(arrow_type, safe=False)
+
+
+def read_ticker_partitions(conn, table, ticker, schema):
+    """
+    Every row of `ticker` in `table` as one Arrow table, built straight from the cursor, split into its
+    partitions without copying: yields (year, pyarrow.Table).
+    """
+    spec = EXPORT_TABLES[table]
+    rows = conn.execute(f"""
+        SELECT COALESCE(SUBSTR({spec['date']}, 1, 4), '{UNDATED}') AS _year, {', '.join(schema.names)}
+        FROM {table}
+        WHERE company_ticker = ?
+        ORDER BY _year, {spec['date']}, rowid
+    """, (ticker,)).fetchall()
+    if not rows:
+        return
+
+    years, *columns = zip(*rows)
+    data = pa.Table.from_arrays(
+        [_column_array(values, field.type) for values, field in zip(columns, schema)], schema=schema,
+    )
+    start = 0
+    for end in range(1, len(years) + 1):
+        if end == len(years) or years[end] != years[start]:
+            yield years[start], data.slice(start, end - start)
+            start = end
+
+
+def write_partition(data, path, file_format):
+    """Writes one partition (a pyarrow.Table) next to its final name and moves it into place."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    if file_format == "parquet":
+        pq.write_table(data, tmp_path, compression="zstd")
+    else:
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, data.schema) as writer:
+            writer.write_table(data)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(directory=COLUMNAR_DIR):
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(manifest, directory):
+    path = os.path.join(directory, MANIFEST_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def _remove_unlisted_files(manifests, directory, tables):
+    """
+    Deletes the partition files of `tables` that none of `manifests` lists (a file still mapped elsewhere is
+    left for next time).
+    """
+    listed = {
+        os.path.normpath(os.path.join(directory, part["path"]))
+        for manifest in manifests if manifest
+        for table in tables for part in manifest["tables"].get(table, {}).get("partitions", {}).values()
+    }
+    removed = 0
+    for table in tables:
+        for root, _, files in os.walk(os.path.join(directory, table)):
+            for name in files:
+                path = os.path.normpath(os.path.join(root, name))
+                if path not in listed:
+                    try:
+                        os.remove(path)
+                        removed += 1
+                    except OSError:
+                        pass
+    return removed
+
+
+def export_columnar(db_path=DB_PATH, directory=COLUMNAR_DIR, file_format="arrow", tables=None, full=False):
+    """
+    Brings the columnar snapshot in `directory` up to date with the database. Rewrites only the changed
+    partitions unless `full`, or the format or a table's columns changed since the last export.
+    Returns {table: {"written": n, "removed": n, "unchanged": n}}.
+    """
+    _require_pyarrow()
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown format: {file_format!r} (use {', '.join(FORMATS)})")
+    tables = list(tables or EXPORT_TABLES)
+
+    previous = last_export = load_manifest(directory)
+    if previous is None or previous.get("format") != file_format:
+        previous, full = {"generation": 0, "tables": {}}, True
+    generation = previous["generation"] + 1
+    manifest = {
+        "format": file_format,
+        "generation": generation,
+        "exported_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "data_version": None,
+        "tables": dict(previous["tables"]),
+    }
+
+    summary = {}
+    with read_connection(db_path) as conn:
+        manifest["data_version"] = get_universe_data_version(conn)
+        for table in tables:
+            schema = table_schema(conn, table)
+            columns = {field.name: str(field.type) for field in schema}
+            before = previous["tables"].get(table, {})
+            rewrite_all = full or before.get("columns") != columns
+            old_partitions = {} if rewrite_all else before.get("partitions", {})
+
+            signatures = partition_signatures(conn, table)
+            changed = {
+                key for key, signature in signatures.items()
+                if {k: v for k, v in old_partitions.get(key, {}).items() if k != "path"} != signature
+            }
+            partitions = {key: old_partitions[key] for key in signatures if key not in changed}
+
+            for ticker in sorted({key.split("/")[0] for key in changed}):
+                for year, data in read_ticker_partitions(conn, table, ticker, schema):
+                    key = f"{ticker}/{year}"
+                    if key not in changed:
+                        continue
+                    path = f"{table}/{ticker}/{year}-{generation}{FORMATS[file_format]}"
+                    write_partition(data, os.path.join(directory, path), file_format)
+                    partitions[key] = {"path": path, **signatures[key]}
+
+            manifest["tables"][table] = {"columns": columns, "partitions": partitions}
+            summary[table] = {
+                "written": len(changed),
+                "removed": len(set(old_partitions) - set(signatures)),
+                "unchanged": len(signatures) - len(changed),
+            }
+            print(f"📦 {table}: {summary[table]['written']} partition(s) written, "
+                  f"{summary[table]['removed']} removed, {summary[table]['unchanged']} unchanged")
+
+    os.makedirs(directory, exist_ok=True)
+    _save_manifest(manifest, directory)
+    # The previous generation's files stay for the readers that still hold its manifest
+    _remove_unlisted_files([manifest, last_export], directory, list(EXPORT_TABLES))
+    print(f"✅ Columnar snapshot (generation {generation}, {file_format}) written to {directory}")
+    return summary
+
+
+class ColumnarSnapshot:
+    """
+    Read access to an exported snapshot. Arrow IPC partitions are memory-mapped, so reading them copies
+    nothing and the OS pages in only the columns that are used; Parquet partitions are decoded on read.
+    The manifest is read once: call reload() to pick up a newer export. A read that finds its files deleted
+    (two exports ran since the manifest was read) reloads the manifest and retries once.
+    """
+
+    def __init__(self, directory=COLUMNAR_DIR):
+        _require_pyarrow()
+        self.directory = directory
+        self.reload()
+
+    def reload(self):
+        manifest = load_manifest(self.directory)
+        if manifest is None:
+            raise FileNotFoundError(f"No columnar snapshot in {self.directory}: run columnar_export.py first")
+        self.manifest = manifest
+        self._index = {}  # table: {ticker: {year: partition}}
+        for table, content in manifest["tables"].items():
+            index = self._index[table] = {}
+            for key, part in sorted(content["partitions"].items()):
+                ticker, year = key.split("/")
+                index.setdefault(ticker, {})[year] = part
+
+    @property
+    def tables(self):
+        return list(self.manifest["tables"])
+
+    def tickers(self, table):
+        return sorted(self._partitions(table))
+
+    def _partitions(self, table):
+        try:
+            return self._index[table]
+        except KeyError:
+            raise KeyError(f"Table {table!r} is not in the columnar snapshot") from None
+
+    def _read_file(self, path, columns):
+        if self.manifest["format"] == "parquet":
+            return pq.read_table(path, columns=columns, memory_map=True)
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        return table.select(columns) if columns else table
+
+    def read_table(self, table, tickers=None, years=None, columns=None):
+        """
+        The rows of `table` (optionally only some tickers / years, and columns) as one pyarrow.Table.
+        """
+        try:
+            return self._read_table(table, tickers, years, columns)
+        except FileNotFoundError:
+            self.reload()
+            return self._read_table(table, tickers, years, columns)
+
+    def _read_table(self, table, tickers, years, columns):
+        index = self._partitions(table)
+        tickers = sorted(index) if tickers is None else sorted({ticker.upper() for ticker in tickers})
+        years = None if years is None else {str(year) for year in years}
+        parts = [
+            self._read_file(os.path.join(self.directory, part["path"]), columns)
+            for ticker in tickers
+            for year, part in index.get(ticker, {}).items()
+            if years is None or year in years
+        ]
+        if not parts:
+            schema = _schema_from_manifest(self.manifest["tables"][table]["columns"])
+            return (schema if not columns else pa.schema([schema.field(c) for c in columns])).empty_table()
+        return pa.concat_tables(parts)
+
+    def read_frame(self, table, tickers=None, years=None, columns=None):
+        """read_table() as a pandas DataFrame."""
+        return self.read_table(table, tickers, years, columns).to_pandas()
+
+    def is_current(self, db_path=DB_PATH):
+        """True while no data version moved since the export started."""
+        with read_connection(db_path) as conn:
+            return get_universe_data_version(conn) == self.manifest["data_version"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the analytics tables to partitioned Arrow / Parquet files.")
+    parser.add_argument("--format", choices=list(FORMATS), default="arrow")
+    parser.add_argument("--dir", default=COLUMNAR_DIR, help="output directory (default: data/columnar)")
+    parser.add_argument("--tables", nargs="+", choices=list(EXPORT_TABLES), help="default: all")
+    parser.add_argument("--full", action="store_true", help="rewrite every partition")
+    args = parser.parse_args()
+    export_columnar(DB_PATH, args.dir, args.format, args.tables, args.full)
+
+
+if __name__ == "__main__":
+    main()
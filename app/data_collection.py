@@ -1,15 +1,16 @@
 import os
 import re
-import sqlite3
 from datetime import datetime
 
 import pandas as pd
 from openpyxl import load_workbook
 from rapidfuzz import fuzz
 
+from db import DB_PATH, write_connection
+from data_versions import bump_data_version
+
 # --- CONFIG ---
 INPUT_DIR = r"C:\Users\irina\Project Element\Data source\AQ\AQ_raw\AQ_clean_tables"
-DB_PATH = r"C:\Irina\Mosaiq8\app\data\financials.db"
 
 # --- Setup: Month translation + date normalization ---
 ro_months = {
@@ -44,9 +45,8 @@ def extract_parent_metric(sheetname):
 
 # --- DB Init ---
 def init_db(db_path):
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-    cur.execute("""
+    with write_connection(db_path) as conn:
+        conn.execute("""
     CREATE TABLE IF NOT EXISTS notes (
     note_id INTEGER PRIMARY KEY AUTOINCREMENT,
     company_ticker TEXT NOT NULL,
@@ -66,8 +66,6 @@ def init_db(db_path):
     UNIQUE (company_ticker, period_end, note_element)
 );
     """)
-    conn.commit()
-    return conn
 
 def insert_note_record(conn, data: dict):
     placeholders = ", ".join(data.keys())
@@ -88,7 +86,7 @@ def is_fuzzy_match(text, keywords, threshold=85):
     return any(fuzz.partial_ratio(text.lower(), k.lower()) >= threshold for k in keywords)
 
 # --- Main extraction ---
-def extract_interest_expense_from_file(filepath, conn):
+def extract_interest_expense_from_file(filepath, db_path):
     filename = os.path.basename(filepath)
     wb = load_workbook(filepath, data_only=True)
 
@@ -113,6 +111,7 @@ def extract_interest_expense_from_file(filepath, conn):
                     print(f"\n📄 {filename} | Sheet: {sheetname}")
                     print(f"🧾 Metric: {metric}")
 
+                    records = []
                     for i, (period_label, value) in enumerate(col_data, start=1):
                         if period_label is None:
                             print(f"⚠️ Skipping entry due to invalid period label in: {filename}")
@@ -135,8 +134,13 @@ def extract_interest_expense_from_file(filepath, conn):
                             "source": filename,
                             "content": None
                         }
-                        insert_note_record(conn, record)
-                    conn.commit()
+                        records.append(record)
+
+                    # One transaction per file; the data version bump invalidates the cached notes endpoints
+                    with write_connection(db_path) as conn:
+                        for record in records:
+                            insert_note_record(conn, record)
+                        bump_data_version(conn, {record["company_ticker"] for record in records})
                     return  # Stop after first match
 
 # --- Batch runner ---
@@ -150,7 +154,7 @@ def extract_date_from_filename(filename):
             pass
     return datetime.min  # fallback for bad formats
 
-def process_all_excels(directory, conn):
+def process_all_excels(directory, db_path):
     excel_files = [
         os.path.join(directory, f)
         for f in os.listdir(directory)
@@ -161,12 +165,11 @@ def process_all_excels(directory, conn):
     sorted_files = sorted(excel_files, key=extract_date_from_filename)
     print(sorted_files)
     for file_path in sorted_files:
-        extract_interest_expense_from_file(file_path, conn)
+        extract_interest_expense_from_file(file_path, db_path)
 
 
 # --- Run ---
 if __name__ == "__main__":
-    conn = init_db(DB_PATH)
-    process_all_excels(INPUT_DIR, conn)
-    conn.close()
+    init_db(DB_PATH)
+    process_all_excels(INPUT_DIR, DB_PATH)
     print("✅ Done: All matched notes inserted into the database.")
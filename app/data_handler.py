@@ -1,4 +1,5 @@
 import yfinance as yf
+import numpy as np
 import pandas as pd
 import sqlite3
 import logging
@@ -9,21 +10,32 @@ import json
 import re
 from collections import OrderedDict
 from collections import defaultdict
+from contextlib import contextmanager
 import time
 from babel.dates import format_date
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Path to app/ directory
-DATA_DIR = os.path.join(BASE_DIR, "data")  # Path to data/
+try:
+    from .db import DATA_DIR, get_read_connection
+except ImportError:
+    from db import DATA_DIR, get_read_connection
+
 desc_dir = os.path.join(DATA_DIR, "business_descriptions")
 COMPANY_INFO_FILE = os.path.join(DATA_DIR, "company_info.csv")  # Full path to CSV
-DB_PATH = os.path.join(DATA_DIR, "financials.db")  # Full path to database
 
-def get_company_details_from_db(ticker):
+@contextmanager
+def _connection(conn=None):
+    """
+    Yields the caller's connection when one is passed in, otherwise this thread's pooled read connection.
+    Lets the page-level loaders share a single connection across all the get_* functions below.
+    """
+    yield conn if conn is not None else get_read_connection()
+
+def get_company_details_from_db(ticker, conn=None):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT company_name, industry FROM companies WHERE company_ticker = ?", (ticker.upper(),))
-        result = cursor.fetchone()
+        with _connection(conn) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT company_name, industry FROM companies WHERE company_ticker = ?", (ticker.upper(),))
+            result = cursor.fetchone()
         if result:
             return {"company_name": result[0], "industry": result[1]}
         else:
@@ -39,33 +51,31 @@ def get_company_details_from_db(ticker):
         logging.exception(f"Unexpected error while fetching company details for '{ticker}': {e}")
         return {"company_name": ticker, "industry": "N/A"}
 
-def get_latest_stock_indicators(ticker):
-    conn = sqlite3.connect(DB_PATH)
+def get_latest_stock_indicators(ticker, conn=None):
     query = """
-        SELECT close_price, market_cap, pe_ratio, date
-        FROM stock_data
+        SELECT close_price, market_cap, pe_ratio, price_date
+        FROM latest_snapshot
         WHERE company_ticker = ?
-        ORDER BY ABS(julianday(date) - julianday('now')) ASC
-        LIMIT 1
     """
     try:
-        cursor = conn.cursor()
-        cursor.execute(query, (ticker.upper(),))
-        result = cursor.fetchone()
-        if result:
-            return {
-                "last_price": result[0],
-                "market_cap": result[1],
-                "pe_ratio": result[2],
-                "ref_date": result[3]  # Optional: for debug or display
-            }
-        else:
-            return {
-                "last_price": "N/A",
-                "market_cap": "N/A",
-                "pe_ratio": "N/A",
-                "ref_date": "N/A"
-            }
+        with _connection(conn) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, (ticker.upper(),))
+            result = cursor.fetchone()
+            if result and result[3] is not None:
+                return {
+                    "last_price": result[0],
+                    "market_cap": result[1],
+                    "pe_ratio": result[2],
+                    "ref_date": result[3]  # Optional: for debug or display
+                }
+            else:
+                return {
+                    "last_price": "N/A",
+                    "market_cap": "N/A",
+                    "pe_ratio": "N/A",
+                    "ref_date": "N/A"
+                }
     except Exception as e:
         print(f"Error retrieving stock indicators: {e}")
         return {
@@ -74,30 +84,22 @@ def get_latest_stock_indicators(ticker):
             "pe_ratio": "N/A",
             "ref_date": "N/A"
         }
-    finally:
-        conn.close()
 
-def get_latest_net_income(ticker):
-    conn = sqlite3.connect(DB_PATH)
+def get_latest_net_income(ticker, conn=None):
     query = """
-        SELECT f.value
-        FROM financial_data f
-        JOIN financial_metrics m ON f.metric_name_ro = m.metric_name_ro
-        WHERE f.company_ticker = ?
-        AND m.generalized_metric_eng = 'Net profit a.m.'
-        ORDER BY ABS(julianday(f.period_end) - julianday('now')) ASC
-        LIMIT 1
+        SELECT net_income
+        FROM latest_snapshot
+        WHERE company_ticker = ?
     """
     try:
-        cursor = conn.cursor()
-        cursor.execute(query, (ticker.upper(),))
-        result = cursor.fetchone()
-        return float(str(result[0]).replace(",", "")) if result else "N/A"
+        with _connection(conn) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, (ticker.upper(),))
+            result = cursor.fetchone()
+            return float(result[0]) if result and result[0] is not None else "N/A"
     except Exception as e:
         print(f"Error retrieving net income: {e}")
         return "N/A"
-    finally:
-        conn.close()
 
 def format_date_ro(date_str):
     try:
@@ -106,8 +108,7 @@ def format_date_ro(date_str):
     except:
         return date_str
     
-def get_next_earnings_date(ticker):
-    conn = sqlite3.connect(DB_PATH)
+def get_next_earnings_date(ticker, conn=None):
     query = """
         SELECT event_date 
         FROM financial_events 
@@ -116,81 +117,71 @@ def get_next_earnings_date(ticker):
         LIMIT 1
     """
     try:
-        cursor = conn.cursor()
-        cursor.execute(query, (ticker.upper(),))
-        result = cursor.fetchone()
-        return result[0] if result else "N/A"
+        with _connection(conn) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, (ticker.upper(),))
+            result = cursor.fetchone()
+            return result[0] if result else "N/A"
     except Exception as e:
         print(f"Error retrieving earnings date: {e}")
         return "N/A"
-    finally:
-        conn.close()
 
-def get_latest_price_variation(ticker):
-    conn = sqlite3.connect(DB_PATH)
+def get_latest_price_variation(ticker, conn=None):
     query = """
         SELECT change_day
-        FROM stock_data
+        FROM latest_snapshot
         WHERE company_ticker = ?
-          AND change_day IS NOT NULL
-        ORDER BY ABS(julianday(date) - julianday('now')) ASC
-        LIMIT 1
     """
     try:
-        cursor = conn.cursor()
-        cursor.execute(query, (ticker.upper(),))
-        result = cursor.fetchone()
-        return round(result[0], 2) if result else "N/A"
+        with _connection(conn) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, (ticker.upper(),))
+            result = cursor.fetchone()
+            return round(result[0], 2) if result and result[0] is not None else "N/A"
     except Exception as e:
         print(f"Error retrieving daily price variation: {e}")
         return "N/A"
-    finally:
-        conn.close()
 
-def get_latest_variation_changes(ticker):
-    conn = sqlite3.connect(DB_PATH)
+def get_latest_variation_changes(ticker, conn=None):
     query = """
         SELECT change_yoy, change_ytd
-        FROM stock_data
+        FROM latest_snapshot
         WHERE company_ticker = ?
-          AND change_yoy IS NOT NULL
-          AND change_ytd IS NOT NULL
-        ORDER BY ABS(julianday(date) - julianday('now')) ASC
-        LIMIT 1
     """
     try:
-        cursor = conn.cursor()
-        cursor.execute(query, (ticker.upper(),))
-        result = cursor.fetchone()
-        if result:
-            return {
-                "yoy_change": round(result[0], 2),
-                "ytd_change": round(result[1], 2)
-            }
-        else:
-            return {
-                "yoy_change": "N/A",
-                "ytd_change": "N/A"
-            }
+        with _connection(conn) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, (ticker.upper(),))
+            result = cursor.fetchone()
+            if result and result[0] is not None:
+                return {
+                    "yoy_change": round(result[0], 2),
+                    "ytd_change": round(result[1], 2)
+                }
+            else:
+                return {
+                    "yoy_change": "N/A",
+                    "ytd_change": "N/A"
+                }
     except Exception as e:
         print(f"Error retrieving YoY/YTD changes: {e}")
         return {
             "yoy_change": "N/A",
             "ytd_change": "N/A"
         }
-    finally:
-        conn.close()
 
-def get_stock_overview(ticker):
+def get_stock_overview(ticker, conn=None):
     """
     Combines company details, market indicators, income, and events into a single dictionary used for frontend display.
     """
-    # Fetch basic company info
-    company_details = get_company_details_from_db(ticker)
-    indicators = get_latest_stock_indicators(ticker)
-    net_income = get_latest_net_income(ticker)
-    earnings_date = get_next_earnings_date(ticker)
-    variation_changes = get_latest_variation_changes(ticker)
+    with _connection(conn) as conn:
+        # Fetch basic company info
+        company_details = get_company_details_from_db(ticker, conn=conn)
+        indicators = get_latest_stock_indicators(ticker, conn=conn)
+        net_income = get_latest_net_income(ticker, conn=conn)
+        earnings_date = get_next_earnings_date(ticker, conn=conn)
+        variation_changes = get_latest_variation_changes(ticker, conn=conn)
+        price_variation = get_latest_price_variation(ticker, conn=conn)
 
     # Get business description from local file
     txt_filename = f"{ticker.upper()}_about_ro.txt"
@@ -201,10 +192,10 @@ def get_stock_overview(ticker):
     except FileNotFoundError:
         business_description = "Descrierea companiei nu este disponibilă."
 
-    # Helper to clean numeric values
+    # Values are stored as numbers; missing ones ("N/A" / None) fall back to the default
     def clean_numeric(value, default="N/A"):
         try:
-            return float(str(value).replace(",", "").replace(" ", ""))
+            return float(value)
         except (ValueError, TypeError):
             return default
 
@@ -213,7 +204,7 @@ def get_stock_overview(ticker):
         "company_name": company_details.get("company_name", ticker),
         "industry": company_details.get("industry", "N/A"),
         "last_price": clean_numeric(indicators.get("last_price", "N/A")),
-        "price_variation": clean_numeric(get_latest_price_variation(ticker)),
+        "price_variation": clean_numeric(price_variation),
         "market_cap": clean_numeric(indicators.get("market_cap", "N/A")),
         "pe_ratio": clean_numeric(indicators.get("pe_ratio", "N/A")),
         "net_income": clean_numeric(net_income),
@@ -226,9 +217,8 @@ def get_stock_overview(ticker):
     return stock_data
 
 
-def get_historical_stock_data(ticker, period="1mo", interval="1d"):
-    conn=sqlite3.connect(DB_PATH)
-        # Map period to number of days
+def get_historical_stock_data(ticker, period="1mo", interval="1d", conn=None):
+    # Map period to number of days
     period_map = {
         "1d": 1,
         "5d": 5,
@@ -251,7 +241,8 @@ def get_historical_stock_data(ticker, period="1mo", interval="1d"):
 
         query += " ORDER BY date ASC"
 
-        df = pd.read_sql_query(query, conn, params=params)
+        with _connection(conn) as conn:
+            df = pd.read_sql_query(query, conn, params=params)
         if df.empty:
             return None
 
@@ -269,174 +260,175 @@ def get_historical_stock_data(ticker, period="1mo", interval="1d"):
         print(f"❌ Error retrieving historical data: {e}")
         return None
 
-    finally:
-        conn.close()
+EMPTY_STATEMENT_COLUMNS = {"metric_ids": [], "metric_names": [], "periods": [], "values": []}
 
-def get_financial_statement(ticker, statement_name, period_type, aggr_type):
-    conn = sqlite3.connect(DB_PATH)
-    
-    query = """
+def _statement_blocks(df, keys=()):
+    """
+    Pivots long (*keys, metric_id, metric_name, value, period_end) rows in one pass and slices the result
+    into one columnar block per distinct `keys` value:
+    {key tuple: {"metric_ids": [...], "metric_names": [...], "periods": ["dd-mm-YYYY", ...], "values": 2-D array}}.
+    period_end is ISO text, so sorting the strings sorts the periods chronologically without parsing dates.
+    A block only keeps the periods it has values for; missing values are NaN.
+    """
+    index = list(keys) + ["metric_id"]
+    wide = df.pivot(index=index, columns="period_end", values="value").sort_index(axis=1)
+    metric_names = df.drop_duplicates(subset=index).set_index(index)["metric_name"].reindex(wide.index).to_numpy()
+    metric_ids = wide.index.get_level_values("metric_id").to_numpy()
+    periods = np.array([f"{p[8:10]}-{p[5:7]}-{p[:4]}" for p in wide.columns])
+    values = wide.to_numpy(dtype=float)
+
+    if keys:
+        # The pivot index is sorted, so the rows of every key are contiguous
+        groups = wide.index.droplevel(-1)
+        starts = np.flatnonzero(~groups.duplicated())
+        block_keys = [key if isinstance(key, tuple) else (key,) for key in groups[starts]]
+    else:
+        starts, block_keys = np.array([0]), [()]
+    ends = np.append(starts[1:], len(wide))
+
+    blocks = {}
+    for key, start, end in zip(block_keys, starts, ends):
+        block_values = values[start:end]
+        keep = np.flatnonzero(~np.isnan(block_values).all(axis=0))
+        blocks[key] = {
+            "metric_ids": metric_ids[start:end].tolist(),
+            "metric_names": metric_names[start:end].tolist(),
+            "periods": periods[keep].tolist(),
+            "values": block_values[:, keep],
+        }
+    return blocks
+
+def _statement_rows(columns):
+    """
+    The ordered list of {metric_id, metric_name, values} dicts the templates iterate over, built from a
+    columnar block of _statement_blocks. Values are strings, as the templates have always received them.
+    """
+    values = columns["values"]
+    if not len(columns["metric_ids"]):
+        return []
+    present = ~np.isnan(values)
+    text = values.astype(str)
+    periods = np.array(columns["periods"])
+    return [
+        {
+            "metric_id": metric_id,
+            "metric_name": metric_name,
+            "values": OrderedDict(zip(periods[row_present].tolist(), row_text[row_present].tolist())),
+        }
+        for metric_id, metric_name, row_present, row_text
+        in zip(columns["metric_ids"], columns["metric_names"], present, text)
+    ]
+
+def _build_statement_rows(df):
+    """
+    Turns the long (metric_id, metric_name, value, period_end) rows of one statement into the
+    ordered list of {metric_id, metric_name, values} dicts the templates iterate over.
+    """
+    return _statement_rows(_statement_blocks(df)[()])
+
+def get_financial_statements(ticker, statement_names, period_type, aggr_type, conn=None, columnar=False):
+    """
+    Fetches several statements of one ticker with a single query.
+    Returns {statement_name: rows} in the same row format as get_financial_statement, or None on a database error.
+    With columnar=True each statement is a {metric_ids, metric_names, periods, values} block instead of rows.
+    """
+    statement_names = list(statement_names)
+    query = f"""
     SELECT 
+        f.statement_name,
         m.id AS metric_id, 
         m.metric_name_ro AS metric_name, 
         f.value, 
         f.period_end
     FROM financial_data f
-    JOIN financial_metrics m ON f.metric_name_ro = m.metric_name_ro
+    JOIN financial_metrics m
+      ON f.metric_name_ro = m.metric_name_ro
+     AND f.company_ticker = m.company_ticker
     WHERE f.company_ticker = ?
-    AND f.statement_name = ?
+    AND f.statement_name IN ({','.join('?' for _ in statement_names)})
     AND f.period_type = ?
     AND f.aggr_type = ?
-    ORDER BY m.id ASC, f.period_end ASC
     """
-    params = [ticker, statement_name, period_type, aggr_type]
+    params = [ticker] + statement_names + [period_type, aggr_type]
     
     print("👉 Query Parameters:", params)
     
     try:
-        df = pd.read_sql_query(query, conn, params=params)
+        with _connection(conn) as conn:
+            df = pd.read_sql_query(query, conn, params=params)
     except Exception as e:
         print(f"❌ Database Error: {e}")
         return None
-    finally:
-        conn.close()
-
-    if df.empty:
-        print(f"⚠️ No data found for {ticker} ({statement_name}, {period_type}, {aggr_type})")
-        return []
-
-    # Convert period_end to datetime for sorting
-    df["period_end"] = pd.to_datetime(df["period_end"], errors="coerce", dayfirst=True)
-    df = df.sort_values(by=["metric_id", "period_end"], ascending=[True, True])
 
-    # Pivot: metric_id as rows, period_end as columns
-    df_pivot = df.pivot(index="metric_id", columns="period_end", values="value")
-
-    # Convert pivoted columns to string format ("YYYY-MM-DD")
-    df_pivot.columns = pd.to_datetime(df_pivot.columns).strftime("%d-%m-%Y")
-
-    # Merge metric_name, keep metric_id for final sorting
-    df_pivot = df_pivot.merge(
-        df[['metric_id', 'metric_name']].drop_duplicates(),
-        on="metric_id"
-    ).set_index("metric_id")
-
-    # Convert columns to string for JSON
-    df_pivot.columns = [str(col) for col in df_pivot.columns]
-
-    # Build a list of rows to preserve order
-    final_list = []
-    for metric_id in df_pivot.index:
-        row = df_pivot.loc[metric_id]
-
-        # metric_name is a single value, the rest are actual periods
-        metric_name = row["metric_name"]
-        
-        # Remove "metric_name" so we only have date columns left
-        row_data = row.drop(labels=["metric_name"]).dropna()
-
-        # Build an ordered dictionary of period → value
-        sorted_periods = sorted(row_data.index, key=lambda x: datetime.strptime(x, "%Y-%m-%d"))
-        period_values = OrderedDict()
-        for period_col in sorted_periods:
-            period_values[period_col] = float(row_data[period_col]) if pd.notnull(row_data[period_col]) else None
-
-        final_list.append({
-            "metric_id": metric_id,
-            "metric_name": metric_name,
-            "values": period_values
-        })
-
-    # Debugging
-    print("\n✅ Final List Output:")
-    print(json.dumps(final_list, indent=4, ensure_ascii=False))
-
-    return final_list
+    blocks = _statement_blocks(df, keys=["statement_name"]) if not df.empty else {}
+    statements = {}
+    for statement_name in statement_names:
+        columns = blocks.get((statement_name,))
+        if columns is None:
+            print(f"⚠️ No data found for {ticker} ({statement_name}, {period_type}, {aggr_type})")
+            statements[statement_name] = dict(EMPTY_STATEMENT_COLUMNS) if columnar else []
+            continue
+        statements[statement_name] = columns if columnar else _statement_rows(columns)
+
+    return statements
+
+def get_financial_statement(ticker, statement_name, period_type, aggr_type, conn=None, columnar=False):
+    statements = get_financial_statements(ticker, [statement_name], period_type, aggr_type, conn=conn, columnar=columnar)
+    if statements is None:
+        return None
+    return statements[statement_name]
 
-def get_financial_statement(ticker, statement_name, period_type, aggr_type):
-    conn = sqlite3.connect(DB_PATH)
-    
-    query = """
-    SELECT 
-        m.id AS metric_id, 
-        m.metric_name_ro AS metric_name, 
-        f.value, 
+def get_bulk_financial_statements(tickers, statement_names, period_type, aggr_type, conn=None, columnar=False):
+    """
+    Fetches several statements of several tickers with a single query and a single pivot.
+    Returns an iterator of (ticker, {statement_name: rows}) in `tickers` order, in the same row format as
+    get_financial_statement (or columnar blocks with columnar=True), or None on a database error. The rows of
+    a ticker are only built when the iterator reaches it, so a streamed response can send the first company
+    before the last one is ready.
+    """
+    tickers = list(tickers)
+    statement_names = list(statement_names)
+    query = f"""
+    SELECT
+        f.company_ticker,
+        f.statement_name,
+        m.id AS metric_id,
+        m.metric_name_ro AS metric_name,
+        f.value,
         f.period_end
     FROM financial_data f
-    JOIN financial_metrics m ON f.metric_name_ro = m.metric_name_ro
-    WHERE f.company_ticker = ?
-    AND f.statement_name = ?
+    JOIN financial_metrics m
+      ON f.metric_name_ro = m.metric_name_ro
+     AND f.company_ticker = m.company_ticker
+    WHERE f.company_ticker IN ({','.join('?' for _ in tickers)})
+    AND f.statement_name IN ({','.join('?' for _ in statement_names)})
     AND f.period_type = ?
     AND f.aggr_type = ?
-    ORDER BY m.id ASC, f.period_end ASC
     """
-    params = [ticker, statement_name, period_type, aggr_type]
-    
-    print("👉 Query Parameters:", params)
-    
+    params = tickers + statement_names + [period_type, aggr_type]
+
     try:
-        df = pd.read_sql_query(query, conn, params=params)
+        with _connection(conn) as conn:
+            df = pd.read_sql_query(query, conn, params=params)
     except Exception as e:
         print(f"❌ Database Error: {e}")
         return None
-    finally:
-        conn.close()
-
-    if df.empty:
-        print(f"⚠️ No data found for {ticker} ({statement_name}, {period_type}, {aggr_type})")
-        return []
-
-    # Convert period_end to datetime for sorting
-    df["period_end"] = pd.to_datetime(df["period_end"], errors="coerce", dayfirst=True)
-    df = df.sort_values(by=["metric_id", "period_end"], ascending=[True, True])
-
-    # Pivot: metric_id as rows, period_end as columns
-    df_pivot = df.pivot(index="metric_id", columns="period_end", values="value")
-
-    # Convert pivoted columns to string format ("YYYY-MM-DD")
-    df_pivot.columns = pd.to_datetime(df_pivot.columns).strftime("%d-%m-%Y")
 
-    # Merge metric_name, keep metric_id for final sorting
-    df_pivot = df_pivot.merge(
-        df[['metric_id', 'metric_name']].drop_duplicates(),
-        on="metric_id"
-    ).set_index("metric_id")
-
-    # Convert columns to string for JSON
-    df_pivot.columns = [str(col) for col in df_pivot.columns]
-
-    # Build a list of rows to preserve order
-    final_list = []
-    for metric_id in df_pivot.index:
-        row = df_pivot.loc[metric_id]
-
-        # metric_name is a single value, the rest are actual periods
-        metric_name = row["metric_name"]
-        
-        # Remove "metric_name" so we only have date columns left
-        row_data = row.drop(labels=["metric_name"]).dropna()
-
-        # Build an ordered dictionary of period → value
-        sorted_periods = sorted(row_data.index, key=lambda x: datetime.strptime(x,"%d-%m-%Y"))
-        period_values = OrderedDict()
-        for period_col in sorted_periods:
-            period_values[period_col] = str(row_data[period_col])  # Convert to string if needed
-
-        final_list.append({
-            "metric_id": metric_id,
-            "metric_name": metric_name,
-            "values": period_values
-        })
+    blocks = _statement_blocks(df, keys=["company_ticker", "statement_name"]) if not df.empty else {}
 
-    # Debugging
-    print("\n✅ Final List Output:")
-    print(json.dumps(final_list, indent=4, ensure_ascii=False))
+    def statements_of(ticker):
+        statements = {}
+        for statement_name in statement_names:
+            columns = blocks.get((ticker, statement_name))
+            if columns is None:
+                statements[statement_name] = dict(EMPTY_STATEMENT_COLUMNS) if columnar else []
+                continue
+            statements[statement_name] = columns if columnar else _statement_rows(columns)
+        return statements
 
-    return final_list
-
-def get_grouped_financial_ratios(ticker, period_type, aggr_type):
-    conn = sqlite3.connect(DB_PATH)
+    return ((ticker, statements_of(ticker)) for ticker in tickers)
 
+def get_grouped_financial_ratios(ticker, period_type, aggr_type, conn=None):
     query = """
     SELECT 
         ratio_name_ro AS ratio_name,
@@ -453,12 +445,11 @@ def get_grouped_financial_ratios(ticker, period_type, aggr_type):
     params = [ticker, period_type, aggr_type]
 
     try:
-        df = pd.read_sql_query(query, conn, params=params)
+        with _connection(conn) as conn:
+            df = pd.read_sql_query(query, conn, params=params)
     except Exception as e:
         print(f"❌ Database Error (ratios): {e}")
         return {}
-    finally:
-        conn.close()
 
     if df.empty:
         return {}
@@ -484,8 +475,47 @@ def get_grouped_financial_ratios(ticker, period_type, aggr_type):
 
     return grouped
 
+def get_industry_stats(ticker, period_type, aggr_type, conn=None):
+    """
+    The precomputed industry statistics (industry_stats.py) of every ratio of `ticker`'s industry, with the
+    company's percentile among its peers. Keyed like get_grouped_financial_ratios: ratio_name_ro, then the
+    period as dd-mm-YYYY. Returns {} when the company has no industry or no statistics.
+    """
+    query = """
+        SELECT s.industry, s.ratio_name_ro, s.period_end, s.companies, s.median, s.q1, s.q3, s.mean, s.weighted_mean, p.percentile
+        FROM industry_stats s
+        LEFT JOIN industry_percentiles p
+          ON p.company_ticker = ? AND p.period_type = s.period_type AND p.aggr_type = s.aggr_type
+         AND p.ratio_name_eng = s.ratio_name_eng AND p.period_end = s.period_end
+        WHERE s.industry = (SELECT industry FROM companies WHERE company_ticker = ?)
+          AND s.period_type = ? AND s.aggr_type = ?
+        ORDER BY s.ratio_name_ro, s.period_end
+    """
+    try:
+        with _connection(conn) as conn:
+            rows = conn.execute(query, (ticker, ticker, period_type, aggr_type)).fetchall()
+    except sqlite3.Error as e:
+        print(f"❌ Database Error (industry stats): {e}")
+        return {}
+
+    if not rows:
+        return {}
+
+    ratios = defaultdict(OrderedDict)
+    for industry, ratio_name, period_end, companies, median, q1, q3, mean, weighted_mean, percentile in rows:
+        ratios[ratio_name][datetime.strptime(period_end, "%Y-%m-%d").strftime("%d-%m-%Y")] = {
+            "companies": companies,
+            "median": median,
+            "q1": q1,
+            "q3": q3,
+            "mean": mean,
+            "weighted_mean": weighted_mean,
+            "percentile": percentile,
+        }
+    return {"industry": rows[0][0], "ratios": ratios}
+
 def get_revenue_data(ticker, period_type="annual", aggr_type="cml"):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_read_connection()
     cursor = conn.cursor()
     cursor.execute("""
         SELECT f.period_end, f.value
@@ -499,7 +529,6 @@ def get_revenue_data(ticker, period_type="annual", aggr_type="cml"):
     """, (ticker, period_type, aggr_type))
 
     rows = cursor.fetchall()
-    conn.close()
 
     if not rows:
         return None
@@ -508,7 +537,7 @@ def get_revenue_data(ticker, period_type="annual", aggr_type="cml"):
     # Clean and format values
     revenue_data = {
         "periods": [pd.to_datetime(row[0], dayfirst=True).strftime("%d/%m/%Y") for row in rows],
-        "values": [float(str(row[1]).replace(",", "").replace(" ", "")) for row in rows if row[1] is not None]
+        "values": [float(row[1]) for row in rows if row[1] is not None]
     }
 
     return revenue_data
@@ -517,7 +546,7 @@ def get_segment_revenue_notes(ticker):
     """
     Fetch revenue note elements for the most recent period using Python-side date parsing.
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_read_connection()
     cursor = conn.cursor()
 
     # Step 1: Get all periods for this ticker with revenue notes
@@ -531,7 +560,6 @@ def get_segment_revenue_notes(ticker):
     periods = cursor.fetchall()
     print(periods)
     if not periods:
-        conn.close()
         return {"period":"N/A", "data": []}
 
     # Step 2: Parse to datetime and find the latest
@@ -542,7 +570,6 @@ def get_segment_revenue_notes(ticker):
         ).strftime("%Y-%m-%d")
     except Exception as e:
         print(f"❌ Date parsing error: {e}")
-        conn.close()
         return {"period": "N/A", "data": []}
 
 
@@ -557,7 +584,6 @@ def get_segment_revenue_notes(ticker):
     """
     cursor.execute(notes_query, (ticker, latest_period))
     rows = cursor.fetchall()
-    conn.close()
 
     segment_data = [{"label": note_element, "value": value} for note_element, value in rows]
 
@@ -566,7 +592,7 @@ def get_segment_revenue_notes(ticker):
     "data": segment_data}
 
 def get_profit_and_margin_data(ticker, period_type="annual", aggr_type="cml"):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_read_connection()
     cursor = conn.cursor()
 
     # --- 1. Fetch Profit net a.m. using JOIN on generalized_metric_ro ---
@@ -597,7 +623,6 @@ def get_profit_and_margin_data(ticker, period_type="annual", aggr_type="cml"):
 
     margin_data = cursor.fetchall()
     print("marja net:", margin_data)
-    conn.close()
 
     # Normalize and align by period_end
     profit_dict = {row[0]: row[1] for row in profit_data}
@@ -610,8 +635,8 @@ def get_profit_and_margin_data(ticker, period_type="annual", aggr_type="cml"):
         return None
 
     labels = [pd.strftime("%d/%m/%Y") if hasattr(pd, 'strftime') else pd for pd in common_periods]
-    profit_values = [float(str(profit_dict[per]).replace(",", "").replace(" ", "")) for per in common_periods]
-    margin_values = [float(str(margin_dict[per]).replace(",", "").replace(" ", "")) for per in common_periods]
+    profit_values = [float(profit_dict[per]) for per in common_periods]
+    margin_values = [float(margin_dict[per]) for per in common_periods]
 
     return {
         "periods": labels,
@@ -619,356 +644,85 @@ def get_profit_and_margin_data(ticker, period_type="annual", aggr_type="cml"):
         "margin": margin_values
     }
 
-def get_revenue_qtl_and_change_data(ticker):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # --- Fetch Revenue from view_financial_qtl ---
-    cursor.execute("""
-        SELECT v.period_end, v.display_period, v.value
-        FROM view_financial_qtl v
-        JOIN financial_metrics m 
-        ON v.metric_name_ro = m.metric_name_ro
-        AND v.company_ticker = m.company_ticker
-        WHERE v.company_ticker = ?
-        AND m.generalized_metric_eng = 'Revenue'
-        ORDER BY v.period_end ASC
-    """, (ticker,))
-    revenue_data = cursor.fetchall()
-    print("Revenue data:", revenue_data)
-
-    cursor.execute("""
-        SELECT period_end, display_period, value
-        FROM view_financial_ratios_qtl
-        WHERE company_ticker = ? AND ratio_name_eng = 'Revenue growth y/y'
-        ORDER BY period_end ASC
-    """, (ticker,))
-    change_data = cursor.fetchall()
-    print("Revenue change data:", change_data)
-
-    conn.close()
-
-    # --- Normalize and match periods
-    revenue_dict = {row[0]: (row[1], row[2]) for row in revenue_data}  # period_end: (display_period, value)
-    change_dict = {row[0]: row[2] for row in change_data}  # ✅ value, not display_period
-
-    common_periods = sorted(
-    p for p in (set(revenue_dict.keys()) & set(change_dict.keys()))
-    if change_dict[p] is not None and revenue_dict[p][1] is not None)[-8:]
-
-    if not common_periods:
-        return None
-
-    periods = [revenue_dict[p][0] for p in common_periods]
-    revenues = [float(str(revenue_dict[p][1]).replace(",", "").replace(" ", "")) for p in common_periods]
-    change_rate = [float(str(change_dict[p]).replace(",", "").replace(" ", "")) for p in common_periods]
-
-    return {
-        "periods": periods,
-        "revenues": revenues,
-        "change_rate": change_rate
-    }
-
-def get_operating_profit_qtl_and_margin_data(ticker):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # --- Fetch Revenue from view_financial_qtl ---
-    cursor.execute("""
-        SELECT v.period_end, v.display_period, v.value
-        FROM view_financial_qtl v
-        JOIN financial_metrics m 
-        ON v.metric_name_ro = m.metric_name_ro
-        AND v.company_ticker = m.company_ticker
-        WHERE v.company_ticker = ?
-        AND m.generalized_metric_eng = 'Operating profit'
-        ORDER BY v.period_end ASC
-    """, (ticker,))
-
-    operating_profit_data = cursor.fetchall()
-    print("Operating profit data:", operating_profit_data)
-
-    cursor.execute("""
-        SELECT period_end, display_period, value
-        FROM view_financial_ratios_qtl
-        WHERE company_ticker = ? AND ratio_name_eng = 'Operating profit margin'
-        ORDER BY period_end ASC
-    """, (ticker,))
-    operating_margin_data = cursor.fetchall()
-    print("Operating margin data:", operating_margin_data)
-
-    conn.close()
-
-    # --- Normalize and match periods
-    operating_profit_dict = {row[0]: (row[1], row[2]) for row in operating_profit_data}
-    margin_dict = {row[0]: row[2] for row in operating_margin_data}  
-
-    common_periods = sorted(
-    p for p in (set(operating_profit_dict.keys()) & set(margin_dict.keys()))
-    if margin_dict[p] is not None and operating_profit_dict[p][1] is not None)[-8:]
-
-    if not common_periods:
-        return None
-
-    periods = [operating_profit_dict[p][0] for p in common_periods]
-    operating_profit = [float(str(operating_profit_dict[p][1]).replace(",", "").replace(" ", "")) for p in common_periods]
-    operating_margin = [float(str(margin_dict[p]).replace(",", "").replace(" ", "")) for p in common_periods]
-
-    return {
-        "periods": periods,
-        "operating_profit": operating_profit,
-        "operating_margin": operating_margin
-    }
-
-def get_net_profit_qtl_and_margin_data(ticker):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # --- Fetch Revenue from view_financial_qtl ---
-    cursor.execute("""
-        SELECT v.period_end, v.display_period, v.value
-        FROM view_financial_qtl v
-        JOIN financial_metrics m 
-        ON v.metric_name_ro = m.metric_name_ro
-        AND v.company_ticker = m.company_ticker
-        WHERE v.company_ticker = ?
-        AND m.generalized_metric_eng = 'Net profit a.m.'
-        ORDER BY v.period_end ASC
-    """, (ticker,))
-
-    net_profit_data = cursor.fetchall()
-    print("Net profit data:", net_profit_data)
-
-    cursor.execute("""
-        SELECT period_end, display_period, value
-        FROM view_financial_ratios_qtl
-        WHERE company_ticker = ? AND ratio_name_eng = 'Net profit margin'
-        ORDER BY period_end ASC
-    """, (ticker,))
-    net_margin_data = cursor.fetchall()
-    print("Operating margin data:", net_margin_data)
-
-    conn.close()
-
-    # --- Normalize and match periods
-    net_profit_dict = {row[0]: (row[1], row[2]) for row in net_profit_data}
-    margin_dict = {row[0]: row[2] for row in net_margin_data}  
-
-    common_periods = sorted(
-    p for p in (set(net_profit_dict.keys()) & set(margin_dict.keys()))
-    if margin_dict[p] is not None and net_profit_dict[p][1] is not None)[-8:]
-
-    if not common_periods:
-        return None
+def get_chart_series_json(ticker, chart_type, period_type, conn=None):
+    """
+    Pre-serialized JSON of a fundamentals chart (see chart_series.py): one primary-key read.
+    Returns "null" when the ticker has no such series.
+    """
+    with _connection(conn) as conn:
+        row = conn.execute("""
+            SELECT payload FROM chart_series
+            WHERE company_ticker = ? AND chart_type = ? AND period_type = ?
+        """, (ticker, chart_type, period_type)).fetchone()
+    return row[0] if row else "null"
 
-    periods = [net_profit_dict[p][0] for p in common_periods]
-    net_profit = [float(str(net_profit_dict[p][1]).replace(",", "").replace(" ", "")) for p in common_periods]
-    net_margin = [float(str(margin_dict[p]).replace(",", "").replace(" ", "")) for p in common_periods]
+def get_chart_series(ticker, chart_type, period_type, conn=None):
+    return json.loads(get_chart_series_json(ticker, chart_type, period_type, conn=conn))
 
-    return {
-        "periods": periods,
-        "net_profit": net_profit,
-        "net_margin": net_margin
-    }
+def get_revenue_qtl_and_change_data(ticker, conn=None):
+    return get_chart_series(ticker, "revenue", "qtl", conn=conn)
 
-def get_chart_comment(ticker, chart_type, period_display):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT comment FROM chart_comments
-        WHERE company_ticker = ? AND chart_type = ? AND period_display = ?
-    """, (ticker, chart_type, period_display))
-    row = cursor.fetchone()
-    conn.close()
+def get_chart_comment(ticker, chart_type, period_display, conn=None):
+    with _connection(conn) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT comment FROM chart_comments
+            WHERE company_ticker = ? AND chart_type = ? AND period_display = ?
+        """, (ticker, chart_type, period_display))
+        row = cursor.fetchone()
     return row[0] if row else None
 
-def get_revenue_annual_and_change_data(ticker):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # --- Fetch Revenue from view_financial_qtl ---
-    cursor.execute("""
-        SELECT v.period_end, v.display_period, v.value
-        FROM view_financial_annual v
-        JOIN financial_metrics m 
-        ON v.metric_name_ro = m.metric_name_ro
-        AND v.company_ticker = m.company_ticker
-        WHERE v.company_ticker = ?
-        AND m.generalized_metric_eng = 'Revenue'
-        ORDER BY v.period_end ASC
-    """, (ticker,))
-    revenue_data = cursor.fetchall()
-    print("Revenue data:", revenue_data)
-
-    cursor.execute("""
-        SELECT period_end, display_period, value
-        FROM view_financial_ratios_annual
-        WHERE company_ticker = ? AND ratio_name_eng = 'Revenue growth y/y'
-        ORDER BY period_end ASC
-    """, (ticker,))
-    change_data = cursor.fetchall()
-    print("Revenue change data:", change_data)
-
-    conn.close()
-
-    # --- Normalize and match periods
-    revenue_dict = {row[0]: (row[1], row[2]) for row in revenue_data}  # period_end: (display_period, value)
-    change_dict = {row[0]: row[2] for row in change_data}  # ✅ value, not display_period
-
-    common_periods = sorted(
-    p for p in (set(revenue_dict.keys()) & set(change_dict.keys()))
-    if change_dict[p] is not None and revenue_dict[p][1] is not None)[-8:]
-
-    if not common_periods:
-        return None
-
-    periods = [revenue_dict[p][0] for p in common_periods]
-    revenues = [float(str(revenue_dict[p][1]).replace(",", "").replace(" ", "")) for p in common_periods]
-    change_rate = [float(str(change_dict[p]).replace(",", "").replace(" ", "")) for p in common_periods]
-
-    return {
-        "periods": periods,
-        "revenues": revenues,
-        "change_rate": change_rate
-    }
-
-def get_operating_profit_annual_and_margin_data(ticker):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # --- Fetch Revenue from view_financial_qtl ---
-    cursor.execute("""
-        SELECT v.period_end, v.display_period, v.value
-        FROM view_financial_annual v
-        JOIN financial_metrics m 
-        ON v.metric_name_ro = m.metric_name_ro
-        AND v.company_ticker = m.company_ticker
-        WHERE v.company_ticker = ?
-        AND m.generalized_metric_eng = 'Operating profit'
-        ORDER BY v.period_end ASC
-    """, (ticker,))
-    operating_profit_data = cursor.fetchall()
-    print("Operating profit data:", operating_profit_data)
-
-    cursor.execute("""
-        SELECT period_end, display_period, value
-        FROM view_financial_ratios_annual
-        WHERE company_ticker = ? AND ratio_name_eng = 'Operating profit margin'
-        ORDER BY period_end ASC
-    """, (ticker,))
-    operating_margin_data = cursor.fetchall()
-    print("Operating margin data:", operating_margin_data)
-
-    conn.close()
-
-    # --- Normalize and match periods
-    operating_profit_dict = {row[0]: (row[1], row[2]) for row in operating_profit_data}  # period_end: (display_period, value)
-    operating_margin_dict = {row[0]: row[2] for row in operating_margin_data}  # ✅ value, not display_period
-
-    common_periods = sorted(
-    p for p in (set(operating_profit_dict.keys()) & set(operating_margin_dict.keys()))
-    if operating_margin_dict[p] is not None and operating_profit_dict[p][1] is not None)[-8:]
-
-    if not common_periods:
-        return None
-
-    periods = [operating_profit_dict[p][0] for p in common_periods]
-    operating_profit = [float(str(operating_profit_dict[p][1]).replace(",", "").replace(" ", "")) for p in common_periods]
-    operating_margin = [float(str(operating_margin_dict[p]).replace(",", "").replace(" ", "")) for p in common_periods]
-
-    return {
-        "periods": periods,
-        "operating_profit": operating_profit,
-        "operating_margin": operating_margin
-    }
-
-def get_net_profit_annual_and_margin_data(ticker):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # --- Fetch Revenue from view_financial_qtl ---
-    cursor.execute("""
-        SELECT v.period_end, v.display_period, v.value
-        FROM view_financial_annual v
-        JOIN financial_metrics m 
-        ON v.metric_name_ro = m.metric_name_ro
-        AND v.company_ticker = m.company_ticker
-        WHERE v.company_ticker = ?
-        AND m.generalized_metric_eng = 'Net profit a.m.'
-        ORDER BY v.period_end ASC
-    """, (ticker,))
-    net_profit_data = cursor.fetchall()
-    print("Net profit data:", net_profit_data)
-
-    cursor.execute("""
-        SELECT period_end, display_period, value
-        FROM view_financial_ratios_annual
-        WHERE company_ticker = ? AND ratio_name_eng = 'Net profit margin'
-        ORDER BY period_end ASC
-    """, (ticker,))
-    net_margin_data = cursor.fetchall()
-    print("Net profit margin data:", net_margin_data)
-
-    conn.close()
-
-    # --- Normalize and match periods
-    net_profit_dict = {row[0]: (row[1], row[2]) for row in net_profit_data}  # period_end: (display_period, value)
-    net_margin_dict = {row[0]: row[2] for row in net_margin_data}  # ✅ value, not display_period
-
-    common_periods = sorted(
-    p for p in (set(net_profit_dict.keys()) & set(net_margin_dict.keys()))
-    if net_margin_dict[p] is not None and net_profit_dict[p][1] is not None)[-8:]
-
-    if not common_periods:
-        return None
-
-    periods = [net_profit_dict[p][0] for p in common_periods]
-    net_profit = [float(str(net_profit_dict[p][1]).replace(",", "").replace(" ", "")) for p in common_periods]
-    net_margin = [float(str(net_margin_dict[p]).replace(",", "").replace(" ", "")) for p in common_periods]
-
-    return {
-        "periods": periods,
-        "net_profit": net_profit,
-        "net_margin": net_margin
-    }
-def get_dividends(ticker):
+def get_chart_comments(ticker, chart_types, period_display, conn=None):
+    """
+    Fetches the comments of several charts for the same period in one query.
+    Returns {chart_type: comment}, with None for charts that have no comment.
+    """
+    chart_types = list(chart_types)
+    with _connection(conn) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT chart_type, comment FROM chart_comments
+            WHERE company_ticker = ? AND period_display = ?
+              AND chart_type IN ({','.join('?' for _ in chart_types)})
+        """, [ticker, period_display] + chart_types)
+        rows = dict(cursor.fetchall())
+    return {chart_type: rows.get(chart_type) for chart_type in chart_types}
+
+def get_dividends(ticker, conn=None):
     """
     Fetch dividend data for a given ticker as a list of dicts.
     """
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row  # Enables column name access
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT
-            DPS_year,
-            DPS_value,
-            dividends_yoy_change,      
-            net_profit,
-            total_dividends,
-            payout_ratio,
-            dividend_yield,
-            fcfe,
-            dividends_to_fcfe,
-            ex_dividend_date,
-            payment_date,
-            dividend_type,
-            dividend_status
-        FROM dividends
-        WHERE company_ticker = ?
-        ORDER BY ex_dividend_date DESC
-    """, (ticker,))
-
-    rows = cursor.fetchall()
-    conn.close()
+    with _connection(conn) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT
+                DPS_year,
+                DPS_value,
+                dividends_yoy_change,      
+                net_profit,
+                total_dividends,
+                payout_ratio,
+                dividend_yield,
+                fcfe,
+                dividends_to_fcfe,
+                ex_dividend_date,
+                payment_date,
+                dividend_type,
+                dividend_status
+            FROM dividends
+            WHERE company_ticker = ?
+            ORDER BY ex_dividend_date DESC
+        """, (ticker,))
+        columns = [col[0] for col in cursor.description]  # Enables column name access
+        rows = cursor.fetchall()
 
     # Convert rows to list of dicts
-    return [dict(row) for row in rows]
+    return [dict(zip(columns, row)) for row in rows]
 
 def get_dividends_dps_and_growth(ticker):
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = get_read_connection()
     cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
 
     cursor.execute("""
         SELECT DPS_year, DPS_value, dividends_yoy_change
@@ -977,7 +731,6 @@ def get_dividends_dps_and_growth(ticker):
     """, (ticker,))
     
     rows = cursor.fetchall()
-    conn.close()
 
     grouped = defaultdict(lambda: {"DPS_value": 0, "dividends_yoy_change": None})
     for row in rows:
@@ -992,9 +745,9 @@ def get_dividends_dps_and_growth(ticker):
     ]
 
 def get_dividend_yield_history(ticker):
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = get_read_connection()
     cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
 
     cursor.execute("""
         SELECT DPS_year, dividend_yield
@@ -1003,7 +756,6 @@ def get_dividend_yield_history(ticker):
     """, (ticker,))
     
     rows = cursor.fetchall()
-    conn.close()
 
     grouped = defaultdict(float)
     for row in rows:
@@ -1012,9 +764,9 @@ def get_dividend_yield_history(ticker):
     return [{"year": year, "dividend_yield": val} for year, val in sorted(grouped.items())]
 
 def get_payout_ratio_history(ticker):
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = get_read_connection()
     cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
 
     cursor.execute("""
         SELECT DPS_year, payout_ratio
@@ -1023,7 +775,6 @@ def get_payout_ratio_history(ticker):
     """, (ticker,))
     
     rows = cursor.fetchall()
-    conn.close()
 
     grouped = defaultdict(float)
     for row in rows:
@@ -1032,9 +783,9 @@ def get_payout_ratio_history(ticker):
     return [{"year": year, "payout_ratio": val} for year, val in sorted(grouped.items())]
 
 def get_dividends_to_fcfe_history(ticker):
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = get_read_connection()
     cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
 
     cursor.execute("""
         SELECT DPS_year, dividends_to_fcfe
@@ -1043,7 +794,6 @@ def get_dividends_to_fcfe_history(ticker):
     """, (ticker,))
     
     rows = cursor.fetchall()
-    conn.close()
 
     grouped = defaultdict(float)
     for row in rows:
@@ -1052,9 +802,9 @@ def get_dividends_to_fcfe_history(ticker):
     return [{"year": year, "dividends_to_fcfe": val} for year, val in sorted(grouped.items())]
 
 def get_calendar_events():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = get_read_connection()
     cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
 
     cursor.execute("""
         SELECT
@@ -1072,7 +822,6 @@ def get_calendar_events():
         ORDER BY fe.event_date
     """)
     rows = cursor.fetchall()
-    conn.close()
 
     events = []
     for r in rows:
@@ -1108,4 +857,46 @@ def get_calendar_events():
             }
         })
 
-    return events
\ No newline at end of file
+    return events
+
+ANALYSIS_STATEMENTS = {
+    "pl_statement": "Profit&Loss",
+    "bs_statement": "Balance Sheet",
+    "cf_statement": "Cash Flow",
+}
+
+ANALYSIS_CHART_COMMENTS = {
+    "comment_revenue_growth": "revenue_qtl_and_change_data",
+    "comment_operating_profit": "operating_profit_qtl_and_margin_data",
+    "comment_net_profit": "net_profit_qtl_and_margin_data",
+}
+
+def get_analysis_page_data(ticker, period_type="annual", aggr_type="cml"):
+    """
+    Assembles everything the /analysis/<ticker> page needs through one connection.
+    The three statements and the three chart comments are each fetched with a single query.
+
+    Returns a dict with the keys: stock_info, historical_data, revenue_data, latest_quarter,
+    statements, grouped_ratios, chart_comments and dividends.
+    """
+    with _connection() as conn:
+        stock_info = get_stock_overview(ticker, conn=conn)
+        historical_data = get_historical_stock_data(ticker, conn=conn)
+        revenue_data = get_revenue_qtl_and_change_data(ticker, conn=conn)
+        latest_quarter = revenue_data["periods"][-1] if revenue_data and revenue_data["periods"] else "N/A"
+
+        chart_comments = get_chart_comments(ticker, ANALYSIS_CHART_COMMENTS.values(), latest_quarter, conn=conn)
+        statements = get_financial_statements(ticker, ANALYSIS_STATEMENTS.values(), period_type, aggr_type, conn=conn) or {}
+        grouped_ratios = get_grouped_financial_ratios(ticker, period_type, aggr_type, conn=conn)
+        dividends = get_dividends(ticker, conn=conn)
+
+    return {
+        "stock_info": stock_info,
+        "historical_data": historical_data,
+        "revenue_data": revenue_data,
+        "latest_quarter": latest_quarter,
+        "statements": {key: statements.get(name, []) for key, name in ANALYSIS_STATEMENTS.items()},
+        "grouped_ratios": grouped_ratios,
+        "chart_comments": {key: chart_comments.get(chart_type) for key, chart_type in ANALYSIS_CHART_COMMENTS.items()},
+        "dividends": dividends,
+    }
@@ -0,0 +1,71 @@
+# data_versions.py
+# ----------------
+# A version counter per ticker, bumped by every script that writes data shown for that ticker
+# (update_db, ratios, derived_metrics, dividends, stock_data, price_downloader).
+#
+# The webapp tags cached responses with it (cache.py): a response is reused, and an ETag answered
+# with 304, only while the ticker's version is unchanged. The ingestion scripts run in other
+# processes, so the version lives in the database and costs one primary-key read per request.
+#
+# GLOBAL_KEY is a version shared by all tickers, for writes that are not about one company
+# (e.g. metric aliases).
+
+from datetime import datetime, timezone
+
+GLOBAL_KEY = "*"
+
+CREATE_DATA_VERSIONS = """
+    CREATE TABLE IF NOT EXISTS data_versions (
+        company_ticker TEXT PRIMARY KEY,
+        version INTEGER NOT NULL,
+        updated_at TEXT NOT NULL
+    )
+"""
+
+
+def _utc_now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def bump_data_version(conn, tickers=None):
+    """
+    Increments the data version of `tickers` (the global version when None) on the caller's connection (no commit).
+    """
+    if tickers is None:
+        tickers = [GLOBAL_KEY]
+    elif isinstance(tickers, str):
+        tickers = [tickers]
+
+    now = _utc_now()
+    conn.executemany("""
+        INSERT INTO data_versions (company_ticker, version, updated_at)
+        VALUES (?, 1, ?)
+        ON CONFLICT(company_ticker) DO UPDATE SET
+            version = version + 1,
+            updated_at = excluded.updated_at
+    """, [(ticker, now) for ticker in sorted(set(tickers))])
+    return len(tickers)
+
+
+def get_data_version(conn, ticker=None):
+    """
+    Returns (version, updated_at) for `ticker`: its own version plus the global one (both only ever grow,
+    so the sum changes whenever either does) and the time of the latest bump as a UTC datetime (None if never bumped).
+    """
+    version, updated_at = conn.execute("""
+        SELECT COALESCE(SUM(version), 0), MAX(updated_at)
+        FROM data_versions
+        WHERE company_ticker IN (?, ?)
+    """, (ticker or GLOBAL_KEY, GLOBAL_KEY)).fetchone()
+    if updated_at is not None:
+        updated_at = datetime.strptime(updated_at, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+    return version, updated_at
+
+
+def get_universe_data_version(conn):
+    """
+    Returns a version that changes whenever any ticker's (or the global) version does, for caches that
+    hold data about every company at once (e.g. the screener snapshot). One row per ticker, so the
+    sum stays cheap.
+    """
+    return conn.execute("SELECT COALESCE(SUM(version), 0) FROM data_versions").fetchone()[0]
@@ -0,0 +1,169 @@
+# db.py
+# -----
+# Process-wide SQLite connection manager shared by the webapp and the ingestion scripts.
+#
+# ✅ Read connections are opened read-only and kept open per thread (one per gunicorn/Flask worker thread),
+#    so a request no longer pays the open + schema parse cost for every query.
+# ✅ All writes go through a single writer connection per database, serialized with a lock.
+# ✅ The database runs in WAL mode, so readers keep serving pages while an ingestion script writes.
+#
+# Usage:
+#   from db import DB_PATH, read_connection, write_connection
+#
+#   with read_connection() as conn:
+#       df = pd.read_sql_query("SELECT ...", conn)
+#
+#   with write_connection() as conn:      # commits on success, rolls back on error
+#       conn.executemany("INSERT ...", rows)
+#
+# Connections handed out here are owned by the pool: never call conn.close() on them.
+#
+# Scripts apply pending schema migrations the first time they open a database. The webapp does not
+# (create_app() sets MIGRATE_ON_OPEN = False): migrations run at deploy time (`python app/migrations.py`,
+# the Procfile release step), never inside a request, and a worker refuses to serve an outdated schema.
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+try:
+    from .migrations import MIGRATIONS, apply_migrations, get_schema_version
+except ImportError:
+    from migrations import MIGRATIONS, apply_migrations, get_schema_version
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Path to app/ directory
+DATA_DIR = os.path.join(BASE_DIR, "data")  # Path to data/
+DB_PATH = os.environ.get("FINANCIALS_DB_PATH", os.path.join(DATA_DIR, "financials.db"))  # Full path to database
+
+# Applied to every pooled connection
+CONNECTION_PRAGMAS = {
+    "mmap_size": 256 * 1024 * 1024,   # Memory-map up to 256 MB of the database file
+    "cache_size": -64 * 1024,         # Negative value = KiB, i.e. a 64 MB page cache per connection
+    "temp_store": "MEMORY",           # Sorts and temporary b-trees stay in RAM
+    "busy_timeout": 5000,             # Wait up to 5s on a lock instead of failing immediately
+}
+
+# False in the webapp: a database with pending migrations raises instead of being migrated on first use
+MIGRATE_ON_OPEN = True
+# Seconds a migrating process waits for another one that is already applying the same migrations
+MIGRATION_BUSY_TIMEOUT = 600
+
+# Applied to the writer connection only
+WRITER_PRAGMAS = {
+    "synchronous": "NORMAL",          # Safe with WAL, avoids an fsync per transaction
+}
+
+_local = threading.local()
+_state_lock = threading.Lock()
+_prepared_paths = set()
+_writers = {}
+_writer_locks = {}
+
+
+def _normalize_path(db_path):
+    return os.path.abspath(db_path or DB_PATH)
+
+
+def _apply_pragmas(conn, pragmas):
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+def _prepare_database(db_path):
+    """
+    Switches the database to WAL mode and applies pending schema migrations (MIGRATE_ON_OPEN), once per
+    process. Both are persistent, so this is a no-op for databases that are already up to date.
+    """
+    with _state_lock:
+        if db_path in _prepared_paths:
+            return
+        conn = sqlite3.connect(db_path, timeout=MIGRATION_BUSY_TIMEOUT)
+        try:
+            conn.execute("PRAGMA journal_mode = WAL")
+            if MIGRATE_ON_OPEN:
+                apply_migrations(conn)
+            else:
+                current, latest = get_schema_version(conn), max(version for version, *_ in MIGRATIONS)
+                if current < latest:
+                    raise RuntimeError(
+                        f"{db_path} is at schema version {current}, expected {latest}: run python app/migrations.py"
+                    )
+        finally:
+            conn.close()
+        _prepared_paths.add(db_path)
+
+
+def _thread_connections():
+    # Connections must not be shared across a fork (gunicorn workers): start fresh in a new process
+    if getattr(_local, "pid", None) != os.getpid():
+        _local.pid = os.getpid()
+        _local.connections = {}
+    return _local.connections
+
+
+def get_read_connection(db_path=None):
+    """
+    Returns this thread's read-only connection to `db_path`, opening it on first use.
+    """
+    db_path = _normalize_path(db_path)
+    connections = _thread_connections()
+    conn = connections.get(db_path)
+    if conn is None:
+        _prepare_database(db_path)
+        conn = sqlite3.connect(f"file:{pathname2url(db_path)}?mode=ro", uri=True)
+        _apply_pragmas(conn, CONNECTION_PRAGMAS)
+        connections[db_path] = conn
+    return conn
+
+
+@contextmanager
+def read_connection(db_path=None):
+    """
+    Context manager around get_read_connection(). The connection stays open in the pool afterwards.
+    """
+    yield get_read_connection(db_path)
+
+
+@contextmanager
+def write_connection(db_path=None):
+    """
+    Yields the single writer connection for `db_path` while holding its lock.
+    Commits when the block finishes and rolls back if it raises.
+    """
+    db_path = _normalize_path(db_path)
+    with _state_lock:
+        lock = _writer_locks.setdefault(db_path, threading.RLock())
+
+    with lock:
+        conn = _writers.get(db_path)
+        if conn is None or conn[0] != os.getpid():
+            _prepare_database(db_path)
+            writer = sqlite3.connect(db_path, check_same_thread=False)
+            _apply_pragmas(writer, CONNECTION_PRAGMAS)
+            _apply_pragmas(writer, WRITER_PRAGMAS)
+            conn = _writers[db_path] = (os.getpid(), writer)
+
+        writer = conn[1]
+        try:
+            yield writer
+            writer.commit()
+        except Exception:
+            writer.rollback()
+            raise
+
+
+def close_all():
+    """
+    Closes this thread's read connections and every writer connection (e.g. at the end of a script).
+    """
+    for conn in _thread_connections().values():
+        conn.close()
+    _local.connections = {}
+
+    with _state_lock:
+        for pid, writer in _writers.values():
+            if pid == os.getpid():
+                writer.close()
+        _writers.clear()
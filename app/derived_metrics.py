@@ -5,22 +5,22 @@
 
 # ✅ Uses `generalized_metric_eng` as the unified name for calculations.
 # ✅ Integrates with `helpers.py` to resolve all known aliases for a standardized metric name
+# ✅ Evaluation order comes from the dependency graph between definitions (a metric whose `required_metrics`
+#    names another derived metric runs after it), so adding a metric never requires editing an order list.
 
 #TO DO:
 # - de acomodat cazul in care daca compania are datorii purtatoare de dobanda>0 atunci, interest_expense este obligatoriu (dupa ce adauog interest expense)
 # - de completat tickers list
 # - de completat DERIVED_METRIC_DEFINITIONS cu alti indicatori
 
-import sqlite3
 import pandas as pd
-import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
+from graphlib import TopologicalSorter
 from helpers import get_aliases_for
-
-
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Path to app/ directory
-DATA_DIR = os.path.join(BASE_DIR, "data")  # Path to data/
-DB_PATH = os.path.join(DATA_DIR, "financials.db")  # Full path to database
+from data_versions import bump_data_version
+from display_periods import PERIOD_COLUMNS, period_columns
+from db import DB_PATH, read_connection, write_connection
 
 
 def calculate_ebit(net_income, interest_expense, taxes):
@@ -130,21 +130,83 @@ DERIVED_METRIC_DEFINITIONS = {
     # More metrics can be added here
 }
 
+# ------------------------------
+# Dependency Graph
+# ------------------------------
+def build_dependency_graph(definitions=DERIVED_METRIC_DEFINITIONS):
+    """
+    Returns {metric_key: set of derived metric keys it reads} from the `required_metrics` of each definition.
+    """
+    key_by_name = {metric_def["metric_name_eng"]: key for key, metric_def in definitions.items()}
+    return {
+        key: {
+            key_by_name[name]
+            for name in metric_def["required_metrics"].values()
+            if name in key_by_name and key_by_name[name] != key
+        }
+        for key, metric_def in definitions.items()
+    }
+
+
+def _with_dependencies(graph, metric_keys):
+    """
+    The requested metrics plus everything they (transitively) depend on.
+    """
+    needed, pending = set(), list(metric_keys)
+    while pending:
+        key = pending.pop()
+        if key not in needed:
+            needed.add(key)
+            pending.extend(graph[key])
+    return needed
+
+
 # ------------------------------
 # Derived Metric Calculation
 # ------------------------------
-def calculate_and_store_derived_metric(DB_PATH, ticker, metric_key, period_type, aggr_type):
-    if metric_key not in DERIVED_METRIC_DEFINITIONS:
-        print(f"❌ Metric '{metric_key}' is not defined in DERIVED_METRIC_DEFINITIONS.")
-        return None
+CREATE_DERIVED_METRICS = """
+    CREATE TABLE IF NOT EXISTS derived_metrics (
+        company_ticker TEXT,
+        period_start DATE,
+        period_end DATE,
+        period_type TEXT,
+        aggr_type TEXT,
+        metric_name_eng TEXT,
+        metric_name_ro TEXT,
+        value REAL,
+        formula TEXT,
+        calculated_at TEXT,
+        fiscal_year INTEGER,
+        fiscal_quarter INTEGER,
+        period_months INTEGER,
+        display_period TEXT,
+        PRIMARY KEY (company_ticker, period_end, period_type, aggr_type, metric_name_eng)
+    )
+"""
+
+PERIOD_KEYS = ["company_ticker", "period_start", "period_end", "period_type", "aggr_type"]
+INPUT_COLUMNS = PERIOD_KEYS + ["metric", "value"]
+RESULT_COLUMNS = PERIOD_KEYS + ["metric_name_eng", "metric_name_ro", "value", "formula", "calculated_at"]
 
-    metric_def = DERIVED_METRIC_DEFINITIONS[metric_key]
-    std_metric = metric_def["metric_name_eng"]
-    metric_labels = metric_def["required_metrics"]
 
-    # Step 1: Query raw data using standardized names only (assuming data already normalized)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+def load_derived_inputs(conn, tickers=None, metric_keys=None):
+    """
+    Reads every reported value (financial_data and notes) that `metric_keys` (all metrics when None) need,
+    for `tickers` (all tickers when None), in long format. Values of other derived metrics are not read
+    here: the scheduler passes them along in memory.
+    """
+    metric_keys = metric_keys or list(DERIVED_METRIC_DEFINITIONS)
+    metrics = sorted({
+        name
+        for key in metric_keys
+        for name in DERIVED_METRIC_DEFINITIONS[key]["required_metrics"].values()
+    })
+
+    metric_filter = ",".join("?" for _ in metrics)
+    ticker_filter, ticker_params = "", []
+    if tickers:
+        ticker_params = list(tickers)
+        ticker_filter = f"AND {{prefix}}company_ticker IN ({','.join('?' for _ in ticker_params)})"
 
     query = f"""
         SELECT 
@@ -157,194 +219,181 @@ def calculate_and_store_derived_metric(DB_PATH, ticker, metric_key, period_type,
             f.value
         FROM financial_data f
         JOIN financial_metrics m ON f.metric_name_ro = m.metric_name_ro
-        WHERE f.company_ticker = ?
-          AND f.period_type = ?
-          AND f.aggr_type = ?
-          AND m.generalized_metric_eng IN ({','.join('?' for _ in metric_labels.values())})
+        WHERE m.generalized_metric_eng IN ({metric_filter})
+          {ticker_filter.format(prefix="f.")}
     """
-    params = [ticker, period_type, aggr_type] + list(metric_labels.values())
-    df_raw = pd.read_sql_query(query, conn, params=params)
-
     query_notes = f"""
-    SELECT 
-        n.company_ticker,
-        n.period_start,
-        n.period_end,
-        n.period_type,
-        n.aggr_type,
-        m.generalized_metric_eng AS metric,
-        n.value
-    FROM notes n
-    JOIN financial_metrics m
-        ON n.note_element = m.metric_name_ro
-       AND n.company_ticker = m.company_ticker
-    WHERE n.company_ticker = ?
-      AND n.period_type = ?
-      AND n.aggr_type = ?
-      AND m.generalized_metric_eng IN ({','.join('?' for _ in metric_labels.values())})
-"""
-    params_notes = [ticker, period_type, aggr_type] + list(metric_labels.values())
-
-    df_notes = pd.read_sql_query(query_notes, conn, params=params_notes)
-    #df_notes["metric"] = df_notes["note_element"]  # unify column names
-    df_notes = df_notes[["company_ticker", "period_start", "period_end", "period_type", "aggr_type", "metric", "value"]]
-
-    print(df_notes)
-    query_derived = f"""
         SELECT 
-            company_ticker,
-            period_start,
-            period_end,
-            period_type,
-            aggr_type,
-            metric_name_eng AS metric,
-            value
-        FROM derived_metrics
-        WHERE company_ticker = ?
-          AND period_type = ?
-          AND aggr_type = ?
-          AND metric_name_eng IN ({','.join('?' for _ in metric_labels.values())})
+            n.company_ticker,
+            n.period_start,
+            n.period_end,
+            n.period_type,
+            n.aggr_type,
+            m.generalized_metric_eng AS metric,
+            n.value
+        FROM notes n
+        JOIN financial_metrics m
+            ON n.note_element = m.metric_name_ro
+           AND n.company_ticker = m.company_ticker
+        WHERE m.generalized_metric_eng IN ({metric_filter})
+          {ticker_filter.format(prefix="n.")}
     """
-    df_derived = pd.read_sql_query(query_derived, conn, params=params)
+    params = metrics + ticker_params
+    df_raw = pd.read_sql_query(query, conn, params=params)
+    df_notes = pd.read_sql_query(query_notes, conn, params=params)
 
-    # Combine both
-    df = pd.concat([df_raw, df_derived, df_notes], ignore_index=True)
-    conn.close()
+    df = pd.concat([df_raw, df_notes[INPUT_COLUMNS]], ignore_index=True)
+    df["value"] = df["value"].astype(float)
+    return df
 
-    if df.empty:
-        print(f"⚠️ No relevant data found for ticker '{ticker}' and metric '{metric_key}' — skipping.")
-        return None
 
-    # Clean numeric values
-    df["value"] = pd.to_numeric(df["value"].astype(str).str.replace(",", "", regex=False).str.replace(" ", ""), errors="coerce")
+def evaluate_derived_metric(metric_key, inputs, upstream=(), calculated_at=None):
+    """
+    Computes one derived metric for every ticker and period in `inputs`.
+    `upstream` holds the results of the derived metrics it depends on (as returned by this function).
+    Returns the rows to store, in the column layout of the derived_metrics table.
+    """
+    metric_def = DERIVED_METRIC_DEFINITIONS[metric_key]
+    metric_labels = metric_def["required_metrics"]
+    names = list(metric_labels.values())
+    calculated_at = calculated_at or datetime.now().isoformat()
 
-    #print(f"📌 Final combined dataset shape: {df.shape}")
-    #print("📌 Unique metrics found:", df["metric"].unique())
+    frames = [inputs[inputs["metric"].isin(names)]]
+    for result in upstream:
+        frames.append(result.rename(columns={"metric_name_eng": "metric"})[INPUT_COLUMNS])
+    df = pd.concat(frames, ignore_index=True)
+    df = df[df["metric"].isin(names)]
+    df["value"] = df["value"].astype(float)
 
+    if df.empty:
+        print(f"⚠️ No relevant data found for metric '{metric_key}' — skipping.")
+        return pd.DataFrame(columns=RESULT_COLUMNS)
 
-    # Pivot the data for easy access
-    df_pivot = df.pivot_table(
-        index=["company_ticker", "period_start", "period_end", "period_type", "aggr_type"],
-        columns="metric",
-        values="value"
-    ).reset_index()
-    missing_cols = [m for m in metric_labels.values() if m not in df_pivot.columns]
-    if missing_cols:
-        print("⚠️ Missing columns in pivot:", missing_cols)
-    print(df_pivot)
     results = []
-    for _, row in df_pivot.iterrows():
-        try:
-            args = [row.get(std_name) for std_name in metric_labels.values()]
-            #print("🧪 Inputs:", args)
-            #print("🧪 Metric being computed:", std_metric)
-
-            for label, std_name in metric_labels.items():
-                print(f"🔍 {label} => {std_name}: {row.get(std_name)}")
-                #print("📎 Required metrics:", metric_labels)
-
-            val = metric_def["function"](*args)
-        except Exception:
-            val = None
-
-        results.append({
-            "company_ticker": row["company_ticker"],
-            "period_start": row["period_start"],
-            "period_end": row["period_end"],
-            "period_type": row["period_type"],
-            "aggr_type": row["aggr_type"],
-            "metric_name_eng": std_metric,
-            "metric_name_ro": metric_def["metric_name_ro"],
-            "value": val,
-            "formula": metric_def["formula"],
-            "calculated_at": datetime.now().isoformat()
-        })
-
-    # Store results into derived_metrics table
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS derived_metrics (
-            company_ticker TEXT,
-            period_start DATE
-            period_end DATE,
-            period_type TEXT,
-            aggr_type TEXT,
-            metric_name_eng TEXT,
-            metric_name_ro TEXT,
-            value REAL,
-            formula TEXT,
-            calculated_at TEXT,
-            PRIMARY KEY (company_ticker, period_end, period_type, aggr_type, metric_name_eng)
-        )
-    """)
-
-    insert_query = """
-        INSERT OR REPLACE INTO derived_metrics (
-            company_ticker, period_start, period_end, period_type, aggr_type,
-            metric_name_eng, metric_name_ro, value, formula, calculated_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    # One pivot per ticker / period_type / aggr_type: a metric a company never reports in that view is passed
+    # to the function as None (so optional inputs default to 0), one missing for a single period as NaN.
+    for (ticker, period_type, aggr_type), group in df.groupby(["company_ticker", "period_type", "aggr_type"], sort=False):
+        df_pivot = group.pivot_table(index=PERIOD_KEYS, columns="metric", values="value").reset_index()
+        missing_cols = [m for m in names if m not in df_pivot.columns]
+        if missing_cols:
+            print(f"⚠️ {metric_key} | {ticker} | {period_type} | {aggr_type} — missing columns in pivot: {missing_cols}")
+
+        for row in df_pivot.to_dict("records"):
+            try:
+                val = metric_def["function"](*[row.get(std_name) for std_name in names])
+            except Exception:
+                val = None
+
+            results.append((
+                row["company_ticker"], row["period_start"], row["period_end"], row["period_type"], row["aggr_type"],
+                metric_def["metric_name_eng"], metric_def["metric_name_ro"],
+                None if val is None or pd.isna(val) else val,
+                metric_def["formula"], calculated_at
+            ))
+
+    print(f"✅ Computed {len(results)} rows for '{metric_key}'")
+    return pd.DataFrame(results, columns=RESULT_COLUMNS)
+
+
+def store_derived_metrics(conn, results):
     """
-
-    for r in results:
-        cursor.execute(insert_query, (
-            r["company_ticker"], r["period_start"], r["period_end"], r["period_type"], r["aggr_type"],
-            r["metric_name_eng"], r["metric_name_ro"], r["value"], r["formula"], r["calculated_at"]
-        ))
-
-    conn.commit()
-    conn.close()
-    print(f"✅ Stored {len(results)} derived rows for '{metric_key}' and '{ticker}'")
+    Upserts derived metric rows with a single executemany on the caller's connection.
+    """
+    conn.execute(CREATE_DERIVED_METRICS)
+    if results.empty:
+        return 0
+    rows = results[RESULT_COLUMNS].astype(object).where(results[RESULT_COLUMNS].notna(), None)
+    rows[PERIOD_COLUMNS] = period_columns(results)
+    columns = RESULT_COLUMNS + PERIOD_COLUMNS
+    conn.executemany(f"""
+        INSERT OR REPLACE INTO derived_metrics ({', '.join(columns)})
+        VALUES ({', '.join('?' for _ in columns)})
+    """, rows[columns].itertuples(index=False, name=None))
+    return len(results)
 
 
 # ------------------------------
 # Batch Derived Metrics Runner
 # ------------------------------
+def run_derived_metrics(DB_PATH, tickers=None, metric_keys=None, periods=None, period_ends=None, max_workers=4):
+    """
+    Computes `metric_keys` (all defined metrics when None) for `tickers` (all tickers when None),
+    optionally limited to a list of (period_type, aggr_type) `periods` and/or a set of
+    (ticker, "YYYY-MM-DD") `period_ends`. With `period_ends`, the metrics are computed over every period
+    of those tickers (so a metric missing only in a changed period is NaN there, as in a full run, not None),
+    and only the rows of `period_ends` are written, after removing the old ones.
+
+    Metrics are scheduled in topological order of build_dependency_graph(): independent branches
+    (e.g. EBIT, Interest-bearing debt, Capex) run in parallel threads, and a metric starts as soon as
+    the metrics it reads are done. Intermediate results are handed over in memory; everything is
+    written at the end in one transaction. Dependencies that were not requested are computed but not stored.
+    """
+    graph = build_dependency_graph()
+    targets = list(metric_keys or DERIVED_METRIC_DEFINITIONS)
+    needed = _with_dependencies(graph, targets)
+
+    if period_ends is not None:
+        period_tickers = {ticker for ticker, _ in period_ends}
+        tickers = sorted(period_tickers & set(tickers) if tickers else period_tickers)
+        if not tickers:
+            print("✅ No periods to recompute.")
+            return {}
+
+    with read_connection(DB_PATH) as conn:
+        inputs = load_derived_inputs(conn, tickers, needed)
+    if periods:
+        inputs = inputs[pd.Series(list(zip(inputs["period_type"], inputs["aggr_type"])), index=inputs.index).isin(periods)]
+    print(f"📊 Loaded {len(inputs)} reported values for {len(needed)} derived metric(s)")
+
+    sorter = TopologicalSorter({key: graph[key] for key in needed})
+    sorter.prepare()  # raises graphlib.CycleError if two definitions depend on each other
+    calculated_at = datetime.now().isoformat()
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        running = {}
+        while sorter.is_active():
+            for key in sorter.get_ready():
+                upstream = [results[dep] for dep in graph[key]]
+                running[pool.submit(evaluate_derived_metric, key, inputs, upstream, calculated_at)] = key
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = running.pop(future)
+                results[key] = future.result()
+                sorter.done(key)
+
+    with write_connection(DB_PATH) as conn:
+        if period_ends is not None:
+            names = [DERIVED_METRIC_DEFINITIONS[key]["metric_name_eng"] for key in targets]
+            conn.executemany(f"""
+                DELETE FROM derived_metrics
+                WHERE company_ticker = ? AND period_end = ? AND metric_name_eng IN ({','.join('?' for _ in names)})
+            """, [(ticker, period_end, *names) for ticker, period_end in sorted(period_ends)])
+        stored_rows = pd.concat([results[key] for key in targets], ignore_index=True)
+        if period_ends is not None:
+            keys = pd.Series(list(zip(stored_rows["company_ticker"], stored_rows["period_end"])), index=stored_rows.index)
+            stored_rows = stored_rows[keys.isin(period_ends)]
+        stored = store_derived_metrics(conn, stored_rows)
+        bump_data_version(conn, set(stored_rows["company_ticker"]) | {ticker for ticker, _ in period_ends or ()})
+
+    print(f"✅ Stored {stored} derived rows for {len(targets)} metric(s)")
+    return results
+
+
+def calculate_and_store_derived_metric(DB_PATH, ticker, metric_key, period_type, aggr_type):
+    if metric_key not in DERIVED_METRIC_DEFINITIONS:
+        print(f"❌ Metric '{metric_key}' is not defined in DERIVED_METRIC_DEFINITIONS.")
+        return None
+    results = run_derived_metrics(DB_PATH, [ticker], [metric_key], [(period_type, aggr_type)])
+    return results[metric_key]
+
 
 tickers = ["AQ"]  # Replace with dynamic ticker list if needed
 
 def run_all_derived_calculations(DB_PATH, tickers):
-    # Create table once up front
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS derived_metrics (
-            company_ticker TEXT,
-            period_start DATE,
-            period_end DATE,
-            period_type TEXT,
-            aggr_type TEXT,
-            metric_name_eng TEXT,
-            metric_name_ro TEXT,
-            value REAL,
-            formula TEXT,
-            calculated_at TEXT,
-            PRIMARY KEY (company_ticker, period_end, period_type, aggr_type, metric_name_eng)
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-    # Now run metrics in proper order
-    metric_keys = [
-        "EBIT",
-        "EBITDA",
-        "Interest-bearing debt",  # dependency
-        "Net debt",
-        "Capex",
-        "Net borrowings",
-        "FCFE"              
-    ]
-
-    period_types = ["annual", "quarter"]
-    aggr_types = ["cml", "qtl"]
-
-    for ticker in tickers:
-        for metric in metric_keys:
-            for period_type in period_types:
-                for aggr_type in aggr_types:
-                    print(f"\n🔄 {ticker} | {metric} | {period_type} | {aggr_type}")
-                    calculate_and_store_derived_metric(DB_PATH, ticker, metric, period_type, aggr_type)
-
-
-run_all_derived_calculations(DB_PATH, ["AQ"])
+    return run_derived_metrics(DB_PATH, tickers)
+
+
+if __name__ == "__main__":
+    run_all_derived_calculations(DB_PATH, tickers)
@@ -0,0 +1,124 @@
+# display_periods.py
+# ------------------
+# Period labels ("2Q/24", "9M/24", "FY/24") stored next to every row of financial_data,
+# financial_ratios and derived_metrics instead of being recomputed by the view_financial_* views.
+#
+# The views used to run strftime() on period_start and period_end for every row they read, both to
+# filter and to build display_period. The writers (update_db, ratios, derived_metrics) now fill these
+# columns when they store a row, and the views are plain filters on them:
+#
+# ✅ fiscal_year     year of period_end
+# ✅ fiscal_quarter  1-4 when period_end is a calendar quarter end, else NULL
+# ✅ period_months   months covered, when the period starts on the 1st and ends on a month end, else NULL
+# ✅ display_period  '2Q/24' for a single quarter, '9M/24' for year-to-date quarters, 'FY/24' for a
+#                    calendar year, else NULL
+#
+# The first quarter is both a single quarter and the first year-to-date period: it is stored as
+# '1Q/24' and view_financial_cml labels it '3M/24'.
+
+import pandas as pd
+
+PERIOD_COLUMNS = ["fiscal_year", "fiscal_quarter", "period_months", "display_period"]
+PERIOD_TABLES = ["financial_data", "financial_ratios", "derived_metrics"]
+
+_COLUMN_TYPES = {"fiscal_year": "INTEGER", "fiscal_quarter": "INTEGER", "period_months": "INTEGER", "display_period": "TEXT"}
+
+
+def _nullable_ints(series):
+    """Float series (NaN for missing) as Python ints / None, so sqlite3 can bind them."""
+    return series.astype(object).where(series.notna(), None).map(lambda v: v if v is None else int(v))
+
+
+def period_columns(df):
+    """
+    Computes PERIOD_COLUMNS from the period_start / period_end / period_type columns of `df`
+    (strings or datetimes). Returns a DataFrame with the same index as `df`.
+    """
+    start = pd.to_datetime(df["period_start"], errors="coerce")
+    end = pd.to_datetime(df["period_end"], errors="coerce")
+
+    month_aligned = (start.dt.day == 1) & end.dt.is_month_end
+    months = ((end.dt.year - start.dt.year) * 12 + end.dt.month - start.dt.month + 1).where(month_aligned)
+    quarter = (end.dt.month // 3).where(end.dt.is_month_end & (end.dt.month % 3 == 0))
+    year = end.dt.year
+
+    yy = year.astype("Int64").astype(str).str[-2:]
+    quarter_label = quarter.astype("Int64").astype(str)
+    months_label = months.astype("Int64").astype(str)
+
+    is_quarter = df["period_type"].eq("quarter") & quarter.notna()
+    display = pd.Series(None, index=df.index, dtype=object)
+    display = display.mask(is_quarter & (months == quarter * 3), months_label + "M/" + yy)
+    display = display.mask(is_quarter & (months == 3), quarter_label + "Q/" + yy)
+    display = display.mask(df["period_type"].eq("annual") & (months == 12) & (quarter == 4), "FY/" + yy)
+
+    return pd.DataFrame({
+        "fiscal_year": _nullable_ints(year),
+        "fiscal_quarter": _nullable_ints(quarter),
+        "period_months": _nullable_ints(months),
+        "display_period": display,
+    }, index=df.index)
+
+
+def _table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def add_period_columns(conn):
+    """
+    Migration step: adds PERIOD_COLUMNS to the tables that exist and backfills them.
+    """
+    for table in PERIOD_TABLES:
+        existing = _table_columns(conn, table)
+        if not existing:
+            continue
+        for column in PERIOD_COLUMNS:
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {_COLUMN_TYPES[column]}")
+
+        rows = pd.read_sql_query(f"SELECT rowid AS row_id, period_start, period_end, period_type FROM {table}", conn)
+        if rows.empty:
+            continue
+        values = period_columns(rows)
+        values["row_id"] = rows["row_id"].map(int)
+        conn.executemany(f"""
+            UPDATE {table} SET {', '.join(f'{column} = ?' for column in PERIOD_COLUMNS)}
+            WHERE rowid = ?
+        """, values[PERIOD_COLUMNS + ["row_id"]].itertuples(index=False, name=None))
+
+
+def create_period_views(conn):
+    """
+    Migration step: recreates the view_financial_* views as filters on the stored period columns.
+    """
+    views = {
+        "financial_data": ["view_financial_qtl", "view_financial_cml", "view_financial_annual"],
+        "financial_ratios": ["view_financial_ratios_qtl", "view_financial_ratios_annual"],
+    }
+    for table, names in views.items():
+        columns = _table_columns(conn, table)
+        if not columns:
+            continue
+        for name in names:
+            conn.execute(f"DROP VIEW IF EXISTS {name}")
+
+        conn.execute(f"""
+            CREATE VIEW {names[0]} AS
+            SELECT * FROM {table}
+            WHERE period_type = 'quarter' AND period_months = 3 AND fiscal_quarter IS NOT NULL
+        """)
+        conn.execute(f"""
+            CREATE VIEW {names[-1]} AS
+            SELECT * FROM {table}
+            WHERE period_type = 'annual' AND period_months = 12 AND fiscal_quarter = 4
+        """)
+        if len(names) == 3:
+            # Same row as view_financial_qtl for the first quarter, labelled as a cumulative period
+            other_columns = ", ".join(column for column in columns if column != "display_period")
+            conn.execute(f"""
+                CREATE VIEW {names[1]} AS
+                SELECT {other_columns},
+                    period_months || 'M/' || substr(fiscal_year, 3, 2) AS display_period
+                FROM {table}
+                WHERE period_type = 'quarter' AND period_months = fiscal_quarter * 3
+            """)
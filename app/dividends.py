@@ -1,19 +1,12 @@
 import pandas as pd
-import sqlite3
-
-CSV_PATH = r"C:\Users\irina\Project Element\Data source\AQ\AQ_dividend_history.csv"
-DB_PATH = r"C:\Irina\Mosaiq8\app\data\financials.db"
-
-import pandas as pd
-import sqlite3
 import yfinance as yf
 from datetime import datetime
+from data_versions import bump_data_version
+from db import get_read_connection, read_connection, write_connection
 
 CSV_PATH = r"C:\Users\irina\Project Element\Data source\AQ\AQ_dividend_history.csv"
 
 def get_net_profit(ticker, year):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
     query = """
     SELECT f.value FROM financial_data f
     JOIN financial_metrics m ON f.metric_name_ro=m.metric_name_ro
@@ -25,7 +18,8 @@ def get_net_profit(ticker, year):
     LIMIT 1
     """
     try:
-        result = cursor.execute(query, (ticker, str(year))).fetchone()
+        with read_connection() as conn:
+            result = conn.execute(query, (ticker, str(year))).fetchone()
         if result:
             net_profit = float(result[0])
             print(f"✅ Net profit for {ticker} in year {year} was {net_profit:,.0f}")
@@ -36,17 +30,12 @@ def get_net_profit(ticker, year):
     except Exception as e:
         print(f"❌ Error fetching net profit for {ticker}, {year}: {e}")
         return None
-    finally:
-        conn.close()
 
 def get_fcfe(ticker, year):
     """
     Fetch FCFE (Free Cash Flow to Equity) from the derived_metrics table,
     using the year corresponding to the net profit (dividend source year).
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
     query = """
     SELECT value
     FROM derived_metrics
@@ -58,7 +47,8 @@ def get_fcfe(ticker, year):
     """
 
     try:
-        result = cursor.execute(query, (ticker, str(year))).fetchone()
+        with read_connection() as conn:
+            result = conn.execute(query, (ticker, str(year))).fetchone()
         if result:
             fcfe = float(result[0])
             print(f"✅ FCFE for {ticker} in year {year} was {fcfe:,.0f}")
@@ -69,12 +59,9 @@ def get_fcfe(ticker, year):
     except Exception as e:
         print(f"❌ Error fetching FCFE for {ticker}, {year}: {e}")
         return None
-    finally:
-        conn.close()
 
 def get_average_price_for_dividend(ticker, announcement_date, registration_date, ex_dividend_date):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    cursor = get_read_connection().cursor()
 
     # Convert dates to datetime
     try:
@@ -111,14 +98,12 @@ def get_average_price_for_dividend(ticker, announcement_date, registration_date,
         avg_price = result[0] if result else None
         print(f"📈 Latest available price for {ticker}: {avg_price}")
 
-    conn.close()
     return avg_price
 
 
 def enrich_and_insert_dividends():
     df = pd.read_csv(CSV_PATH)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    records = []
 
     # GROUP AND SUM TOTAL DPS per year per ticker
     totals_by_year = df.groupby(["company_ticker", "DPS_year"])["DPS"].sum().to_dict()
@@ -175,18 +160,20 @@ def enrich_and_insert_dividends():
             
         )
 
-        # -- INSERT or REPLACE --
-        cursor.execute("""
+        records.append(record)
+
+    # -- INSERT or REPLACE --
+    with write_connection() as conn:
+        conn.executemany("""
         INSERT OR REPLACE INTO dividends (
             company_ticker, DPS_year, DPS_value, dividends_yoy_change, number_of_shares, total_dividends,
             net_profit_year, net_profit, payout_ratio, dividend_yield, fcfe,
             dividends_to_fcfe, gsm_approval_date, registration_date, ex_dividend_date,
             announcement_date, payment_date, dividend_type, dividend_status
         ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, record)
+        """, records)
+        bump_data_version(conn, {record[0] for record in records})
 
-    conn.commit()
-    conn.close()
     print("✅ All dividend records inserted successfully.")
 
 if __name__ == "__main__":
@@ -0,0 +1,41 @@
+# fast_json.py
+# ------------
+# JSON encoding for the large API payloads (financial statements in columnar form, NDJSON streams).
+#
+# ✅ Uses orjson when it is installed (pip install orjson): it serializes NumPy arrays natively,
+#    without building a Python list per row first
+# ✅ Falls back to the standard json module (same JSON, compact separators), so orjson stays optional
+# ✅ NaN inside a float array becomes null in both cases
+
+import json
+
+import numpy as np
+from flask import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj):
+    """Converts the NumPy values the standard json module (or orjson, for object arrays) cannot encode."""
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind == "f":
+            return np.where(np.isnan(obj), None, obj).tolist()
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(payload):
+    """Compact UTF-8 JSON bytes, keys in insertion order."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def json_response(payload, status=200):
+    """Like flask.jsonify, for payloads that hold NumPy arrays."""
+    return Response(dumps(payload) + b"\n", status=status, mimetype="application/json")
@@ -3,13 +3,131 @@
 # Utility functions for metric normalization using the `metric_aliases` table.
 # These allow the webapp to map raw company-reported metrics to standardized names
 # by leveraging a curated alias list stored in the database.
+#
+# ✅ AliasResolver loads metric_aliases and financial_metrics once into two dictionaries
+#    (alias → standardized name, standardized name → aliases), so resolving a label is a dict lookup,
+#    not a query; resolve_many() resolves a whole column of labels at once
+# ✅ keys are normalized (case, diacritics, whitespace): "Datorii  curente purtatoare de DOBANDA" finds
+#    "Datorii curente purtătoare de dobândă"
+# ✅ the dictionaries reload when the data versions change (seed_aliases.py and update_db.py bump them),
+#    checked at most every RELOAD_CHECK_SECONDS
+# ✅ nothing is read at import time: the resolver loads on first use
+#
+# Usage:
+#   from helpers import get_alias_resolver
+#   resolver = get_alias_resolver()
+#   resolver.resolve_many(["Short-term bank borrowings", "LT loans"])   # ["Short-term debt", "Long-term debt"]
+#   resolver.aliases_for("Short-term debt")
 
-import sqlite3
-import os
+import threading
+import time
+import unicodedata
+from functools import lru_cache
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Path to app/ directory
-DATA_DIR = os.path.join(BASE_DIR, "data")  # Path to data/
-DB_PATH = os.path.join(DATA_DIR, "financials.db")  # Full path to database
+from data_versions import get_universe_data_version
+from db import DB_PATH, read_connection
+
+RELOAD_CHECK_SECONDS = 5.0
+
+
+@lru_cache(maxsize=65536)
+def normalize_alias(name):
+    """Case-folded, without diacritics, whitespace collapsed to single spaces."""
+    name = str(name)
+    if name.isascii():
+        return " ".join(name.casefold().split())
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+class AliasResolver:
+    """
+    In-memory view of metric_aliases (curated and auto-generated aliases) and financial_metrics
+    (metric_name_ro / metric_name_eng → generalized_metric_eng) for one database.
+
+    When several standardized names share a normalized alias, manual aliases win over the other
+    metric_aliases rows, and those over financial_metrics. A standardized name that is not also an alias
+    resolves to itself.
+    """
+
+    def __init__(self, db_path=DB_PATH, check_seconds=RELOAD_CHECK_SECONDS):
+        self.db_path = db_path
+        self.check_seconds = check_seconds
+        self.forward = {}  # normalized alias: standardized name
+        self.reverse = {}  # normalized standardized name: [aliases as stored]
+        self.version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def load(self, conn):
+        """Rebuilds both dictionaries from the database."""
+        aliases = conn.execute("""
+            SELECT alias, standardized_metric
+            FROM metric_aliases
+            ORDER BY COALESCE(source, '') != 'manual', rowid
+        """).fetchall()
+        metrics = conn.execute("""
+            SELECT metric_name_ro, generalized_metric_eng FROM financial_metrics
+            WHERE generalized_metric_eng IS NOT NULL
+            UNION ALL
+            SELECT metric_name_eng, generalized_metric_eng FROM financial_metrics
+            WHERE generalized_metric_eng IS NOT NULL AND metric_name_eng IS NOT NULL
+        """).fetchall()
+
+        forward, reverse = {}, {}
+        for alias, standardized in aliases + metrics:
+            forward.setdefault(normalize_alias(alias), standardized)
+            names = reverse.setdefault(normalize_alias(standardized), [])
+            if alias not in names and alias != standardized:
+                names.append(alias)
+        for standardized in dict.fromkeys(standardized for _, standardized in aliases + metrics):
+            forward.setdefault(normalize_alias(standardized), standardized)
+
+        self.forward, self.reverse = forward, reverse
+        print(f"🔄 Loaded {len(forward)} metric aliases for {len(reverse)} standardized metrics")
+
+    def refresh(self, force=False):
+        """Reloads the dictionaries if the data versions changed (checked at most every `check_seconds`)."""
+        now = time.monotonic()
+        if not force and self.version is not None and now - self._checked_at < self.check_seconds:
+            return
+        with self._lock:
+            with read_connection(self.db_path) as conn:
+                version = get_universe_data_version(conn)
+                if force or version != self.version:
+                    self.load(conn)
+                    self.version = version
+            self._checked_at = now
+
+    def resolve(self, raw_metric_name):
+        """The standardized name of `raw_metric_name`, or None if it is not a known alias."""
+        self.refresh()
+        return self.forward.get(normalize_alias(raw_metric_name))
+
+    def resolve_many(self, raw_metric_names):
+        """resolve() for every name, in the same order, with a single freshness check."""
+        self.refresh()
+        forward = self.forward
+        return [forward.get(normalize_alias(name)) for name in raw_metric_names]
+
+    def aliases_for(self, standardized_name):
+        """All known aliases of `standardized_name` (as stored), empty if none."""
+        self.refresh()
+        return list(self.reverse.get(normalize_alias(standardized_name), []))
+
+
+_resolvers = {}  # db path: AliasResolver
+_resolvers_lock = threading.Lock()
+
+
+def get_alias_resolver(db_path=DB_PATH):
+    """The process-wide resolver for `db_path`, created on first use."""
+    with _resolvers_lock:
+        resolver = _resolvers.get(db_path)
+        if resolver is None:
+            resolver = _resolvers[db_path] = AliasResolver(db_path)
+    return resolver
 
 
 def get_standardized_metric_name(DB_PATH, raw_metric_name):
@@ -24,12 +142,7 @@ def get_standardized_metric_name(DB_PATH, raw_metric_name):
     Returns:
     - str: The standardized metric name, or None if no match found.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT standardized_metric FROM metric_aliases WHERE alias = ?", (raw_metric_name,))
-    result = cursor.fetchone()
-    conn.close()
-    return result[0] if result else None
+    return get_alias_resolver(DB_PATH).resolve(raw_metric_name)
 
 def get_aliases_for(DB_PATH, standardized_name):
     """
@@ -43,14 +156,4 @@ def get_aliases_for(DB_PATH, standardized_name):
     Returns:
     - List[str]: All alias names that map to this standardized metric.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT alias FROM metric_aliases WHERE standardized_metric = ?", (standardized_name,))
-    aliases = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return aliases
-
-result1=get_standardized_metric_name(DB_PATH, "Beneficiile angajatilor - termen lung")
-result2=get_aliases_for(DB_PATH, "Short-term debt")
-print(result1)
-print(result2)
\ No newline at end of file
+    return get_alias_resolver(DB_PATH).aliases_for(standardized_name)
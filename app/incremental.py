@@ -0,0 +1,105 @@
+# incremental.py
+# --------------
+# Recomputes only the derived metrics and ratios affected by changes to financial_data.
+#
+# Triggers on financial_data (migration 3) append every inserted, updated or deleted value to
+# financial_data_changes. This module reads the changes it has not processed yet and:
+#
+# ✅ recomputes derived metrics for the (ticker, period_end) pairs that changed — they only read their own period
+# ✅ recomputes ratios for those periods plus the periods that use them as `_begin` / `_prior`:
+#      +3 months (quarterly opening balance), +12 months (y/y growth, annual opening balance)
+#      and, for a year-end, the next year's cumulative quarters (3M/6M/9M opening balance)
+# ✅ refreshes the industry statistics (industry_stats.py), which depend on every peer's ratios
+# ✅ advances its cursor in change_log_cursors, so the next run starts where this one stopped
+#
+# Usage:
+#   python incremental.py          # process pending changes
+#   from incremental import run_incremental_recompute
+
+import pandas as pd
+from datetime import datetime
+from db import DB_PATH, read_connection, write_connection
+from derived_metrics import run_derived_metrics
+from ratios import run_industry_stats, run_ratio_engine
+
+CONSUMER = "derived_and_ratios"
+
+
+def get_pending_changes(conn, consumer=CONSUMER):
+    """
+    Returns (changes DataFrame, last change_id) for the changes `consumer` has not processed yet.
+    """
+    row = conn.execute("SELECT last_change_id FROM change_log_cursors WHERE consumer = ?", (consumer,)).fetchone()
+    last_change_id = row[0] if row else 0
+
+    changes = pd.read_sql_query("""
+        SELECT change_id, company_ticker, period_end, period_type, aggr_type, metric_name_ro, change_type
+        FROM financial_data_changes
+        WHERE change_id > ?
+        ORDER BY change_id ASC
+    """, conn, params=(last_change_id,))
+
+    if not changes.empty:
+        last_change_id = int(changes["change_id"].max())
+    return changes, last_change_id
+
+
+def successor_period_ends(period_end):
+    """
+    Period ends whose ratios read `period_end` as their prior period.
+    """
+    end = pd.Timestamp(period_end)
+    successors = {
+        end + pd.DateOffset(months=3) + pd.offsets.MonthEnd(0),
+        end + pd.DateOffset(months=12) + pd.offsets.MonthEnd(0),
+    }
+    if end.month == 12:
+        successors.update(pd.Timestamp(end.year + 1, month, 1) + pd.offsets.MonthEnd(0) for month in (3, 6, 9))
+    return {d.strftime("%Y-%m-%d") for d in successors}
+
+
+def affected_periods(changes):
+    """
+    Returns (changed, affected): the (ticker, period_end) pairs that changed, and those plus their successors.
+    """
+    changed = set(zip(changes["company_ticker"], changes["period_end"]))
+    affected = set(changed)
+    for ticker, period_end in changed:
+        affected.update((ticker, successor) for successor in successor_period_ends(period_end))
+    return changed, affected
+
+
+def run_incremental_recompute(DB_PATH=DB_PATH, consumer=CONSUMER):
+    """
+    Processes every pending financial_data change. Returns the number of changes processed.
+    """
+    with read_connection(DB_PATH) as conn:
+        changes, last_change_id = get_pending_changes(conn, consumer)
+
+    if changes.empty:
+        print("✅ No pending financial_data changes.")
+        return 0
+
+    changed, affected = affected_periods(changes)
+    tickers = sorted({ticker for ticker, _ in changed})
+    print(f"🔄 {len(changes)} change(s) → {len(changed)} changed / {len(affected)} affected period(s) for {', '.join(tickers)}")
+
+    run_derived_metrics(DB_PATH, tickers, period_ends=changed)
+    run_ratio_engine(DB_PATH, tickers, period_ends=affected)
+    run_industry_stats(DB_PATH)
+
+    with write_connection(DB_PATH) as conn:
+        conn.execute("""
+            INSERT INTO change_log_cursors (consumer, last_change_id, updated_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(consumer) DO UPDATE SET
+                last_change_id = excluded.last_change_id,
+                updated_at = excluded.updated_at
+        """, (consumer, last_change_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+    print(f"✅ Incremental recompute done up to change #{last_change_id}")
+    return len(changes)
+
+
+if __name__ == "__main__":
+    run_incremental_recompute(DB_PATH)
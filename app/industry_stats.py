@@ -0,0 +1,173 @@
+# industry_stats.py
+# -----------------
+# Peer statistics per industry (companies.industry), precomputed after the ratio engine runs.
+#
+# ✅ industry_stats: for every industry, ratio and period, the number of companies, median, quartiles,
+#    mean and revenue-weighted mean of the ratio
+# ✅ industry_percentiles: every company's percentile within its industry for each ratio and period
+# ✅ the webapp reads both with one indexed query (data_handler.get_industry_stats), so the analysis page
+#    never loads peer ratios or ranks companies per request
+#
+# The whole universe is recomputed at once (one read of financial_ratios, pandas groupby, one write when a
+# figure changed): a change in one company moves the statistics and the percentiles of all its peers.
+# Companies without an industry are left out.
+#
+# ratios.run_industry_stats() runs it as the stage after run_all_ratios; migration 9 backfills it.
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+CREATE_INDUSTRY_STATS = """
+    CREATE TABLE IF NOT EXISTS industry_stats (
+        industry TEXT NOT NULL,
+        period_type TEXT NOT NULL,
+        aggr_type TEXT NOT NULL,
+        ratio_name_eng TEXT NOT NULL,
+        period_end DATE NOT NULL,
+        ratio_name_ro TEXT,
+        display_period TEXT,
+        companies INTEGER NOT NULL,
+        median REAL,
+        q1 REAL,
+        q3 REAL,
+        mean REAL,
+        weighted_mean REAL,
+        calculated_at TEXT,
+        PRIMARY KEY (industry, period_type, aggr_type, ratio_name_eng, period_end)
+    )
+"""
+
+CREATE_INDUSTRY_PERCENTILES = """
+    CREATE TABLE IF NOT EXISTS industry_percentiles (
+        company_ticker TEXT NOT NULL,
+        period_type TEXT NOT NULL,
+        aggr_type TEXT NOT NULL,
+        ratio_name_eng TEXT NOT NULL,
+        period_end DATE NOT NULL,
+        industry TEXT NOT NULL,
+        percentile REAL NOT NULL,
+        PRIMARY KEY (company_ticker, period_type, aggr_type, ratio_name_eng, period_end)
+    )
+"""
+
+GROUP_KEYS = ["industry", "period_type", "aggr_type", "ratio_name_eng", "period_end"]
+
+# Weight of each company in weighted_mean: its revenue in the same period
+WEIGHT_METRIC = "Revenue"
+
+STATS_COLUMNS = GROUP_KEYS + [
+    "ratio_name_ro", "display_period", "companies", "median", "q1", "q3", "mean", "weighted_mean", "calculated_at",
+]
+PERCENTILE_COLUMNS = ["company_ticker", "period_type", "aggr_type", "ratio_name_eng", "period_end", "industry", "percentile"]
+
+
+def load_industry_inputs(conn):
+    """
+    Every ratio value of every company with an industry, with the company's revenue for the same period as weight.
+    """
+    df = pd.read_sql_query("""
+        SELECT c.industry, r.company_ticker, r.period_type, r.aggr_type, r.ratio_name_eng, r.ratio_name_ro,
+               r.period_end, r.display_period, r.value
+        FROM financial_ratios r
+        JOIN companies c ON c.company_ticker = r.company_ticker
+        WHERE c.industry IS NOT NULL AND TRIM(c.industry) != '' AND r.value IS NOT NULL
+    """, conn)
+    weights = pd.read_sql_query("""
+        SELECT f.company_ticker, f.period_type, f.aggr_type, f.period_end, f.value AS weight
+        FROM financial_data f
+        JOIN financial_metrics m ON f.metric_name_ro = m.metric_name_ro AND f.company_ticker = m.company_ticker
+        WHERE m.generalized_metric_eng = ?
+    """, conn, params=[WEIGHT_METRIC])
+    weights = weights.drop_duplicates(["company_ticker", "period_type", "aggr_type", "period_end"])
+    return df.merge(weights, on=["company_ticker", "period_type", "aggr_type", "period_end"], how="left")
+
+
+def compute_industry_stats(df):
+    """
+    Returns (stats, percentiles) DataFrames with the columns of industry_stats / industry_percentiles.
+    Non-finite ratio values are ignored; companies without a positive revenue are left out of weighted_mean only.
+    """
+    df = df[np.isfinite(df["value"].astype(float))].copy()
+    if df.empty:
+        return pd.DataFrame(columns=STATS_COLUMNS), pd.DataFrame(columns=PERCENTILE_COLUMNS)
+
+    df["value"] = df["value"].astype(float)
+    weight = pd.to_numeric(df["weight"], errors="coerce")
+    df["weight"] = weight.where(weight > 0, 0.0).fillna(0.0)
+    df["weighted_value"] = df["value"] * df["weight"]
+
+    grouped = df.groupby(GROUP_KEYS, sort=True)
+    quartiles = grouped["value"].quantile([0.25, 0.5, 0.75]).unstack()
+    sums = grouped[["weighted_value", "weight"]].sum()
+
+    stats = grouped.agg(
+        ratio_name_ro=("ratio_name_ro", "first"),
+        display_period=("display_period", "first"),
+        companies=("company_ticker", "nunique"),
+        mean=("value", "mean"),
+    )
+    stats["median"] = quartiles[0.5]
+    stats["q1"] = quartiles[0.25]
+    stats["q3"] = quartiles[0.75]
+    stats["weighted_mean"] = (sums["weighted_value"] / sums["weight"]).where(sums["weight"] > 0)
+    stats["calculated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    stats = stats.reset_index()[STATS_COLUMNS]
+
+    # Percentile rank within the peers of the same period (ties share the average rank): 100 = highest value
+    df["percentile"] = grouped["value"].rank(pct=True) * 100
+    percentiles = df[PERCENTILE_COLUMNS]
+    return stats, percentiles
+
+
+def _records(df):
+    """Row tuples of Python scalars (NaN → None): much faster to insert than itertuples over pandas arrays."""
+    columns = [df[c].astype(object).where(df[c].notna(), None).tolist() for c in df.columns]
+    return list(zip(*columns))
+
+
+def _changed_rows(old, new, keys):
+    """The keys of the rows added, removed or changed between `old` and `new` (same columns; NaN equals NaN)."""
+    merged = old.merge(new, on=keys, how="outer", suffixes=("_old", "_new"), indicator=True)
+    changed = merged["_merge"] != "both"
+    for column in old.columns.difference(keys):
+        before, after = merged[f"{column}_old"], merged[f"{column}_new"]
+        changed |= ~((before == after) | (before.isna() & after.isna()))
+    return merged.loc[changed, keys]
+
+
+def refresh_industry_stats(conn):
+    """
+    Recomputes industry_stats and industry_percentiles on the caller's connection (no commit).
+    The tables are rewritten only when a figure changed. Returns the tickers whose figures moved: their own
+    percentiles, or the statistics of their industry.
+    """
+    stats, percentiles = compute_industry_stats(load_industry_inputs(conn))
+    compared = [c for c in STATS_COLUMNS if c != "calculated_at"]
+    stored_stats = pd.read_sql_query(f"SELECT {', '.join(compared)} FROM industry_stats", conn)
+    stored_percentiles = pd.read_sql_query(f"SELECT {', '.join(PERCENTILE_COLUMNS)} FROM industry_percentiles", conn)
+
+    changed_industries = set(_changed_rows(stored_stats, stats[compared], GROUP_KEYS)["industry"])
+    changed_tickers = set(_changed_rows(stored_percentiles, percentiles, PERCENTILE_COLUMNS[:5])["company_ticker"])
+    for df in (stored_percentiles, percentiles):
+        changed_tickers |= set(df.loc[df["industry"].isin(changed_industries), "company_ticker"])
+
+    if not changed_industries and not changed_tickers:
+        print("✅ Industry statistics and company percentiles unchanged")
+        return set()
+
+    conn.execute("DELETE FROM industry_stats")
+    conn.execute("DELETE FROM industry_percentiles")
+    conn.executemany(f"""
+        INSERT INTO industry_stats ({', '.join(STATS_COLUMNS)})
+        VALUES ({', '.join('?' for _ in STATS_COLUMNS)})
+    """, _records(stats))
+    conn.executemany(f"""
+        INSERT INTO industry_percentiles ({', '.join(PERCENTILE_COLUMNS)})
+        VALUES ({', '.join('?' for _ in PERCENTILE_COLUMNS)})
+    """, _records(percentiles))
+
+    print(f"✅ Stored {len(stats)} industry statistics and {len(percentiles)} company percentiles "
+          f"({len(changed_tickers)} companies changed)")
+    return changed_tickers
@@ -0,0 +1,113 @@
+# latest_snapshot.py
+# ------------------
+# One row per ticker with the values shown on the analysis page header card
+# (last price, market cap, P/E, daily / YoY / YTD variation, latest net income).
+#
+# The webapp reads it with a single primary-key lookup instead of scanning the whole price
+# history for the row closest to today. Every script that writes stock_data or financial_data
+# calls refresh_latest_snapshot() on the same connection, inside the same transaction.
+
+from datetime import datetime
+
+
+CREATE_LATEST_SNAPSHOT = """
+    CREATE TABLE IF NOT EXISTS latest_snapshot (
+        company_ticker TEXT PRIMARY KEY,
+        price_date TEXT,
+        close_price REAL,
+        market_cap REAL,
+        pe_ratio REAL,
+        change_day REAL,
+        change_yoy REAL,
+        change_ytd REAL,
+        net_income REAL,
+        net_income_period_end DATE,
+        updated_at TEXT
+    )
+"""
+
+# Every lookup below walks an index backwards from the newest row, so it costs the same
+# no matter how long the price history gets.
+_LATEST_PRICE = """
+    SELECT date, close_price, market_cap, pe_ratio
+    FROM stock_data
+    WHERE company_ticker = ?
+    ORDER BY date DESC
+    LIMIT 1
+"""
+
+_LATEST_CHANGE_DAY = """
+    SELECT change_day
+    FROM stock_data
+    WHERE company_ticker = ? AND change_day IS NOT NULL
+    ORDER BY date DESC
+    LIMIT 1
+"""
+
+_LATEST_CHANGE_YOY_YTD = """
+    SELECT change_yoy, change_ytd
+    FROM stock_data
+    WHERE company_ticker = ? AND change_yoy IS NOT NULL AND change_ytd IS NOT NULL
+    ORDER BY date DESC
+    LIMIT 1
+"""
+
+# For the latest period_end prefer the widest figure: the full year over a quarter, cumulative over quarterly
+_LATEST_NET_INCOME = """
+    SELECT f.value, f.period_end
+    FROM financial_data f
+    JOIN financial_metrics m ON f.metric_name_ro = m.metric_name_ro
+    WHERE f.company_ticker = ?
+      AND m.generalized_metric_eng = 'Net profit a.m.'
+    ORDER BY f.period_end DESC, f.period_type = 'annual' DESC, f.aggr_type = 'cml' DESC
+    LIMIT 1
+"""
+
+
+def _all_tickers(conn):
+    rows = conn.execute("""
+        SELECT company_ticker FROM stock_data
+        UNION
+        SELECT company_ticker FROM financial_data
+    """).fetchall()
+    return [row[0] for row in rows]
+
+
+def build_snapshot_row(conn, ticker):
+    """
+    Computes the latest_snapshot row for one ticker from stock_data and financial_data.
+    """
+    price = conn.execute(_LATEST_PRICE, (ticker,)).fetchone() or (None, None, None, None)
+    change_day = conn.execute(_LATEST_CHANGE_DAY, (ticker,)).fetchone() or (None,)
+    changes = conn.execute(_LATEST_CHANGE_YOY_YTD, (ticker,)).fetchone() or (None, None)
+    net_income = conn.execute(_LATEST_NET_INCOME, (ticker,)).fetchone() or (None, None)
+
+    return (
+        ticker,
+        price[0], price[1], price[2], price[3],
+        change_day[0], changes[0], changes[1],
+        net_income[0], net_income[1],
+        datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    )
+
+
+def refresh_latest_snapshot(conn, tickers=None):
+    """
+    Recomputes latest_snapshot for `tickers` (all tickers with prices or financials when None).
+    Runs on the caller's connection and does not commit, so it lands in the caller's transaction.
+    """
+    if tickers is None:
+        tickers = _all_tickers(conn)
+    elif isinstance(tickers, str):
+        tickers = [tickers]
+
+    rows = [build_snapshot_row(conn, ticker) for ticker in tickers]
+    conn.executemany("""
+        INSERT OR REPLACE INTO latest_snapshot (
+            company_ticker, price_date, close_price, market_cap, pe_ratio,
+            change_day, change_yoy, change_ytd,
+            net_income, net_income_period_end, updated_at
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    return len(rows)
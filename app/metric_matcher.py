@@ -0,0 +1,176 @@
+# metric_matcher.py
+# -----------------
+# Fuzzy matching of raw metric names against the canonical names of metric_mapping.json, for
+# collect_financials.py. Scores are rapidfuzz token_sort_ratio, exactly as before.
+#
+# ✅ names are normalized with one str.translate table (diacritics) and one regex, not a per-character join
+# ✅ every canonical name is preprocessed once into its token key (tokens sorted and joined): token_sort_ratio
+#    is plain ratio on those keys, so no query re-tokenizes the whole list
+# ✅ a token index (token key → first canonical name) answers exact and reordered names without scoring
+# ✅ batch queries run as one rapidfuzz cdist over the keys (multi-core, in chunks to bound memory) and
+#    return the top-k candidates with scores
+# ✅ the preprocessed index is persisted next to the mapping and rebuilt only when the canonical names change
+#
+# No trigram prefilter: cdist already skips hopeless candidates by length when given a score_cutoff,
+# and a prefilter would make the results approximate.
+#
+# Usage:
+#   from metric_matcher import load_matcher, normalize_metric_name
+#   matcher = load_matcher(metric_mapping)
+#   matcher.best(["venituri din vanzari"])      # [("venituri din vanzari", 100.0)]
+#   matcher.top_k(["profit net"], k=5)          # [[(name, score), ...]]
+
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+METRIC_INDEX_FILE = "metric_mapping.index.json"
+
+_DIACRITICS = str.maketrans("ăâîșşțţĂÂÎȘŞȚŢ", "aaissttAAISSTT")
+_NON_ALNUM = re.compile(r"[^a-z0-9 ]+")
+
+# Upper bound on the scores computed per cdist call (queries × names): 2M float64 = 16 MB
+CDIST_CELLS = 2_000_000
+
+
+def remove_diacritics(text):
+    return text.translate(_DIACRITICS)
+
+
+def normalize_metric_name(raw):
+    """Lowercase, Romanian diacritics removed, only letters, digits and spaces kept."""
+    return _NON_ALNUM.sub("", raw.strip().lower().translate(_DIACRITICS))
+
+
+def token_key(name):
+    """What token_sort_ratio compares: the whitespace-separated tokens, sorted and joined by single spaces."""
+    return " ".join(sorted(name.split()))
+
+
+def fingerprint(names):
+    return hashlib.sha1("\n".join(names).encode("utf-8")).hexdigest()
+
+
+class MetricMatcher:
+    """
+    The canonical names (in first-seen order, like the values of metric_mapping.json) with their token keys.
+    Queries are normalized, canonical names compared as stored. Scores and tie-breaking match rapidfuzz
+    extractOne / extract with token_sort_ratio on the same list: ties go to the earlier name.
+    """
+
+    def __init__(self, names=(), keys=None):
+        self.names = []
+        self.keys = []
+        self.positions = {}  # name: index
+        self.key_index = {}  # token key: index of the first name with it
+        for i, name in enumerate(dict.fromkeys(names)):
+            self._append(name, keys[i] if keys is not None else token_key(name))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.positions
+
+    def _append(self, name, key):
+        self.positions[name] = len(self.names)
+        self.key_index.setdefault(key, len(self.names))
+        self.names.append(name)
+        self.keys.append(key)
+
+    def add(self, name):
+        """Adds a canonical name (no-op if already known)."""
+        if name not in self.positions:
+            self._append(name, token_key(name))
+
+    def _scores(self, query_keys, score_cutoff, workers):
+        """Yields (first query row, score matrix) chunk by chunk."""
+        rows = max(1, CDIST_CELLS // max(1, len(self.keys)))
+        for start in range(0, len(query_keys), rows):
+            yield start, process.cdist(
+                query_keys[start:start + rows], self.keys, scorer=fuzz.ratio,
+                score_cutoff=score_cutoff, dtype=np.float64, workers=workers,
+            )
+
+    def best(self, queries, workers=-1):
+        """
+        [(name, score) or None] for every query: the best canonical name, None when there is none.
+        Queries whose token key is already known score 100 without running the scorer.
+        """
+        results = [None] * len(queries)
+        if not self.names:
+            return results
+
+        misses = []
+        for i, query in enumerate(queries):
+            key = token_key(normalize_metric_name(query))
+            hit = self.key_index.get(key)
+            if hit is not None:
+                results[i] = (self.names[hit], 100.0)
+            else:
+                misses.append((i, key))
+
+        query_keys = [key for _, key in misses]
+        for start, scores in self._scores(query_keys, None, workers):
+            best = scores.argmax(axis=1)
+            for row, j in enumerate(best):
+                results[misses[start + row][0]] = (self.names[j], float(scores[row, j]))
+        return results
+
+    def top_k(self, queries, k=5, score_cutoff=0, workers=-1):
+        """
+        [[(name, score), ...] for every query]: the k best canonical names scoring at least `score_cutoff`,
+        best first.
+        """
+        results = []
+        if not self.names:
+            return [[] for _ in queries]
+
+        query_keys = [token_key(normalize_metric_name(query)) for query in queries]
+        for _, scores in self._scores(query_keys, score_cutoff or None, workers):
+            for row in scores:
+                if k < len(row):
+                    kth = row[np.argpartition(-row, k - 1)[k - 1]]
+                    candidates = np.flatnonzero(row >= kth)
+                else:
+                    candidates = np.arange(len(row))
+                candidates = candidates[np.argsort(-row[candidates], kind="stable")][:k]
+                results.append([
+                    (self.names[j], float(row[j])) for j in candidates if row[j] >= score_cutoff and row[j] > 0
+                ])
+        return results
+
+    # --- persistence ---
+    def save(self, path=METRIC_INDEX_FILE):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": fingerprint(self.names), "names": self.names, "keys": self.keys}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path=METRIC_INDEX_FILE):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["names"], data["keys"]), data["fingerprint"]
+
+
+def load_matcher(mapping, path=METRIC_INDEX_FILE):
+    """
+    The matcher for the canonical names (values) of `mapping`: read from the index file at `path` when it was
+    built from the same names, otherwise built and saved there.
+    """
+    names = list(dict.fromkeys(mapping.values()))
+    if os.path.exists(path):
+        try:
+            matcher, saved = MetricMatcher.load(path)
+            if saved == fingerprint(names):
+                return matcher
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Rebuilding unreadable metric index {path}: {e}")
+
+    matcher = MetricMatcher(names)
+    matcher.save(path)
+    print(f"🔎 Built metric index for {len(matcher)} canonical names → {path}")
+    return matcher
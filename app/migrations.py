@@ -0,0 +1,434 @@
+# migrations.py
+# -------------
+# Versioned schema migrations for financials.db.
+#
+# The applied version is stored in the database itself (PRAGMA user_version). Each entry of MIGRATIONS
+# runs once, inside its own BEGIN IMMEDIATE transaction, in version order. A step is either a SQL string or a
+# callable taking the open connection (for backfills that are easier to write in Python).
+#
+# Deploys apply them explicitly (the Procfile release step) before the webapp starts: the webapp never
+# migrates from a request. The ingestion scripts apply pending migrations the first time they open a
+# database (db.py). To run them (or the query-plan check) by hand:
+#
+#   python migrations.py            # apply pending migrations
+#   python migrations.py --check    # fail if a hot query falls back to a full table scan
+#
+# test_query_plans.py checks every HOT_QUERIES entry against a freshly migrated copy of the database.
+#
+# ✅ Never edit a migration that has already shipped: append a new version instead.
+
+import sys
+
+try:
+    from .chart_series import CREATE_CHART_SERIES, refresh_chart_series
+    from .data_versions import CREATE_DATA_VERSIONS
+    from .display_periods import add_period_columns, create_period_views
+    from .industry_stats import CREATE_INDUSTRY_PERCENTILES, CREATE_INDUSTRY_STATS, refresh_industry_stats
+    from .latest_snapshot import CREATE_LATEST_SNAPSHOT, refresh_latest_snapshot
+    from .numeric_values import CREATE_QUARANTINE, TYPE_GUARD_TRIGGERS, clean_stored_values
+except ImportError:
+    from chart_series import CREATE_CHART_SERIES, refresh_chart_series
+    from data_versions import CREATE_DATA_VERSIONS
+    from display_periods import add_period_columns, create_period_views
+    from industry_stats import CREATE_INDUSTRY_PERCENTILES, CREATE_INDUSTRY_STATS, refresh_industry_stats
+    from latest_snapshot import CREATE_LATEST_SNAPSHOT, refresh_latest_snapshot
+    from numeric_values import CREATE_QUARANTINE, TYPE_GUARD_TRIGGERS, clean_stored_values
+
+
+MIGRATIONS = [
+    (1, "Covering indexes for the statement, ratio and validation read paths", [
+        # data_handler.get_financial_statement(s): ticker + statement + period/aggr, joined on metric_name_ro
+        """
+        CREATE INDEX IF NOT EXISTS idx_financial_data_statement
+        ON financial_data (company_ticker, statement_name, period_type, aggr_type, metric_name_ro, period_end, value)
+        """,
+        # ratios.calculate_and_store_ratio, derived_metrics: ticker + period/aggr across all statements
+        """
+        CREATE INDEX IF NOT EXISTS idx_financial_data_period
+        ON financial_data (company_ticker, period_type, aggr_type, metric_name_ro, period_end, period_start, value)
+        """,
+        # check_financials.resolve_dynamic_components filters on the normalized parent name
+        """
+        CREATE INDEX IF NOT EXISTS idx_financial_data_parent_norm
+        ON financial_data (TRIM(LOWER(metric_parent)))
+        """,
+        # Every financial_data -> financial_metrics join goes through metric_name_ro
+        """
+        CREATE INDEX IF NOT EXISTS idx_financial_metrics_name
+        ON financial_metrics (metric_name_ro, generalized_metric_eng, generalized_metric_ro, id)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_financial_metrics_generalized
+        ON financial_metrics (generalized_metric_eng, metric_name_ro)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_financial_metrics_name_norm
+        ON financial_metrics (TRIM(LOWER(metric_name_ro)))
+        """,
+        # Derived tables are keyed by period_end first, but read by period/aggr/name
+        """
+        CREATE INDEX IF NOT EXISTS idx_derived_metrics_lookup
+        ON derived_metrics (company_ticker, period_type, aggr_type, metric_name_eng, period_end, period_start, value)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_financial_ratios_lookup
+        ON financial_ratios (company_ticker, period_type, aggr_type, ratio_name_eng, period_end, value)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_financial_ratios_category
+        ON financial_ratios (company_ticker, period_type, aggr_type, category)
+        """,
+        # Revenue breakdown and notes-based derived metrics
+        """
+        CREATE INDEX IF NOT EXISTS idx_notes_type
+        ON notes (company_ticker, note_type, period_end)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_notes_period
+        ON notes (company_ticker, period_type, aggr_type, note_element)
+        """,
+        # Next earnings date and event markers on the price chart
+        """
+        CREATE INDEX IF NOT EXISTS idx_financial_events_ticker
+        ON financial_events (company_ticker, event_type, event_date)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_company_events_ticker
+        ON company_events (company_ticker, event_type, event_date)
+        """,
+    ]),
+    (2, "latest_snapshot table for the analysis page header card", [
+        CREATE_LATEST_SNAPSHOT,
+        refresh_latest_snapshot,
+    ]),
+    (3, "Change log on financial_data for incremental recomputes", [
+        """
+        CREATE TABLE IF NOT EXISTS financial_data_changes (
+            change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_ticker TEXT NOT NULL,
+            statement_name TEXT,
+            period_end DATE NOT NULL,
+            period_type TEXT,
+            aggr_type TEXT,
+            metric_name_ro TEXT,
+            change_type TEXT NOT NULL CHECK (change_type IN ('insert', 'update', 'delete')),
+            old_value REAL,
+            new_value REAL,
+            changed_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # Last change each consumer (e.g. incremental.py) has processed
+        """
+        CREATE TABLE IF NOT EXISTS change_log_cursors (
+            consumer TEXT PRIMARY KEY,
+            last_change_id INTEGER NOT NULL,
+            updated_at TEXT
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_financial_data_insert
+        AFTER INSERT ON financial_data
+        BEGIN
+            INSERT INTO financial_data_changes (
+                company_ticker, statement_name, period_end, period_type, aggr_type, metric_name_ro,
+                change_type, old_value, new_value
+            )
+            VALUES (
+                NEW.company_ticker, NEW.statement_name, NEW.period_end, NEW.period_type, NEW.aggr_type, NEW.metric_name_ro,
+                'insert', NULL, NEW.value
+            );
+        END
+        """,
+        # Only value changes matter downstream; rewriting line_order or metric_parent is not logged
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_financial_data_update
+        AFTER UPDATE OF value ON financial_data
+        WHEN OLD.value IS NOT NEW.value
+        BEGIN
+            INSERT INTO financial_data_changes (
+                company_ticker, statement_name, period_end, period_type, aggr_type, metric_name_ro,
+                change_type, old_value, new_value
+            )
+            VALUES (
+                NEW.company_ticker, NEW.statement_name, NEW.period_end, NEW.period_type, NEW.aggr_type, NEW.metric_name_ro,
+                'update', OLD.value, NEW.value
+            );
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_financial_data_delete
+        AFTER DELETE ON financial_data
+        BEGIN
+            INSERT INTO financial_data_changes (
+                company_ticker, statement_name, period_end, period_type, aggr_type, metric_name_ro,
+                change_type, old_value, new_value
+            )
+            VALUES (
+                OLD.company_ticker, OLD.statement_name, OLD.period_end, OLD.period_type, OLD.aggr_type, OLD.metric_name_ro,
+                'delete', OLD.value, NULL
+            );
+        END
+        """,
+    ]),
+    (4, "Checkpoints for the resumable price downloader", [
+        # One row per ticker: the run that last touched it and how far it got (price_downloader.py)
+        """
+        CREATE TABLE IF NOT EXISTS price_download_checkpoints (
+            company_ticker TEXT PRIMARY KEY,
+            run_id TEXT NOT NULL,
+            status TEXT NOT NULL CHECK (status IN ('done', 'failed')),
+            last_date TEXT,
+            rows_written INTEGER,
+            attempts INTEGER,
+            error TEXT,
+            updated_at TEXT
+        )
+        """,
+    ]),
+    (5, "Per-ticker data versions for the response cache", [
+        CREATE_DATA_VERSIONS,
+    ]),
+    (6, "chart_series table with the pre-serialized fundamentals charts", [
+        CREATE_CHART_SERIES,
+        refresh_chart_series,
+    ]),
+    (7, "Typed numeric values: clean stored text values, quarantine table, type-guard triggers", [
+        CREATE_QUARANTINE,
+        clean_stored_values,
+        *TYPE_GUARD_TRIGGERS,
+    ]),
+    (8, "Stored display_period / fiscal_year / fiscal_quarter columns behind the view_financial_* views", [
+        add_period_columns,
+        create_period_views,
+        # The chart queries read one ticker's quarters or years through the views
+        """
+        CREATE INDEX IF NOT EXISTS idx_financial_data_display
+        ON financial_data (company_ticker, period_type, period_months, metric_name_ro, fiscal_quarter, period_end, display_period, value)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_financial_ratios_display
+        ON financial_ratios (company_ticker, ratio_name_eng, period_type, period_months, fiscal_quarter, period_end, display_period, value)
+        """,
+    ]),
+    (9, "Precomputed industry statistics and company percentiles per ratio and period", [
+        CREATE_INDUSTRY_STATS,
+        CREATE_INDUSTRY_PERCENTILES,
+        refresh_industry_stats,
+    ]),
+]
+
+
+# Queries the pages and batch jobs run all the time, with representative parameters.
+# check_query_plans() asserts none of them scans a whole table.
+HOT_QUERIES = {
+    "financial_statement": ("""
+        SELECT f.statement_name, m.id, m.metric_name_ro, f.value, f.period_end
+        FROM financial_data f
+        JOIN financial_metrics m ON f.metric_name_ro = m.metric_name_ro AND f.company_ticker = m.company_ticker
+        WHERE f.company_ticker = ? AND f.statement_name IN (?, ?, ?)
+          AND f.period_type = ? AND f.aggr_type = ?
+    """, ("AQ", "Profit&Loss", "Balance Sheet", "Cash Flow", "annual", "cml")),
+
+    "financial_statements_bulk": ("""
+        SELECT f.company_ticker, f.statement_name, m.id, m.metric_name_ro, f.value, f.period_end
+        FROM financial_data f
+        JOIN financial_metrics m ON f.metric_name_ro = m.metric_name_ro AND f.company_ticker = m.company_ticker
+        WHERE f.company_ticker IN (?, ?) AND f.statement_name IN (?, ?, ?)
+          AND f.period_type = ? AND f.aggr_type = ?
+    """, ("AQ", "WINE", "Profit&Loss", "Balance Sheet", "Cash Flow", "annual", "cml")),
+
+    "ratio_inputs": ("""
+        SELECT f.company_ticker, f.period_start, f.period_end, f.period_type, f.aggr_type,
+               m.generalized_metric_eng AS metric, f.value
+        FROM financial_data f
+        JOIN financial_metrics m ON f.metric_name_ro = m.metric_name_ro
+        WHERE f.company_ticker = ? AND f.period_type = ? AND f.aggr_type = ?
+          AND m.generalized_metric_eng IN (?, ?)
+    """, ("AQ", "annual", "cml", "Revenue", "Net profit a.m.")),
+
+    "derived_inputs": ("""
+        SELECT company_ticker, period_start, period_end, period_type, aggr_type, metric_name_eng, value
+        FROM derived_metrics
+        WHERE company_ticker = ? AND period_type = ? AND aggr_type = ? AND metric_name_eng IN (?, ?)
+    """, ("AQ", "annual", "cml", "EBITDA", "Net debt")),
+
+    "validation_components": ("""
+        SELECT DISTINCT fm.generalized_metric_eng, fd.metric_parent
+        FROM financial_metrics fm
+        JOIN financial_data fd
+          ON TRIM(LOWER(fm.metric_name_ro)) = TRIM(LOWER(fd.metric_name_ro))
+        WHERE TRIM(LOWER(fd.metric_parent)) = ?
+    """, ("total active",)),
+
+    "grouped_ratios": ("""
+        SELECT ratio_name_ro, value, category, period_end
+        FROM financial_ratios
+        WHERE company_ticker = ? AND period_type = ? AND aggr_type = ?
+          AND category IN ('Profitabilitate', 'Indatorare')
+    """, ("AQ", "annual", "cml")),
+
+    "ratio_series": ("""
+        SELECT period_end, value
+        FROM financial_ratios
+        WHERE company_ticker = ? AND period_type = ? AND aggr_type = ? AND ratio_name_eng = ?
+        ORDER BY period_end ASC
+    """, ("AQ", "quarter", "qtl", "Net profit margin")),
+
+    "revenue_notes": ("""
+        SELECT note_element, value, line_order
+        FROM notes
+        WHERE company_ticker = ? AND note_type = 'revenue' AND period_end = ?
+        ORDER BY line_order ASC
+    """, ("AQ", "2024-12-31")),
+
+    "next_earnings": ("""
+        SELECT event_date
+        FROM financial_events
+        WHERE company_ticker = ? AND event_type = 'earnings_release' AND event_date >= date('now')
+        ORDER BY event_date ASC
+        LIMIT 1
+    """, ("AQ",)),
+
+    "latest_snapshot": ("""
+        SELECT close_price, market_cap, pe_ratio, price_date
+        FROM latest_snapshot
+        WHERE company_ticker = ?
+    """, ("AQ",)),
+
+    "pending_changes": ("""
+        SELECT change_id, company_ticker, period_end
+        FROM financial_data_changes
+        WHERE change_id > ?
+        ORDER BY change_id ASC
+    """, (0,)),
+
+    "price_history": ("""
+        SELECT date, close_price
+        FROM stock_data
+        WHERE company_ticker = ? AND date >= ?
+        ORDER BY date ASC
+    """, ("AQ", "2024-01-01")),
+
+    "last_price_date": ("""
+        SELECT MAX(date)
+        FROM stock_data
+        WHERE company_ticker = ?
+    """, ("AQ",)),
+
+    "chart_series": ("""
+        SELECT payload
+        FROM chart_series
+        WHERE company_ticker = ? AND chart_type = ? AND period_type = ?
+    """, ("AQ", "revenue", "qtl")),
+
+    "chart_metric_qtl": ("""
+        SELECT v.period_end, v.display_period, v.value
+        FROM view_financial_qtl v
+        JOIN financial_metrics m
+        ON v.metric_name_ro = m.metric_name_ro
+        AND v.company_ticker = m.company_ticker
+        WHERE v.company_ticker = ? AND m.generalized_metric_eng = ?
+        ORDER BY v.period_end ASC
+    """, ("AQ", "Revenue")),
+
+    "chart_ratio_annual": ("""
+        SELECT period_end, display_period, value
+        FROM view_financial_ratios_annual
+        WHERE company_ticker = ? AND ratio_name_eng = ?
+        ORDER BY period_end ASC
+    """, ("AQ", "Revenue growth y/y")),
+
+    "industry_stats": ("""
+        SELECT s.industry, s.ratio_name_ro, s.period_end, s.companies, s.median, s.q1, s.q3, s.mean, s.weighted_mean, p.percentile
+        FROM industry_stats s
+        LEFT JOIN industry_percentiles p
+          ON p.company_ticker = ? AND p.period_type = s.period_type AND p.aggr_type = s.aggr_type
+         AND p.ratio_name_eng = s.ratio_name_eng AND p.period_end = s.period_end
+        WHERE s.industry = (SELECT industry FROM companies WHERE company_ticker = ?)
+          AND s.period_type = ? AND s.aggr_type = ?
+    """, ("AQ", "AQ", "annual", "cml")),
+
+    "data_version": ("""
+        SELECT COALESCE(SUM(version), 0), MAX(updated_at)
+        FROM data_versions
+        WHERE company_ticker IN (?, ?)
+    """, ("AQ", "*")),
+}
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn, migrations=MIGRATIONS):
+    """
+    Brings the database behind `conn` up to the latest version.
+    Each migration takes the write lock (BEGIN IMMEDIATE) before re-reading user_version, so when several
+    processes migrate at once one applies it and the others wait, then skip it.
+    Returns the list of versions applied (empty if the schema was already current).
+    """
+    applied = []
+
+    for version, description, steps in sorted(migrations, key=lambda m: m[0]):
+        if version <= get_schema_version(conn):
+            continue
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if version <= get_schema_version(conn):  # applied by another process while this one waited
+                conn.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            # PRAGMA does not accept bound parameters; version is an int from the list above
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            print(f"❌ Migration {version} failed: {description}")
+            raise
+        print(f"🛠️ Applied migration {version}: {description}")
+        applied.append(version)
+
+    return applied
+
+
+def explain_query_plan(conn, sql, params=()):
+    """
+    Returns the 'detail' lines of EXPLAIN QUERY PLAN for one query.
+    """
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+
+
+def check_query_plans(conn, queries=HOT_QUERIES):
+    """
+    Runs EXPLAIN QUERY PLAN on every registered hot query.
+    Returns {query_name: [offending plan lines]} for the queries that scan a whole table.
+    A plan line counts as a full scan when SQLite reports 'SCAN <table>' without an index to
+    search; 'SEARCH ... USING INDEX' and the temp b-trees used for ORDER BY/DISTINCT are fine.
+    """
+    failures = {}
+    for name, (sql, params) in queries.items():
+        plan = explain_query_plan(conn, sql, params)
+        scans = [line for line in plan if line.startswith("SCAN ") and "CONSTANT ROW" not in line]
+        if scans:
+            failures[name] = scans
+    return failures
+
+
+if __name__ == "__main__":
+    from db import DB_PATH, get_read_connection, write_connection
+
+    with write_connection(DB_PATH) as conn:
+        applied = apply_migrations(conn)
+        print(f"✅ Schema at version {get_schema_version(conn)} ({len(applied)} migration(s) applied).")
+
+    if "--check" in sys.argv:
+        failures = check_query_plans(get_read_connection(DB_PATH))
+        for name, scans in failures.items():
+            print(f"❌ {name}: {' | '.join(scans)}")
+        if failures:
+            sys.exit(1)
+        print(f"✅ All {len(HOT_QUERIES)} hot queries use an index.")
@@ -0,0 +1,153 @@
+# numeric_values.py
+# -----------------
+# Typed numeric storage for financial values.
+#
+# The statements arrive from Excel, where a cell can hold "1,234,567", "(12 345)" or "n/a" instead of a number.
+# Values are normalized once, at ingest time (update_db.update_financials_db):
+#
+# ✅ numbers pass through; text is parsed with the rules below
+# ✅ blanks and placeholders ("", "-", "n/a") become NULL
+# ✅ anything else is kept out of financial_data and recorded in financial_data_quarantine for review
+#
+# Migration 7 applies the same rules to the rows already stored and adds triggers that reject text values,
+# so every read path can use the values as numbers without parsing them again.
+#
+# Parsing rules: commas and spaces are thousands separators, "(x)" and a trailing "-" mean negative,
+# the Unicode minus sign counts as "-".
+
+import re
+from datetime import datetime
+
+import pandas as pd
+
+BLANK_VALUES = {"", "-", "–", "—", "n/a", "na", "nan", "none", "null"}
+_SEPARATORS = re.compile(r"[,\s']")
+
+CREATE_QUARANTINE = """
+    CREATE TABLE IF NOT EXISTS financial_data_quarantine (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        company_ticker TEXT,
+        statement_name TEXT,
+        period_start DATE,
+        period_end DATE,
+        period_type TEXT,
+        aggr_type TEXT,
+        currency TEXT,
+        metric_name_ro TEXT,
+        raw_value TEXT,
+        source TEXT,
+        quarantined_at TEXT
+    )
+"""
+
+QUARANTINE_COLUMNS = [
+    "company_ticker", "statement_name", "period_start", "period_end", "period_type",
+    "aggr_type", "currency", "metric_name_ro", "raw_value", "source",
+]
+
+# Last line of defence: text never reaches the value columns again
+TYPE_GUARD_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_numeric_{event.split()[0].lower()}
+    BEFORE {event} ON {table}
+    WHEN typeof(NEW.value) NOT IN ('real', 'integer', 'null')
+    BEGIN
+        SELECT RAISE(ABORT, '{table}.value must be numeric');
+    END
+    """
+    for table in ("financial_data", "financial_ratios", "derived_metrics")
+    for event in ("INSERT", "UPDATE OF value")
+]
+
+
+def parse_numeric(value):
+    """
+    Returns (number or None, ok). ok is False only for text that is neither a number nor a blank placeholder.
+    """
+    if value is None:
+        return None, True
+    if isinstance(value, (int, float)):
+        return (None, True) if pd.isna(value) else (float(value), True)
+
+    text = str(value).strip()
+    if text.lower() in BLANK_VALUES:
+        return None, True
+
+    negative = False
+    if text.startswith("(") and text.endswith(")"):
+        negative, text = True, text[1:-1]
+    elif text.endswith("-") and len(text) > 1:
+        negative, text = True, text[:-1]
+    text = _SEPARATORS.sub("", text).replace("−", "-")
+
+    try:
+        number = float(text)
+    except ValueError:
+        return None, False
+    return (-number if negative else number), True
+
+
+def normalize_numeric_column(values):
+    """
+    Vectorized parse_numeric over a Series. Returns (float Series, Series of bool: True where unparsable).
+    Values that are already numbers skip the parser.
+    """
+    numbers = pd.to_numeric(values, errors="coerce")
+    to_parse = numbers.isna() & values.notna()
+    bad = pd.Series(False, index=values.index)
+    if to_parse.any():
+        parsed = values[to_parse].map(parse_numeric)
+        numbers.loc[to_parse] = parsed.str[0].astype(float)
+        bad.loc[to_parse] = ~parsed.str[1].astype(bool)
+    return numbers.astype(float), bad
+
+
+def quarantine_rows(conn, rows, source):
+    """
+    Records rows (a DataFrame with QUARANTINE_COLUMNS, except source, and raw_value) on the caller's connection.
+    """
+    if rows.empty:
+        return 0
+    rows = rows.assign(source=source)[QUARANTINE_COLUMNS].astype(object)
+    rows = rows.where(rows.notna(), None)
+    conn.executemany(f"""
+        INSERT INTO financial_data_quarantine ({', '.join(QUARANTINE_COLUMNS)}, quarantined_at)
+        VALUES ({', '.join('?' for _ in QUARANTINE_COLUMNS)}, ?)
+    """, [(*row, datetime.now().strftime("%Y-%m-%d %H:%M:%S")) for row in rows.itertuples(index=False, name=None)])
+    return len(rows)
+
+
+def _table_exists(conn, table):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+
+def clean_stored_values(conn):
+    """
+    One-shot cleanup for migration 7: parses text stored in financial_data / financial_ratios / derived_metrics.value.
+    Unparsable financial_data rows move to the quarantine; unparsable computed values become NULL.
+    """
+    if _table_exists(conn, "financial_data"):
+        rows = pd.read_sql_query(f"""
+            SELECT id, {', '.join(QUARANTINE_COLUMNS[:-2])}, value AS raw_value
+            FROM financial_data
+            WHERE typeof(value) = 'text'
+        """, conn)
+        values, bad = normalize_numeric_column(rows["raw_value"])
+        good = ~bad
+        conn.executemany("UPDATE financial_data SET value = ? WHERE id = ?", [
+            (None if pd.isna(v) else v, int(i)) for v, i in zip(values[good], rows.loc[good, "id"])
+        ])
+        quarantine_rows(conn, rows[bad], "migration 7")
+        conn.executemany("DELETE FROM financial_data WHERE id = ?", [(int(i),) for i in rows.loc[bad, "id"]])
+        if len(rows):
+            print(f"🧹 financial_data: {int(good.sum())} text value(s) converted, {int(bad.sum())} quarantined")
+
+    for table in ("financial_ratios", "derived_metrics"):
+        if not _table_exists(conn, table):
+            continue
+        rows = conn.execute(f"SELECT rowid, value FROM {table} WHERE typeof(value) = 'text'").fetchall()
+        conn.executemany(f"UPDATE {table} SET value = ? WHERE rowid = ?", [
+            (parse_numeric(value)[0], rowid) for rowid, value in rows
+        ])
+        if rows:
+            print(f"🧹 {table}: {len(rows)} text value(s) converted")
@@ -0,0 +1,229 @@
+# price_downloader.py
+# -------------------
+# Concurrent, resumable, incremental download of daily prices into stock_data.
+#
+# ✅ Incremental: each ticker is fetched from the stored day before its last one (the last day is fetched
+#    again in case it was stored mid-session), instead of the full history every time
+# ✅ Re-adjustments: Yahoo rescales the whole adjusted history after a dividend or split; when the close
+#    of that overlapping complete day no longer matches the stored one, the full history is fetched again
+#    so the stored series never mixes two price bases
+# ✅ Concurrent: tickers are downloaded by a bounded thread pool; the writes still go through the
+#    single writer connection (db.write_connection), one short transaction per ticker
+# ✅ Retries: a failing provider call is retried with exponential backoff
+# ✅ Resumable: every ticker's outcome is checkpointed in price_download_checkpoints, in the same
+#    transaction as its prices, so re-running an interrupted run skips the tickers already done
+# ✅ Pluggable: the data source is any callable provider(ticker, start) returning a frame in the
+#    yfinance layout (Date, Close, Volume); start=None asks for the full history
+#
+# New price rows have NULL pe_ratio / change_* columns, and rows whose price changed (anywhere in the history
+# after a full refetch) are reset to NULL; stock_data.update_eps_and_pe() and update_variations() recompute them.
+#
+# Usage:
+#   python price_downloader.py                 # daily refresh of all tickers
+#   python price_downloader.py --full          # refetch and recompute every ticker's full history
+#   from price_downloader import download_prices
+#   download_prices(["AQ"], provider=my_fake_provider, run_id="test")
+
+import math
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+
+import pandas as pd
+import yfinance as yf
+
+from db import read_connection, write_connection
+from data_versions import bump_data_version
+from latest_snapshot import refresh_latest_snapshot
+from stock_data import SHARES_BY_TICKER, TICKERS, initialize_stock_table, update_eps_and_pe, update_variations
+
+MAX_WORKERS = 8
+RETRIES = 3
+BACKOFF_SECONDS = 1.0
+PRICE_COLUMNS = ["company_ticker", "date", "close_price", "volume", "market_cap", "source"]
+
+
+def yfinance_provider(ticker, start=None):
+    """
+    Daily adjusted prices for a BVB ticker from Yahoo Finance, from `start` (inclusive) or the full history.
+    Uses Ticker.history rather than yf.download: yf.download keeps its results in module globals that
+    concurrent calls overwrite, while each Ticker holds its own. A failure comes back as an empty frame;
+    since `start` is always a stored trading day, an empty frame is raised as an error so the download is retried.
+    """
+    period = {"start": start} if start else {"period": "max"}
+    df = yf.Ticker(f"{ticker}.RO").history(interval="1d", auto_adjust=True, actions=False, **period)
+    if df is None or df.empty:
+        raise ValueError(f"no prices returned for {ticker}.RO")
+    return df
+
+
+def prepare_price_rows(raw, ticker, shares_outstanding, source="yfinance"):
+    """
+    Converts a yfinance price frame (yf.download or Ticker.history) into stock_data rows (PRICE_COLUMNS).
+    """
+    if raw is None or raw.empty:
+        return pd.DataFrame(columns=PRICE_COLUMNS)
+
+    df = raw.reset_index()
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.droplevel(1) if "Date" in df.columns.get_level_values(0) else df.columns.droplevel(0)
+    df = df.dropna(subset=["Close"])
+
+    rows = pd.DataFrame({
+        "company_ticker": ticker,
+        "date": pd.to_datetime(df["Date"]).dt.strftime("%Y-%m-%d"),
+        "close_price": df["Close"].astype(float).round(4),
+        "volume": df["Volume"].fillna(0).astype(int),
+    })
+    rows["market_cap"] = (rows["close_price"] * shares_outstanding).astype(float)
+    rows["source"] = source
+    return rows[PRICE_COLUMNS]
+
+
+def upsert_prices(conn, rows):
+    """
+    Inserts new price rows and updates the ones whose price or volume changed. A changed price clears the
+    values computed from it, so the EPS / variation passes recompute them. Returns the number of rows written.
+    """
+    before = conn.total_changes
+    conn.executemany("""
+        INSERT INTO stock_data (company_ticker, date, close_price, volume, market_cap, source)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(company_ticker, date) DO UPDATE SET
+            close_price = excluded.close_price,
+            volume = excluded.volume,
+            market_cap = excluded.market_cap,
+            source = excluded.source,
+            pe_ratio = NULL,
+            change_day = NULL,
+            change_yoy = NULL,
+            change_ytd = NULL
+        WHERE stock_data.close_price IS NOT excluded.close_price
+           OR stock_data.volume IS NOT excluded.volume
+    """, list(rows[PRICE_COLUMNS].itertuples(index=False, name=None)))
+    return conn.total_changes - before
+
+
+def _save_checkpoint(conn, ticker, run_id, status, last_date, rows_written, attempts, error=None):
+    conn.execute("""
+        INSERT INTO price_download_checkpoints (
+            company_ticker, run_id, status, last_date, rows_written, attempts, error, updated_at
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(company_ticker) DO UPDATE SET
+            run_id = excluded.run_id,
+            status = excluded.status,
+            last_date = excluded.last_date,
+            rows_written = excluded.rows_written,
+            attempts = excluded.attempts,
+            error = excluded.error,
+            updated_at = excluded.updated_at
+    """, (ticker, run_id, status, last_date, rows_written, attempts, error,
+          datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+
+def _fetch(provider, ticker, start, retries, backoff):
+    """Calls the provider, retrying with exponential backoff. Returns (raw, error, attempts)."""
+    error = None
+    for attempt in range(1, retries + 1):
+        try:
+            return provider(ticker, start), None, attempt
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if attempt < retries:
+                time.sleep(backoff * 2 ** (attempt - 1))
+    return None, error, retries
+
+
+def download_ticker(ticker, provider, run_id, full=False, retries=RETRIES, backoff=BACKOFF_SECONDS, db_path=None):
+    """
+    Fetches and stores one ticker, retrying the provider with exponential backoff.
+    An incremental fetch starts at the stored day before the last one (a complete session): when the provider's
+    close for that day differs from the stored one, the history was re-adjusted (dividend, split) and the full
+    history is fetched instead. Returns (status, rows_written).
+    """
+    shares_outstanding = SHARES_BY_TICKER.get(ticker)
+    with read_connection(db_path) as conn:
+        recent = conn.execute("""
+            SELECT date, close_price FROM stock_data WHERE company_ticker = ? ORDER BY date DESC LIMIT 2
+        """, (ticker,)).fetchall()
+    last_date = recent[0][0] if recent else None
+    anchor_date, anchor_close = recent[-1] if recent else (None, None)
+    start = None if full else anchor_date
+
+    raw, error, attempts = None, None, 0
+    if not shares_outstanding:
+        error = "Number of shares not defined"
+    else:
+        raw, error, attempts = _fetch(provider, ticker, start, retries, backoff)
+
+    if error is None:
+        rows = prepare_price_rows(raw, ticker, shares_outstanding)
+        if start:
+            rows = rows[rows["date"] >= start]
+            anchor = rows.loc[rows["date"] == anchor_date, "close_price"]
+            if anchor.empty or not math.isclose(anchor.iloc[0], anchor_close, rel_tol=1e-6, abs_tol=1e-4):
+                print(f"🔁 {ticker}: close of {anchor_date} moved ({anchor_close} → "
+                      f"{anchor.iloc[0] if not anchor.empty else 'missing'}), refetching the full history")
+                start = None
+                raw, error, more = _fetch(provider, ticker, None, retries, backoff)
+                attempts += more
+                rows = prepare_price_rows(raw, ticker, shares_outstanding) if error is None else None
+
+    if error is not None:
+        with write_connection(db_path) as conn:
+            _save_checkpoint(conn, ticker, run_id, "failed", last_date, 0, attempts, error)
+        print(f"❌ {ticker}: {error}")
+        return "failed", 0
+
+    with write_connection(db_path) as conn:
+        written = upsert_prices(conn, rows) if not rows.empty else 0
+        if written:
+            refresh_latest_snapshot(conn, [ticker])
+            bump_data_version(conn, [ticker])
+        new_last_date = rows["date"].max() if not rows.empty else last_date
+        _save_checkpoint(conn, ticker, run_id, "done", new_last_date, written, attempts)
+
+    print(f"✅ {ticker}: {written} row(s) written since {start or 'the first listing'}")
+    return "done", written
+
+
+def download_prices(tickers=None, provider=yfinance_provider, run_id=None, full=False,
+                    max_workers=MAX_WORKERS, retries=RETRIES, backoff=BACKOFF_SECONDS, db_path=None):
+    """
+    Downloads `tickers` (all of TICKERS when None) concurrently. Tickers already checkpointed as done for
+    `run_id` (default: today's date) are skipped, so re-running an interrupted run resumes it.
+    Returns {ticker: (status, rows_written)} for the tickers processed in this call.
+    """
+    tickers = list(TICKERS if tickers is None else [tickers] if isinstance(tickers, str) else tickers)
+    run_id = run_id or date.today().isoformat()
+
+    with read_connection(db_path) as conn:
+        done = {row[0] for row in conn.execute(
+            "SELECT company_ticker FROM price_download_checkpoints WHERE run_id = ? AND status = 'done'", (run_id,)
+        )}
+    pending = [t for t in tickers if t not in done]
+    print(f"📥 Price download {run_id}: {len(pending)} ticker(s) to fetch, {len(tickers) - len(pending)} already done")
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(download_ticker, ticker, provider, run_id, full, retries, backoff, db_path): ticker
+            for ticker in pending
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+
+    failed = sorted(t for t, (status, _) in results.items() if status == "failed")
+    written = sum(rows for _, rows in results.values())
+    print(f"✅ Price download {run_id}: {written} row(s) written, {len(failed)} failed{': ' + ', '.join(failed) if failed else ''}")
+    return results
+
+
+if __name__ == "__main__":
+    full = "--full" in sys.argv
+    initialize_stock_table()
+    download_prices(TICKERS, full=full)
+    update_eps_and_pe(TICKERS)
+    update_variations(TICKERS, full=full)
@@ -1,19 +1,34 @@
-import sqlite3
+import numpy as np
 import pandas as pd
 from datetime import datetime
-import os
 from dateutil.relativedelta import relativedelta
+from chart_series import refresh_chart_series
+from data_versions import bump_data_version
+from display_periods import PERIOD_COLUMNS, period_columns
+from db import DB_PATH, read_connection, write_connection
+from industry_stats import refresh_industry_stats
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Path to app/ directory
-DATA_DIR = os.path.join(BASE_DIR, "data")  # Path to data/
-DB_PATH = os.path.join(DATA_DIR, "financials.db")  # Full path to database
+# The helpers below accept scalars (one period at a time) or pandas Series (a whole column of periods).
+# Column-wise, a missing input or a zero denominator gives NaN, the vector equivalent of None.
+
+def _is_vector(*values):
+    return any(isinstance(v, (pd.Series, np.ndarray)) for v in values)
+
+def _zero_to_nan(values):
+    values = np.asarray(values, dtype="float64")
+    return np.where(values == 0, np.nan, values)
 
 def safe_divide(numerator, denominator, multiplier=1):
+    if _is_vector(numerator, denominator):
+        denominator = _zero_to_nan(denominator)
+        return (numerator / denominator) * multiplier
     if numerator is not None and denominator not in (None, 0):
         return (numerator / denominator) * multiplier
     return None
 
 def average(ending_value, beginning_value):
+    if _is_vector(ending_value, beginning_value):
+        return (ending_value + beginning_value) / 2
     if ending_value is not None and beginning_value is not None:
         return (ending_value + beginning_value) / 2
     return None
@@ -103,15 +118,19 @@ def rate_of_change(current: float, prior: float, multiplier: float = 100) -> flo
         ((current - prior) / abs(prior)) * multiplier
 
     Returns None if prior is None or zero (to avoid division error).
+    Also accepts two pandas Series and then returns a Series (NaN where prior is missing or zero).
 
     Args:
-        current (float): Current period value.
-        prior (float): Prior period value (must not be 0).
+        current (float | pd.Series): Current period value.
+        prior (float | pd.Series): Prior period value (must not be 0).
         multiplier (float): Multiplier for scaling (default is 100 for %).
 
     Returns:
         float or None: Rate of change, or None if invalid.
     """
+    if _is_vector(current, prior):
+        prior = _zero_to_nan(prior)
+        return ((current - prior) / np.abs(prior)) * multiplier
     if current is None or prior in (None, 0):
         return None
     try:
@@ -235,260 +254,231 @@ RATIO_DEFINITIONS = {
     # Additional ratios can be added here
 }
 
-def calculate_and_store_ratio(DB_PATH, ticker, ratio_key, period_type, aggr_type):
-    # Retrieve the ratio definition
-    ratio_def = RATIO_DEFINITIONS[ratio_key]
-    metrics_needed = tuple(ratio_def["required_metrics"].values())
 
-    # Connect to DB and fetch relevant data
-    conn = sqlite3.connect(DB_PATH)
+# ============================================= BATCH RATIO ENGINE =============================================
+# Loads every metric the ratios need for all tickers in one pass, computes each ratio column-wise over all
+# periods at once and writes the results in a single transaction.
 
-    if period_type == "annual":
-        query_raw = f"""
-            SELECT 
-                f.company_ticker,
-                f.period_start,
-                f.period_end,
-                f.period_type,
-                f.aggr_type,
-                m.generalized_metric_eng AS metric,
-                f.value
-            FROM financial_data f
-            JOIN financial_metrics m ON f.metric_name_ro = m.metric_name_ro
-            WHERE f.company_ticker = ?
-              AND f.period_type = 'annual'
-              AND f.aggr_type = ?
-              AND m.generalized_metric_eng IN ({','.join('?' for _ in metrics_needed)})"""
-    
-        params = [ticker, aggr_type] + list(metrics_needed)
-
-    elif period_type == "quarter" and aggr_type == "cml":
-        query_raw = f"""
-            SELECT 
-                f.company_ticker,
-                f.period_start,
-                f.period_end,
-                f.period_type,
-                f.aggr_type,
-                m.generalized_metric_eng AS metric,
-                f.value
-            FROM financial_data f
-            JOIN financial_metrics m ON f.metric_name_ro = m.metric_name_ro
-            WHERE f.company_ticker = ?
-              AND f.aggr_type = 'cml'
-              AND (f.period_type = 'quarter' OR f.period_type = 'annual')
-              AND m.generalized_metric_eng IN ({','.join('?' for _ in metrics_needed)})"""
-        
-        params = [ticker] + list(metrics_needed)
-
-    elif period_type == "quarter" and aggr_type == "qtl":
-        query_raw = f"""
-            SELECT 
-                f.company_ticker,
-                f.period_start,
-                f.period_end,
-                f.period_type,
-                f.aggr_type,
-                m.generalized_metric_eng AS metric,
-                f.value
-            FROM financial_data f
-            JOIN financial_metrics m ON f.metric_name_ro = m.metric_name_ro
-            WHERE f.company_ticker = ?
-              AND f.period_type = 'quarter'
-              AND f.aggr_type = ?
-              AND m.generalized_metric_eng IN ({','.join('?' for _ in metrics_needed)})"""
-        
-        params = [ticker, aggr_type] + list(metrics_needed)
+# (period_type, aggr_type) combinations ratios are computed for → period types that may serve as the prior period.
+# Cumulative quarters take their opening balance (e.g. "Total assets_begin") from the previous year-end,
+# which is stored as an annual row.
+RATIO_SCOPES = {
+    ("annual", "cml"): ("annual",),
+    ("quarter", "cml"): ("quarter", "annual"),
+    ("quarter", "qtl"): ("quarter",),
+}
+
+PERIOD_KEYS = ["company_ticker", "period_start", "period_end", "period_type", "aggr_type"]
+
+
+def _ratio_suffix(ratio_key):
+    return "_prior" if "growth" in ratio_key.lower() else "_begin"
+
+
+def _current_metrics(ratio_def, suffix):
+    return [name for name in ratio_def["required_metrics"].values() if not name.endswith(suffix)]
 
-    df_raw = pd.read_sql_query(query_raw, conn, params=params)
+
+def _base_metrics(ratio_def, suffix):
+    """
+    Metrics a ratio reads from the database: "Total assets_begin" is "Total assets" of the prior period.
+    """
+    names = []
+    for name in ratio_def["required_metrics"].values():
+        name = name[:-len(suffix)] if name.endswith(suffix) else name
+        if name not in names:
+            names.append(name)
+    return names
+
+
+def _months_back(ratio_key, period_end, period_type, aggr_type):
+    """
+    Column-wise counterpart of get_prior_period_end / get_growth_prior_period_end:
+    how many months separate each period from the one it is compared against.
+    """
+    key = ratio_key.lower()
+    if "growth" in key:
+        if "y/y" in key or "yoy" in key:
+            return pd.Series(12, index=period_end.index)
+        if "q/q" in key or "qoq" in key:
+            return pd.Series(3, index=period_end.index)
+        raise ValueError(f"❌ Cannot determine growth type for: {ratio_key}")
 
     if period_type == "annual":
-        query_derived = f"""
-            SELECT
-                company_ticker,
-                period_start,
-                period_end,
-                period_type,
-                aggr_type,
-                metric_name_eng AS metric,
-                value
-            FROM derived_metrics
-            WHERE company_ticker = ?
-              AND period_type = 'annual'
-              AND aggr_type = ?
-              AND metric_name_eng IN ({','.join('?' for _ in metrics_needed)})
-        """
-        params_derived = [ticker, aggr_type] + list(metrics_needed)
-
-    elif period_type == "quarter" and aggr_type == "cml":
-        query_derived = f"""
-            SELECT
-                company_ticker,
-                period_start,
-                period_end,
-                period_type,
-                aggr_type,
-                metric_name_eng AS metric,
-                value
-            FROM derived_metrics
-            WHERE company_ticker = ?
-              AND aggr_type = 'cml'
-              AND (period_type = 'quarter' OR period_type = 'annual')
-              AND metric_name_eng IN ({','.join('?' for _ in metrics_needed)})
-        """
-        params_derived = [ticker] + list(metrics_needed)
-
-    elif period_type == "quarter" and aggr_type == "qtl":
-        query_derived = f"""
-            SELECT
-                company_ticker,
-                period_start,
-                period_end,
-                period_type,
-                aggr_type,
-                metric_name_eng AS metric,
-                value
-            FROM derived_metrics
-            WHERE company_ticker = ?
-              AND period_type = 'quarter'
-              AND aggr_type = ?
-              AND metric_name_eng IN ({','.join('?' for _ in metrics_needed)})
-        """
-        params_derived = [ticker, aggr_type] + list(metrics_needed)
-
-    df_derived = pd.read_sql_query(query_derived, conn, params=params_derived)
-    # Combine both
-    df = pd.concat([df_raw, df_derived], ignore_index=True)
+        return pd.Series(12, index=period_end.index)
+    if aggr_type == "qtl":
+        return pd.Series(3, index=period_end.index)
+    # cml: go back to the previous year-end (3M → 3, 6M → 6, 9M → 9 months)
+    month = period_end.dt.month
+    return month.where(month.isin([3, 6, 9, 12]), 3)
 
-    print(f"\n📊 Retrieved {len(df)} rows of raw + derived data for {ticker} - {ratio_key}")
-    print(f"\n📊 [Step 1] Combined data preview for {ticker} | {ratio_key}")
-    print(df.head(5))
-
-    conn.close()
-    df["value"] = pd.to_numeric(df["value"].astype(str).str.replace(",", "", regex=False).str.replace(" ", ""), errors="coerce")
-    if df.empty:
-        return f"No data available for {ticker} - {ratio_key}"
-
-    # ✅ Normalize numeric values (mixed comma/float-safe)
-    def clean_numeric(val):
-        """
-        Cleans financial strings:
-        - Removes commas and spaces
-        - Converts to float safely
-        - Leaves real decimals intact
-        """
-        if isinstance(val, str):
-            val = val.replace(",", "").replace(" ", "").strip()
-        try:
-            return float(val)
-        except (TypeError, ValueError):
-            return None
-        
-    # Pivot the data: one row per period_end
-    df_pivot = df.pivot_table(
-        index=["company_ticker", "period_start", "period_end", "period_type", "aggr_type"],
-        columns="metric",
-        values="value"
-    ).reset_index()
-
-    # Convert period_end to datetime
-    df_pivot["period_start"] = pd.to_datetime(df_pivot["period_start"], format="%Y-%m-%d")
-    df_pivot["period_end"] = pd.to_datetime(df_pivot["period_end"], format="%Y-%m-%d")
-
-
-    # Compute prior_period_end using different logic for growth ratios
-    ratio_key_lower = ratio_key.lower()
-
-    if "growth" in ratio_key_lower:
-        if "y/y" in ratio_key_lower or "yoy" in ratio_key_lower:
-            growth_mode = "yoy"
-        elif "q/q" in ratio_key_lower or "qoq" in ratio_key_lower:
-            growth_mode = "qoq"
-        else:
-            raise ValueError(f"❌ Cannot determine growth type for: {ratio_key}")
-        
-        print(f"📈 Growth ratio detected → Using {growth_mode.upper()} logic for prior_period_end.")
-        df_pivot["prior_period_end"] = df_pivot["period_end"].apply(lambda d: get_growth_prior_period_end(d, growth_mode))
 
-    else:
-        print(f"📊 Non-growth ratio → Using default logic based on period_type and aggr_type.")
-        df_pivot["prior_period_end"] = df_pivot.apply(
-            lambda row: get_prior_period_end(row["period_end"], row["period_type"], row["aggr_type"]),
-            axis=1
-        )
+def _shift_to_month_end(dates, months_back):
+    """
+    Moves each date back by `months_back` months and snaps it to the end of that month.
+    """
+    months = dates.dt.year * 12 + (dates.dt.month - 1) - months_back
+    first_of_month = pd.to_datetime({"year": months // 12, "month": months % 12 + 1, "day": 1})
+    return first_of_month + pd.offsets.MonthEnd(0)
 
 
-    print(f"\n🧹 [Step 2] Pivoted data (one row per period_end):")
-    print(df_pivot.head(3))
+def load_ratio_inputs(conn, tickers=None, ratio_keys=None):
+    """
+    Reads every raw and derived metric needed by `ratio_keys` (all ratios when None) for `tickers`
+    (all tickers when None) in long format: one row per ticker, period and metric.
+    """
+    ratio_keys = ratio_keys or list(RATIO_DEFINITIONS)
+    metrics = sorted({
+        name
+        for key in ratio_keys
+        for name in _base_metrics(RATIO_DEFINITIONS[key], _ratio_suffix(key))
+    })
+
+    metric_filter = ",".join("?" for _ in metrics)
+    ticker_filter, ticker_params = "", []
+    if tickers:
+        ticker_params = list(tickers)
+        ticker_filter = f"AND {{prefix}}company_ticker IN ({','.join('?' for _ in ticker_params)})"
+
+    query_raw = f"""
+        SELECT
+            f.company_ticker,
+            f.period_start,
+            f.period_end,
+            f.period_type,
+            f.aggr_type,
+            m.generalized_metric_eng AS metric,
+            f.value
+        FROM financial_data f
+        JOIN financial_metrics m ON f.metric_name_ro = m.metric_name_ro
+        WHERE m.generalized_metric_eng IN ({metric_filter})
+          {ticker_filter.format(prefix="f.")}
+    """
+    query_derived = f"""
+        SELECT
+            company_ticker,
+            period_start,
+            period_end,
+            period_type,
+            aggr_type,
+            metric_name_eng AS metric,
+            value
+        FROM derived_metrics
+        WHERE metric_name_eng IN ({metric_filter})
+          {ticker_filter.format(prefix="")}
+    """
+    params = metrics + ticker_params
+    df_raw = pd.read_sql_query(query_raw, conn, params=params)
+    df_derived = pd.read_sql_query(query_derived, conn, params=params)
 
-    current_df = df_pivot.copy()
-  
-    current_df["prior_period_end"] = current_df["prior_period_end"].astype(str)
-    current_df["period_end"] = current_df["period_end"].astype(str)
+    df = pd.concat([df_raw, df_derived], ignore_index=True)
+    df["value"] = df["value"].astype(float)
+    return df
 
-    print(f"\n⏳ [Step 3] With prior_period_end calculated:")
-    print(current_df[["period_end", "prior_period_end"]].tail(3))
 
-    # Create a prior_df that doesn't include "prior_period_end"
-    prior_df = current_df.copy()
-    prior_df = prior_df.drop(columns=["prior_period_end"], errors="ignore")
-    prior_df = prior_df.rename(columns={"period_end": "prior_period_end"})
+def _apply_rowwise(function, columns):
+    """
+    Fallback for ratio functions that only handle scalars: call them once per row, None for missing inputs.
+    """
+    def call(*values):
+        values = [None if pd.isna(v) else v for v in values]
+        try:
+            return function(*values)
+        except Exception:
+            return None
+    return pd.Series([call(*values) for values in zip(*columns)], index=columns[0].index, dtype="float64")
 
-    # Merge
-    suffix = "_prior" if "growth" in ratio_key.lower() else "_begin"
-    merged = pd.merge(current_df, prior_df, how="left",
-            on=["company_ticker", "prior_period_end"], suffixes=("", suffix))
 
-    # Check if all required columns exist before debug print or computation
-    required_columns = list(ratio_def["required_metrics"].values())
-    missing_columns = [col for col in required_columns if col not in merged.columns]
+def compute_ratios(inputs, ratio_keys=None, scopes=None):
+    """
+    Computes every ratio in `ratio_keys` for every (period_type, aggr_type) in `scopes` from the long-format
+    `inputs` returned by load_ratio_inputs. Returns one DataFrame row per ticker, period and ratio,
+    in the column layout of the financial_ratios table.
+    """
+    ratio_keys = ratio_keys or list(RATIO_DEFINITIONS)
+    scopes = scopes or list(RATIO_SCOPES)
+    if inputs.empty:
+        return pd.DataFrame()
 
-    if missing_columns:
-        print(f"⚠️ Skipping '{ratio_key}' for {ticker} ({period_type}, {aggr_type}) — missing metrics: {missing_columns}")
-        return f"Skipped: missing columns {missing_columns} for {ratio_key}"
-    
-    print(f"\n🔁 [Step 4] Merged current vs prior:")
-    print(merged[["company_ticker", "period_end", "prior_period_end"] + list(ratio_def["required_metrics"].values())].tail(3))
+    pivot = inputs.pivot_table(index=PERIOD_KEYS, columns="metric", values="value").reset_index()
+    pivot.columns.name = None
+    pivot["period_end"] = pd.to_datetime(pivot["period_end"], format="%Y-%m-%d")
 
-    # Calculate the ratio
+    calculated_at = datetime.now().isoformat()
     results = []
-    for _, row in merged.iterrows():
-        try:
-            metric_values = [row.get(val) for val in ratio_def["required_metrics"].values()]
-            print("🧪 Inputs:", metric_values)
-            print("🧪 Ratio being computed:", ratio_key)
 
-            for label, std_name in ratio_def["required_metrics"].items():
-                print(f"🔍 {label} => {std_name}: {row.get(std_name)}")
+    for period_type, aggr_type in scopes:
+        source_types = RATIO_SCOPES.get((period_type, aggr_type), (period_type,))
+        in_scope = (inputs["aggr_type"] == aggr_type) & inputs["period_type"].isin(source_types)
+        metrics_by_ticker = inputs[in_scope].groupby("company_ticker")["metric"].agg(set)
 
-            val = ratio_def["function"](*metric_values)
-        except Exception:
-            val = None
-
-        results.append({
-            "company_ticker": row["company_ticker"],
-            "period_start": row["period_start"],            
-            "period_end": row["period_end"],
-            "period_type": row["period_type"],
-            "aggr_type": row["aggr_type"],
-            "ratio_name_eng": ratio_key,
-            "ratio_name_ro": ratio_def["ratio_name_ro"],
-            "measure_unit": ratio_def["measure_unit"],
-            "value": val,
-            "category":ratio_def["category"],
-            "formula": ratio_def["formula"],
-            "calculated_at": datetime.now().isoformat()
-        })
-        print(f"\n🔍 [Step 5] Computing ratio: {ratio_key} for {row['company_ticker']} | {row['period_type']} | {row['aggr_type']} | period_end: {row['period_end']}")
-        for label, std_name in ratio_def["required_metrics"].items():
-            print(f"   - {label}: {row.get(std_name)}")
-
-        print(f"   ➕ Result: {val}")
-
-    # Insert into financial_ratios table
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
+        source = pivot[(pivot["aggr_type"] == aggr_type) & pivot["period_type"].isin(source_types)]
+        current = source[source["period_type"] == period_type].reset_index(drop=True)
+        if current.empty:
+            continue
+
+        prior = (
+            source.drop(columns=["period_start", "period_type", "aggr_type"])
+                  .drop_duplicates(subset=["company_ticker", "period_end"])
+                  .rename(columns={"period_end": "prior_period_end"})
+        )
+
+        for ratio_key in ratio_keys:
+            ratio_def = RATIO_DEFINITIONS[ratio_key]
+            suffix = _ratio_suffix(ratio_key)
+            base_metrics = _base_metrics(ratio_def, suffix)
+            current_metrics = [m for m in _current_metrics(ratio_def, suffix) if m in current.columns]
+
+            # A ticker is skipped for this ratio when one of its metrics is not reported at all
+            eligible = [ticker for ticker, found in metrics_by_ticker.items() if set(base_metrics) <= found]
+            rows = current[current["company_ticker"].isin(eligible)]
+            if current_metrics:
+                rows = rows[rows[current_metrics].notna().any(axis=1)]
+            else:
+                rows = rows.iloc[0:0]
+            if rows.empty:
+                print(f"⚠️ Skipping '{ratio_key}' ({period_type}, {aggr_type}) — no ticker reports {base_metrics}")
+                continue
+
+            rows = rows.assign(prior_period_end=_shift_to_month_end(
+                rows["period_end"], _months_back(ratio_key, rows["period_end"], period_type, aggr_type)
+            ))
+            merged = rows.merge(prior, how="left", on=["company_ticker", "prior_period_end"], suffixes=("", suffix))
+
+            columns = [
+                merged[name] if name in merged.columns else pd.Series(np.nan, index=merged.index)
+                for name in ratio_def["required_metrics"].values()
+            ]
+            try:
+                values = pd.Series(ratio_def["function"](*columns), index=merged.index, dtype="float64")
+            except Exception:
+                values = _apply_rowwise(ratio_def["function"], columns)
+
+            results.append(pd.DataFrame({
+                "company_ticker": merged["company_ticker"],
+                "period_start": merged["period_start"],
+                "period_end": merged["period_end"].dt.strftime("%Y-%m-%d"),
+                "period_type": merged["period_type"],
+                "aggr_type": merged["aggr_type"],
+                "ratio_name_eng": ratio_key,
+                "ratio_name_ro": ratio_def["ratio_name_ro"],
+                "measure_unit": ratio_def["measure_unit"],
+                "value": values.astype(object).where(values.notna(), None),
+                "category": ratio_def["category"],
+                "formula": ratio_def["formula"],
+                "calculated_at": calculated_at,
+            }))
+
+    if not results:
+        return pd.DataFrame()
+    return pd.concat(results, ignore_index=True)
+
+
+def store_ratios(conn, results):
+    """
+    Upserts the rows produced by compute_ratios with a single executemany on the caller's connection.
+    """
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS financial_ratios (
             company_ticker TEXT,
             period_start DATE,
@@ -502,44 +492,85 @@ def calculate_and_store_ratio(DB_PATH, ticker, ratio_key, period_type, aggr_type
             category TEXT,
             formula TEXT,
             calculated_at TEXT,
+            fiscal_year INTEGER,
+            fiscal_quarter INTEGER,
+            period_months INTEGER,
+            display_period TEXT,
             PRIMARY KEY (company_ticker, period_end, period_type, aggr_type, ratio_name_eng)
         )
     """)
+    if results.empty:
+        return 0
+
+    columns = [
+        "company_ticker", "period_start", "period_end", "period_type", "aggr_type",
+        "ratio_name_eng", "ratio_name_ro", "measure_unit", "value", "category", "formula", "calculated_at"
+    ] + PERIOD_COLUMNS
+    results = results.assign(**period_columns(results))
+    conn.executemany(f"""
+        INSERT OR REPLACE INTO financial_ratios ({', '.join(columns)})
+        VALUES ({', '.join('?' for _ in columns)})
+    """, results[columns].itertuples(index=False, name=None))
+    return len(results)
+
+
+def run_ratio_engine(DB_PATH, tickers=None, ratio_keys=None, scopes=None, period_ends=None):
+    """
+    Recomputes `ratio_keys` (all ratios when None) for `tickers` (every ticker when None) and
+    `scopes` (all of RATIO_SCOPES when None): one read, column-wise computation, one write transaction.
 
-    insert_query = """
-        INSERT OR REPLACE INTO financial_ratios (
-            company_ticker, period_start, period_end, period_type, aggr_type,
-            ratio_name_eng, ratio_name_ro, measure_unit, value, category, formula, calculated_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    `period_ends` — optional set of (ticker, "YYYY-MM-DD") pairs. Only those periods are rewritten
+    (their old rows are removed first, so a period that lost its inputs also loses its ratios);
+    all periods of the ticker are still loaded so prior-period values resolve.
     """
+    with read_connection(DB_PATH) as conn:
+        inputs = load_ratio_inputs(conn, tickers, ratio_keys)
+    print(f"📊 Loaded {len(inputs)} metric values for {inputs['company_ticker'].nunique()} ticker(s)")
+
+    results = compute_ratios(inputs, ratio_keys, scopes)
+    if period_ends is not None and not results.empty:
+        keys = pd.Series(list(zip(results["company_ticker"], results["period_end"])), index=results.index)
+        results = results[keys.isin(period_ends)]
+
+    with write_connection(DB_PATH) as conn:
+        if period_ends is not None:
+            ratio_filter = ",".join("?" for _ in (ratio_keys or RATIO_DEFINITIONS))
+            conn.executemany(f"""
+                DELETE FROM financial_ratios
+                WHERE company_ticker = ? AND period_end = ? AND ratio_name_eng IN ({ratio_filter})
+            """, [(ticker, period_end, *(ratio_keys or RATIO_DEFINITIONS)) for ticker, period_end in sorted(period_ends)])
+        stored = store_ratios(conn, results)
+        changed_tickers = set(results.get("company_ticker", ())) | {ticker for ticker, _ in period_ends or ()}
+        refresh_chart_series(conn, changed_tickers)
+        bump_data_version(conn, changed_tickers)
+
+    print(f"✅ Stored {stored} ratio values in financial_ratios")
+    return stored
 
-    for r in results:
-        cursor.execute(insert_query, (
-            r["company_ticker"], 
-            r["period_start"] if isinstance(r["period_start"], str) else r["period_start"].strftime("%Y-%m-%d"),  
-            r["period_end"] if isinstance(r["period_end"], str) else r["period_end"].strftime("%Y-%m-%d"), 
-            r["period_type"], r["aggr_type"],   
-            r["ratio_name_eng"], r["ratio_name_ro"], r["measure_unit"], r["value"], r["category"],
-            r["formula"], r["calculated_at"]
-        ))
 
-    conn.commit()
-    conn.close()
+def calculate_and_store_ratio(DB_PATH, ticker, ratio_key, period_type, aggr_type):
+    stored = run_ratio_engine(DB_PATH, [ticker], [ratio_key], [(period_type, aggr_type)])
+    return f"{stored} rows inserted/updated for ratio '{ratio_key}' and ticker '{ticker}'"
+
 
-    return f"{len(results)} rows inserted/updated for ratio '{ratio_key}' and ticker '{ticker}'"
+tickers = ["AQ"]
+
+def run_industry_stats(DB_PATH):
+    """
+    Batch stage after the ratio engine: recomputes the industry statistics and percentiles (industry_stats.py)
+    in one write transaction and bumps the data version of the companies whose peer figures moved.
+    """
+    with write_connection(DB_PATH) as conn:
+        tickers = refresh_industry_stats(conn)
+        bump_data_version(conn, tickers)
+    return len(tickers)
 
-tickers = ["AQ"] 
 
-def run_all_ratios(DB_PATH, tickers):
-    ratios = list(RATIO_DEFINITIONS.keys())
-    period_types = ["annual", "quarter"]
-    aggr_types = ["cml", "qtl"]
+def run_all_ratios(DB_PATH, tickers=None):
+    stored = run_ratio_engine(DB_PATH, tickers)
+    run_industry_stats(DB_PATH)
+    return stored
 
-    for ticker in tickers:
-        for ratio in ratios:
-            for period_type in period_types:
-                for aggr_type in aggr_types:
-                    print(f"\n🔄 {ticker} | {ratio} | {period_type} | {aggr_type}")
-                    calculate_and_store_ratio(DB_PATH, ticker, ratio, period_type, aggr_type)
 
-run_all_ratios(DB_PATH, tickers)
\ No newline at end of file
+if __name__ == "__main__":
+    run_all_ratios(DB_PATH, tickers)
@@ -1,21 +1,18 @@
-from flask import Blueprint, render_template, request, redirect, url_for, jsonify
-from .data_handler import (get_stock_overview, get_historical_stock_data, get_financial_statement, get_company_details_from_db,
-                           get_grouped_financial_ratios, 
-                           get_revenue_data, get_segment_revenue_notes, get_profit_and_margin_data, get_revenue_qtl_and_change_data, 
-                           get_operating_profit_qtl_and_margin_data, get_net_profit_qtl_and_margin_data, get_chart_comment, 
-                           get_revenue_annual_and_change_data, get_dividends, get_dividends_dps_and_growth, get_dividend_yield_history,
-                           get_payout_ratio_history, get_dividends_to_fcfe_history, get_calendar_events, get_operating_profit_annual_and_margin_data,
-                           get_net_profit_annual_and_margin_data)
+from flask import Blueprint, Response, render_template, request, redirect, stream_with_context, url_for, jsonify
+from .data_handler import (get_stock_overview, get_historical_stock_data, get_financial_statement, get_bulk_financial_statements, get_company_details_from_db,
+                           get_grouped_financial_ratios, get_industry_stats,
+                           get_revenue_data, get_segment_revenue_notes, get_profit_and_margin_data, get_chart_series_json, get_chart_comment,
+                           get_dividends, get_dividends_dps_and_growth, get_dividend_yield_history,
+                           get_payout_ratio_history, get_dividends_to_fcfe_history, get_calendar_events, get_analysis_page_data)
+from .cache import cached_json_response
+from .fast_json import dumps as dumps_json, json_response
+from .screener import ScreenerError, run_screen
+from .db import read_connection
 import json
-import sqlite3
-import os
 import logging
 
 main = Blueprint('main', __name__)
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Path to app/ directory
-DATA_DIR = os.path.join(BASE_DIR, "data")  # Path to data/
-DB_PATH = os.path.join(DATA_DIR, "financials.db") 
 # List of tickers
 tickers = ["AQ", "WINE"]
 
@@ -23,7 +20,7 @@ tickers = ["AQ", "WINE"]
 def home():
     companies = []  # Fetch all companies for the dropdown
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with read_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT company_ticker, company_name FROM companies")
             companies = cursor.fetchall()
@@ -47,29 +44,19 @@ def analyze():
 # Analysis page with financials selection
 @main.route('/analysis/<ticker>', methods=['GET'])
 def analysis(ticker):
-    stock_info = get_stock_overview(ticker)
-    historical_data = get_historical_stock_data(ticker)
-    revenue_data = get_revenue_qtl_and_change_data(ticker)
-    latest_quarter = revenue_data["periods"][-1] if revenue_data and revenue_data["periods"] else "N/A"
-    comment_revenue_growth = get_chart_comment(ticker, "revenue_qtl_and_change_data", latest_quarter)
-    comment_operating_profit=get_chart_comment(ticker, "operating_profit_qtl_and_margin_data", latest_quarter)
-    comment_net_profit=get_chart_comment(ticker, "net_profit_qtl_and_margin_data", latest_quarter)
-
     # Get period type and aggregation type from request (default: annual cumulative)
     period_type = request.args.get('period_type', 'annual')
     aggr_type = request.args.get('aggr_type', 'cml')
     print(f"➡️ Requested period_type: {period_type}, aggr_type: {aggr_type}")
-    pl_statement = get_financial_statement(ticker, "Profit&Loss", period_type, aggr_type)
-    bs_statement = get_financial_statement(ticker, "Balance Sheet", period_type, aggr_type)
-    cf_statement = get_financial_statement(ticker, "Cash Flow", period_type, aggr_type)
-    grouped_ratios = get_grouped_financial_ratios(ticker, period_type, aggr_type)
-    print("✅ Ratios statement sent to template:")
-    print(json.dumps(grouped_ratios, indent=2, ensure_ascii=False))
+
+    # Everything for the page comes from one connection
+    page = get_analysis_page_data(ticker, period_type, aggr_type)
+    stock_info = page["stock_info"]
     if "error" in stock_info:
         return f"<h1>{stock_info['error']}</h1>", 404
 
     business_description = stock_info.get("longBusinessSummary", "Descrierea companiei nu este disponibilă.")
-    dividends=get_dividends(ticker)
+    dividends = page["dividends"]
     last=dividends[0] if dividends else {}
     previous = dividends[1] if len(dividends) > 1 else {}
 
@@ -77,17 +64,13 @@ def analysis(ticker):
         "stock_analysis.html",
         ticker=ticker,
         business_description=business_description,
-        historical_data=historical_data,
-        pl_statement=pl_statement,
-        bs_statement=bs_statement,
-        cf_statement=cf_statement,
-        grouped_ratios=grouped_ratios,
+        historical_data=page["historical_data"],
+        grouped_ratios=page["grouped_ratios"],
         selected_period_type=period_type,
         selected_aggr_type=aggr_type,
-        latest_quarter=latest_quarter,
-        comment_revenue_growth=comment_revenue_growth,
-        comment_operating_profit=comment_operating_profit,
-        comment_net_profit=comment_net_profit,
+        latest_quarter=page["latest_quarter"],
+        **page["statements"],
+        **page["chart_comments"],
         #get_dividends
         DPS_yoy_change=last.get("dividends_yoy_change"),
         dividend_status=last.get("dividend_status", "").strip().lower(),
@@ -105,6 +88,7 @@ def analysis(ticker):
     )
 
 @main.route('/historical_data/<ticker>/<period>')
+@cached_json_response
 def historical_data(ticker, period):
     data=get_historical_stock_data(ticker, period)
     if not data:
@@ -113,38 +97,84 @@ def historical_data(ticker, period):
     return jsonify(data)
 
 # API endpoint to get financials dynamically
-@main.route('/pl_data/<ticker>/<period_type>/<aggr_type>', methods=['GET'])
-def get_pl_data(ticker, period_type, aggr_type):
+# ?format=columnar returns {metric_ids, metric_names, periods, values} instead of the list of rows
+def _statement_response(ticker, statement_name, period_type, aggr_type):
     try:
-        data=get_financial_statement(ticker, "Profit&Loss", period_type, aggr_type)
+        if request.args.get("format") == "columnar":
+            data = get_financial_statement(ticker, statement_name, period_type, aggr_type, columnar=True)
+            return json_response(data)
+        data = get_financial_statement(ticker, statement_name, period_type, aggr_type)
         return jsonify(data)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@main.route('/pl_data/<ticker>/<period_type>/<aggr_type>', methods=['GET'])
+@cached_json_response
+def get_pl_data(ticker, period_type, aggr_type):
+    return _statement_response(ticker, "Profit&Loss", period_type, aggr_type)
+
 @main.route('/bs_data/<ticker>/<period_type>/<aggr_type>', methods=['GET'])
+@cached_json_response
 def get_bs_data(ticker, period_type, aggr_type):
-    try:
-        data=get_financial_statement(ticker, "Balance Sheet", period_type, aggr_type)
-        return jsonify(data)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    return _statement_response(ticker, "Balance Sheet", period_type, aggr_type)
 
 @main.route('/cf_data/<ticker>/<period_type>/<aggr_type>', methods=['GET'])
+@cached_json_response
 def get_cf_data(ticker, period_type, aggr_type):
-    try:
-        data=get_financial_statement(ticker, "Cash Flow", period_type, aggr_type)
-        return jsonify(data)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    return _statement_response(ticker, "Cash Flow", period_type, aggr_type)
+
+# Statement codes accepted by /statements_data, as in the per-statement endpoints above
+STATEMENT_CODES = {"pl": "Profit&Loss", "bs": "Balance Sheet", "cf": "Cash Flow"}
+MAX_BULK_TICKERS = 100
+
+@main.route('/statements_data/<period_type>/<aggr_type>', methods=['GET'])
+def statements_data(period_type, aggr_type):
+    """
+    Several statements of several tickers in one call, e.g.
+    /statements_data/annual/cml?tickers=AQ,WINE&statements=pl,bs[&format=columnar]
+    Streams NDJSON: one {"ticker": ..., "statements": {statement_name: rows}} line per ticker, in request order.
+    """
+    tickers = list(dict.fromkeys(t.strip().upper() for t in request.args.get("tickers", "").split(",") if t.strip()))
+    codes = [c.strip().lower() for c in request.args.get("statements", "pl,bs,cf").split(",") if c.strip()]
+
+    if not tickers or len(tickers) > MAX_BULK_TICKERS:
+        return jsonify({"error": f"Pass between 1 and {MAX_BULK_TICKERS} comma-separated tickers"}), 400
+    unknown = [c for c in codes if c not in STATEMENT_CODES]
+    if not codes or unknown:
+        return jsonify({"error": f"Unknown statement code(s): {', '.join(unknown)} (use pl, bs, cf)"}), 400
+
+    statements = get_bulk_financial_statements(
+        tickers, [STATEMENT_CODES[c] for c in dict.fromkeys(codes)], period_type, aggr_type,
+        columnar=request.args.get("format") == "columnar",
+    )
+    if statements is None:
+        return jsonify({"error": "Database error"}), 500
+
+    def generate():
+        for ticker, data in statements:
+            yield dumps_json({"ticker": ticker, "statements": data}) + b"\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
 
 
 @main.route("/ratios_data/<ticker>/<period_type>/<aggr_type>")
+@cached_json_response
 def ratios_data(ticker, period_type, aggr_type):
     data = get_grouped_financial_ratios(ticker, period_type, aggr_type)
     
     return jsonify(data)
 
+# Precomputed peer statistics of the company's industry, with its percentile (see industry_stats.py)
+@main.route("/industry_stats/<ticker>/<period_type>/<aggr_type>")
+@cached_json_response
+def industry_stats_data(ticker, period_type, aggr_type):
+    data = get_industry_stats(ticker, period_type, aggr_type)
+    if not data:
+        return jsonify({"error": "No industry statistics available"}), 404
+    return jsonify(data)
+
 @main.route('/revenue_data/<ticker>')
+@cached_json_response
 def revenue_data(ticker):
     data = get_revenue_data(ticker)
     if not data:
@@ -152,61 +182,71 @@ def revenue_data(ticker):
     return jsonify(data)
 
 @main.route("/segment_revenue_data/<ticker>")
+@cached_json_response
 def segment_revenue_data(ticker):
     data = get_segment_revenue_notes(ticker)
     return jsonify(data)
 
 @main.route("/profit_and_margin_data/<ticker>")
+@cached_json_response
 def profit_and_margin_data(ticker):
     data=get_profit_and_margin_data(ticker)
     return jsonify(data)
 
+# Fundamentals charts: stored pre-serialized in chart_series, served as-is
+def _chart_series_response(ticker, chart_type, period_type):
+    return Response(get_chart_series_json(ticker, chart_type, period_type) + "\n", mimetype="application/json")
+
 @main.route("/revenue_qtl_and_change_data/<ticker>")
+@cached_json_response
 def revenue_qtl_and_change_data(ticker):
-    data = get_revenue_qtl_and_change_data(ticker)
-    return jsonify(data)
+    return _chart_series_response(ticker, "revenue", "qtl")
 
 @main.route("/operating_profit_qtl_and_margin_data/<ticker>")
+@cached_json_response
 def operating_profit_qtl_and_margin_data(ticker):
-    data=get_operating_profit_qtl_and_margin_data(ticker)
-    return jsonify(data)
+    return _chart_series_response(ticker, "operating_profit", "qtl")
 
 @main.route("/net_profit_qtl_and_margin_data/<ticker>")
+@cached_json_response
 def net_profit_qtl_and_margin_data(ticker):
-    data=get_net_profit_qtl_and_margin_data(ticker)
-    return jsonify(data)
+    return _chart_series_response(ticker, "net_profit", "qtl")
 
 @main.route("/revenue_annual_and_change_data/<ticker>")
+@cached_json_response
 def revenue_annual_and_change_data(ticker):
-    data = get_revenue_annual_and_change_data(ticker)
-    return jsonify(data)
+    return _chart_series_response(ticker, "revenue", "annual")
 
 @main.route("/operating_profit_annual_and_margin_data/<ticker>")
+@cached_json_response
 def operating_profit_annual_and_margin_data(ticker):
-    data = get_operating_profit_annual_and_margin_data(ticker)
-    return jsonify(data)
+    return _chart_series_response(ticker, "operating_profit", "annual")
 
 @main.route("/net_profit_annual_and_margin_data/<ticker>")
+@cached_json_response
 def net_profit_annual_and_margin_data(ticker):
-    data = get_net_profit_annual_and_margin_data(ticker)
-    return jsonify(data)
+    return _chart_series_response(ticker, "net_profit", "annual")
 
 @main.route("/dividends/dps_and_growth/<ticker>")
+@cached_json_response
 def dividends_dps_and_growth(ticker):
     data = get_dividends_dps_and_growth(ticker)
     return jsonify(data)
 
 @main.route("/dividends/yield_history/<ticker>")
+@cached_json_response
 def dividend_yield_history(ticker):
     data = get_dividend_yield_history(ticker)
     return jsonify(data)
 
 @main.route("/dividends/payout_ratio/<ticker>")
+@cached_json_response
 def payout_ratio_history(ticker):
     data = get_payout_ratio_history(ticker)
     return jsonify(data)
 
 @main.route("/dividends/dividends_to_fcfe/<ticker>")
+@cached_json_response
 def dividends_to_fcfe_history(ticker):
     data = get_dividends_to_fcfe_history(ticker)
     return jsonify(data)
@@ -221,3 +261,23 @@ def calendar_page():
 def calendar_events():
     events = get_calendar_events()
     return jsonify(events)
+
+
+@main.route("/screener_data")
+def screener_data():
+    """
+    Companies matching a ratio / derived-metric screen, e.g.
+    /screener_data?q=ROE > 15 and [Net debt] / EBITDA < 2&scope=annual&period=latest&sort=ROE&order=desc&limit=50
+    """
+    try:
+        data = run_screen(
+            request.args.get("q", ""),
+            scope=request.args.get("scope", "annual"),
+            period=request.args.get("period", "latest"),
+            sort=request.args.get("sort") or None,
+            descending=request.args.get("order", "desc") != "asc",
+            limit=request.args.get("limit", 50, type=int),
+        )
+    except ScreenerError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(data)
@@ -0,0 +1,284 @@
+# screener.py
+# -----------
+# Filters and ranks the whole company universe on ratio and derived-metric conditions, e.g.
+#
+#   ROE > 15 and [Net debt] / EBITDA < 2          (latest FY of every company)
+#
+# ✅ financial_ratios and derived_metrics are loaded once into a columnar snapshot per scope:
+#    one float array of shape (field, ticker, period), NaN where a value is missing
+# ✅ the snapshot reloads when the data versions change (data_versions.py), so it never serves stale data
+# ✅ a query is parsed once into a small expression tree and evaluated on whole ticker arrays with NumPy,
+#    instead of one SQL query per company
+#
+# Expression syntax: Python-style comparisons (> >= < <= == !=, chained too), arithmetic (+ - * /),
+# and / or / not, parentheses. Field names are ratio_name_eng / metric_name_eng values, case-insensitive;
+# names that are not plain identifiers go in square brackets: [Net profit margin], [Debt/Assets].
+# Only companies with data in the screened period are considered; a comparison on a missing value is false.
+#
+# Usage:
+#   from screener import run_screen
+#   run_screen("ROE > 15 and [Net debt] / EBITDA < 2", scope="annual", period="latest", sort="ROE")
+
+import ast
+import re
+import threading
+from functools import lru_cache, reduce
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .data_versions import get_universe_data_version
+    from .db import get_read_connection
+except ImportError:
+    from data_versions import get_universe_data_version
+    from db import get_read_connection
+
+# scope: WHERE clause on the stored period columns (display_periods.py)
+SCOPES = {
+    "annual": "period_type = 'annual' AND period_months = 12 AND fiscal_quarter = 4",
+    "quarter": "period_type = 'quarter' AND period_months = 3 AND fiscal_quarter IS NOT NULL",
+}
+MAX_RESULTS = 500
+
+
+class ScreenerError(ValueError):
+    """An invalid screen: bad expression, unknown field, scope or period."""
+
+
+# ------------------------------
+# Columnar snapshot
+# ------------------------------
+class ScreenerSnapshot:
+    """
+    Every ratio and derived metric of one scope as a (field, ticker, period) float array.
+    `has_value[t, p]` tells whether ticker t has any value in period p, `latest[t]` is the index of its
+    latest such period (-1 when none).
+    """
+
+    def __init__(self, scope, fields, tickers, company_names, period_ends, period_labels, values):
+        self.scope = scope
+        self.fields = fields
+        self.tickers = tickers
+        self.company_names = company_names
+        self.period_ends = period_ends
+        self.period_labels = period_labels
+        self.values = values
+        self.field_index = {name.lower(): i for i, name in enumerate(fields)}
+
+        self.has_value = ~np.isnan(values).all(axis=0)  # (ticker, period)
+        if self.has_value.shape[1] == 0:
+            self.latest = np.full(len(tickers), -1)
+        else:
+            last = self.has_value.shape[1] - 1 - np.argmax(self.has_value[:, ::-1], axis=1)
+            self.latest = np.where(self.has_value.any(axis=1), last, -1)
+
+    def field(self, name):
+        try:
+            return self.field_index[name.strip().lower()]
+        except KeyError:
+            raise ScreenerError(f"Unknown field: {name!r}") from None
+
+    def period_index(self, period):
+        """Column of `period`, given as a label ('FY/24', '2Q/24') or a period_end ('2024-12-31')."""
+        for candidates in (self.period_labels, self.period_ends):
+            matches = np.flatnonzero(candidates == period)
+            if len(matches):
+                return int(matches[0])
+        raise ScreenerError(f"Unknown period for scope {self.scope!r}: {period!r}")
+
+
+def load_snapshot(conn, scope):
+    """
+    Reads every ratio and derived metric of `scope` for every company into a ScreenerSnapshot.
+    """
+    where = SCOPES[scope]
+    df = pd.read_sql_query(f"""
+        SELECT company_ticker, ratio_name_eng AS field, period_end, display_period, value, aggr_type
+        FROM financial_ratios WHERE {where}
+        UNION ALL
+        SELECT company_ticker, metric_name_eng AS field, period_end, display_period, value, aggr_type
+        FROM derived_metrics WHERE {where}
+    """, conn)
+    companies = pd.read_sql_query("SELECT company_ticker, company_name FROM companies", conn)
+
+    # The first quarter only exists as a cumulative row; any other quarter prefers its quarterly row
+    df = df.sort_values("aggr_type", ascending=False).drop_duplicates(["company_ticker", "field", "period_end"])
+
+    tickers = np.array(sorted(set(companies["company_ticker"]) | set(df["company_ticker"])), dtype=object)
+    names = companies.set_index("company_ticker")["company_name"].reindex(tickers)
+    names = names.astype(object).where(names.notna(), None).to_numpy()
+    fields = sorted(df["field"].unique())
+    periods = df.drop_duplicates("period_end").sort_values("period_end")
+
+    values = np.full((len(fields), len(tickers), len(periods)), np.nan)
+    f = pd.Index(fields).get_indexer(df["field"])
+    t = pd.Index(tickers).get_indexer(df["company_ticker"])
+    p = pd.Index(periods["period_end"]).get_indexer(df["period_end"])
+    values[f, t, p] = df["value"].astype(float).to_numpy()
+
+    return ScreenerSnapshot(
+        scope, fields, tickers, names,
+        periods["period_end"].to_numpy(dtype=object), periods["display_period"].to_numpy(dtype=object), values,
+    )
+
+
+_snapshots = {}  # scope: (data version, ScreenerSnapshot)
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot(scope, conn=None):
+    """
+    The snapshot of `scope`, reloaded first if any data version changed since it was built.
+    """
+    if scope not in SCOPES:
+        raise ScreenerError(f"Unknown scope: {scope!r} (use {', '.join(SCOPES)})")
+
+    conn = conn if conn is not None else get_read_connection()
+    version = get_universe_data_version(conn)
+    cached = _snapshots.get(scope)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with _snapshot_lock:
+        cached = _snapshots.get(scope)
+        if cached is None or cached[0] != version:
+            print(f"🔄 Loading screener snapshot ({scope}, data version {version})")
+            cached = (version, load_snapshot(conn, scope))
+            _snapshots[scope] = cached
+    return cached[1]
+
+
+# ------------------------------
+# Expressions
+# ------------------------------
+_BRACKETED = re.compile(r"\[([^\]]+)\]")
+_KEYWORDS = re.compile(r"\b(AND|OR|NOT)\b")
+_COMPARISONS = {
+    ast.Gt: np.greater, ast.GtE: np.greater_equal, ast.Lt: np.less, ast.LtE: np.less_equal,
+    ast.Eq: np.equal, ast.NotEq: np.not_equal,
+}
+_ARITHMETIC = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide}
+
+
+@lru_cache(maxsize=256)
+def parse_expression(text):
+    """
+    Parses a screen expression. Returns (tree, {identifier: field name}); bracketed names are replaced
+    by generated identifiers before parsing.
+    """
+    names = {}
+
+    def placeholder(match):
+        key = f"_field{len(names)}"
+        names[key] = match.group(1)
+        return key
+
+    source = _KEYWORDS.sub(lambda m: m.group(1).lower(), _BRACKETED.sub(placeholder, text))
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ScreenerError(f"Invalid expression: {text!r}") from e
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            names.setdefault(node.id, node.id)
+        elif isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise ScreenerError(f"Only numbers are allowed as constants: {node.value!r}")
+        elif not isinstance(node, (
+            ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+            ast.BinOp, ast.Compare, ast.Load, *_COMPARISONS, *_ARITHMETIC,
+        )):
+            raise ScreenerError(f"Unsupported syntax in expression: {type(node).__name__}")
+    return tree, names
+
+
+def _evaluate(node, columns):
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body, columns)
+    if isinstance(node, ast.Name):
+        return columns[node.id]
+    if isinstance(node, ast.Constant):
+        return float(node.value)
+    if isinstance(node, ast.BinOp):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return _ARITHMETIC[type(node.op)](_evaluate(node.left, columns), _evaluate(node.right, columns))
+    if isinstance(node, ast.UnaryOp):
+        operand = _evaluate(node.operand, columns)
+        if isinstance(node.op, ast.Not):
+            return ~_mask(operand)
+        return -operand if isinstance(node.op, ast.USub) else operand
+    if isinstance(node, ast.Compare):
+        result, left = True, _evaluate(node.left, columns)
+        for op, comparator in zip(node.ops, node.comparators):
+            right = _evaluate(comparator, columns)
+            result = result & _COMPARISONS[type(op)](left, right)
+            left = right
+        return result
+    if isinstance(node, ast.BoolOp):
+        masks = [_mask(_evaluate(value, columns)) for value in node.values]
+        return reduce(np.logical_and if isinstance(node.op, ast.And) else np.logical_or, masks)
+    raise ScreenerError(f"Unsupported syntax in expression: {type(node).__name__}")
+
+
+def _mask(value):
+    if np.asarray(value).dtype != bool:
+        raise ScreenerError("and / or / not only combine comparisons (e.g. ROE > 15)")
+    return value
+
+
+# ------------------------------
+# Screen
+# ------------------------------
+def run_screen(expression, scope="annual", period="latest", sort=None, descending=True, limit=50, conn=None):
+    """
+    Returns the companies matching `expression` in `period` ("latest": each company's latest period with data,
+    or a label / period_end shared by all; companies without data in it never match), ranked by the `sort` expression (missing values last).
+    Result: {"scope", "period", "count", "results": [{"ticker", "company_name", "period", "values"}]},
+    where "values" holds every field the expression and the sort use.
+    """
+    snapshot = get_snapshot(scope, conn)
+    tree, names = parse_expression(expression)
+    sort_tree, sort_names = parse_expression(sort) if sort else (None, {})
+
+    n = len(snapshot.tickers)
+    if period == "latest":
+        valid = snapshot.latest >= 0
+        column = np.where(valid, snapshot.latest, 0)
+    else:
+        column = np.full(n, snapshot.period_index(period))
+        valid = snapshot.has_value[np.arange(n), column]
+
+    tickers = np.arange(n)
+
+    def columns_of(field_names):
+        """{identifier: value of the field for every ticker in its screened period}"""
+        return {
+            key: np.where(valid, snapshot.values[snapshot.field(name), tickers, column], np.nan)
+            for key, name in field_names.items()
+        }
+
+    matched = np.asarray(_evaluate(tree, columns_of(names)))
+    if matched.shape != (n,) or matched.dtype != bool:
+        raise ScreenerError("The expression must compare at least one field (e.g. ROE > 15)")
+    matched &= valid
+
+    order = np.flatnonzero(matched)
+    if sort_tree is not None:
+        keys = np.broadcast_to(np.asarray(_evaluate(sort_tree, columns_of(sort_names)), dtype=float), (n,))[order]
+        ranked = np.argsort(np.where(np.isnan(keys), np.inf, -keys if descending else keys), kind="stable")
+        order = order[ranked]
+    order = order[:max(0, min(limit, MAX_RESULTS))]
+
+    shown = sorted({snapshot.field(name) for name in [*names.values(), *sort_names.values()]})
+    results = []
+    for t in order:
+        values = snapshot.values[shown, t, column[t]]
+        results.append({
+            "ticker": snapshot.tickers[t],
+            "company_name": snapshot.company_names[t],
+            "period": snapshot.period_labels[column[t]],
+            "values": {snapshot.fields[f]: None if np.isnan(v) else float(v) for f, v in zip(shown, values)},
+        })
+    return {"scope": scope, "period": period, "count": int(matched.sum()), "results": results}
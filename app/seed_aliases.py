@@ -10,12 +10,8 @@
 #
 # ➕ You can store a README/USAGE guide alongside this file (see `alias_guide.md`).
 
-import sqlite3
-import os
-
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Path to app/ directory
-DATA_DIR = os.path.join(BASE_DIR, "data")  # Path to data/
-DB_PATH = os.path.join(DATA_DIR, "financials.db")  # Full path to database
+from data_versions import bump_data_version
+from db import DB_PATH, write_connection
 
 # ✅ Manually curated dictionary of standardized metrics and their known aliases, per language
 METRIC_ALIASES = {
@@ -56,42 +52,43 @@ def seed_metric_aliases(DB_PATH):
     1. Manual alias mappings from METRIC_ALIASES
     2. Automatically extracted aliases from financial_metrics table
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    with write_connection(DB_PATH) as conn:
+        cursor = conn.cursor()
+
+        # Step 1: Create the alias table if it doesn't exist
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS metric_aliases (
+                alias TEXT PRIMARY KEY,
+                standardized_metric TEXT NOT NULL,
+                language TEXT DEFAULT NULL,
+                country TEXT DEFAULT NULL,
+                source TEXT DEFAULT NULL
+            )
+        """)
 
-    # Step 1: Create the alias table if it doesn't exist
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS metric_aliases (
-            alias TEXT PRIMARY KEY,
-            standardized_metric TEXT NOT NULL,
-            language TEXT DEFAULT NULL,
-            country TEXT DEFAULT NULL,
-            source TEXT DEFAULT NULL
-        )
-    """)
+        # Step 2: Seed manual aliases (by language)
+        for std_name, lang_dict in METRIC_ALIASES.items():
+            for lang, aliases in lang_dict.items():
+                for alias in aliases:
+                    cursor.execute(
+                        "INSERT OR REPLACE INTO metric_aliases (alias, standardized_metric, language, country, source) VALUES (?, ?, ?, ?, ?)",
+                        (alias, std_name, lang, "Romania", "manual")
+                    )
 
-    # Step 2: Seed manual aliases (by language)
-    for std_name, lang_dict in METRIC_ALIASES.items():
-        for lang, aliases in lang_dict.items():
-            for alias in aliases:
-                cursor.execute(
-                    "INSERT OR REPLACE INTO metric_aliases (alias, standardized_metric, language, country, source) VALUES (?, ?, ?, ?, ?)",
-                    (alias, std_name, lang, "Romania", "manual")
-                )
+        # Step 3: Auto-generate from financial_metrics (with country)
+        for lang, col in [("en", "metric_name_eng"), ("ro", "metric_name_ro")]:
+            cursor.execute(f"""
+                INSERT OR REPLACE INTO metric_aliases (alias, standardized_metric, language, country, source)
+                SELECT DISTINCT {col}, generalized_metric_eng, ?, 'Romania', 'auto_generated'
+                FROM financial_metrics
+                WHERE {col} IS NOT NULL
+                  AND generalized_metric_eng IS NOT NULL
+                  AND {col} != generalized_metric_eng
+            """, (lang,))
 
-    # Step 3: Auto-generate from financial_metrics (with country)
-    for lang, col in [("en", "metric_name_eng"), ("ro", "metric_name_ro")]:
-        cursor.execute(f"""
-            INSERT OR REPLACE INTO metric_aliases (alias, standardized_metric, language, country, source)
-            SELECT DISTINCT {col}, generalized_metric_eng, ?, 'Romania', 'auto_generated'
-            FROM financial_metrics
-            WHERE {col} IS NOT NULL
-              AND generalized_metric_eng IS NOT NULL
-              AND {col} != generalized_metric_eng
-        """, (lang,))
+        # Aliases change which rows every company's charts pick up
+        bump_data_version(conn)
 
-    conn.commit()
-    conn.close()
     print("✅ metric_aliases table seeded (manual + auto).")
 
 
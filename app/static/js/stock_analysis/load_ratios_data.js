@@ -1,18 +1,43 @@
 // --- Load and Render Ratios Accordion ---
 
+// Below this many companies an industry percentile says nothing, so it is not shown
+const MIN_INDUSTRY_PEERS = 3;
+
 window.loadRatiosData = function (periodType, aggrType) {
     const ticker = STOCK_TICKER;
 
     const url = `/ratios_data/${ticker}/${periodType}/${aggrType}`;
+    const industryUrl = `/industry_stats/${ticker}/${periodType}/${aggrType}`;
     console.log("📡 Fetching ratios from:", url);
 
-    fetch(url)
-        .then(response => response.json())
-        .then(data => updateRatiosTable(data))
+    // The industry statistics are precomputed; a company without them just gets no percentile column
+    const industryStats = fetch(industryUrl)
+        .then(response => response.ok ? response.json() : null)
+        .catch(() => null);
+
+    Promise.all([fetch(url).then(response => response.json()), industryStats])
+        .then(([data, industry]) => updateRatiosTable(data, industry))
         .catch(error => console.error("❌ Error loading ratios", error));
 };
 
-function updateRatiosTable(data) {
+// "P72 din 5" for the latest period of the row that has industry statistics, with the peer quartiles as tooltip
+function industryPercentileCell(industry, row, sortedPeriods) {
+    const stats = industry && industry.ratios ? industry.ratios[row.metric_name] : null;
+    if (!stats) return `<td class="text-end">n.a.</td>`;
+
+    for (let i = sortedPeriods.length - 1; i >= 0; i--) {
+        const period = stats[sortedPeriods[i]];
+        if (!period || !(sortedPeriods[i] in row.values)) continue;
+        if (period.percentile === null || period.companies < MIN_INDUSTRY_PEERS) break;
+
+        const title = `${industry.industry}, ${sortedPeriods[i]}: mediana ${period.median.toFixed(2)}%, ` +
+                      `Q1 ${period.q1.toFixed(2)}%, Q3 ${period.q3.toFixed(2)}%`;
+        return `<td class="text-end" title="${title}">P${Math.round(period.percentile)} din ${period.companies}</td>`;
+    }
+    return `<td class="text-end">n.a.</td>`;
+}
+
+function updateRatiosTable(data, industry) {
     const container = document.getElementById("accordion-ratios");
     if (!container) {
         console.warn("⚠️ 'accordion-ratios' container not found");
@@ -44,6 +69,7 @@ function updateRatiosTable(data) {
         sortedPeriods.forEach(p => {
             thead += `<th class="text-end">${p}</th>`;
         });
+        if (industry) thead += `<th class="text-end">Percentilă în industrie</th>`;
         thead += `</tr></thead>`;
 
         // Build table body
@@ -54,6 +80,7 @@ function updateRatiosTable(data) {
                 const value = p in row.values ? `${(parseFloat(row.values[p])).toFixed(2)}%` : 'n.a.';
                 tbody += `<td class="text-end">${value}</td>`;
             });
+            if (industry) tbody += industryPercentileCell(industry, row, sortedPeriods);
             tbody += `</tr>`;
         });
         tbody += `</tbody>`;
@@ -1,19 +1,14 @@
-import os
-import sqlite3
-import yfinance as yf
 import pandas as pd
-from datetime import datetime, timedelta
-
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Path to app/ directory
-DATA_DIR = os.path.join(BASE_DIR, "data")              # Path to data/
-DB_PATH = os.path.join(DATA_DIR, "financials.db")      # Full path to database
+from db import read_connection, write_connection
+from data_versions import bump_data_version
+from latest_snapshot import refresh_latest_snapshot
 
 TICKERS = ["AQ", "WINE"]
 SHARES_BY_TICKER = {"AQ": 1200002400, "WINE":40426674}
 
 # Create/ensure table exists (run once)
 def initialize_stock_table():
-    with sqlite3.connect(DB_PATH) as conn:
+    with write_connection() as conn:
         conn.executescript("""
         CREATE TABLE IF NOT EXISTS stock_data (
             company_ticker TEXT,
@@ -31,280 +26,253 @@ def initialize_stock_table():
         )
         """)
 
-# Fetch & store price history
-# Uses yf.download to avoid hanging, with threads=False and progress=False
-# Adds a timeout via yfinance internal session settings
-
-def fetch_and_store_stock_data(ticker):
-    shares_outstanding = SHARES_BY_TICKER.get(ticker)
-    if not shares_outstanding:
-        print(f"❌ Number of shares not defined for {ticker}")
-        return
-
-    print(f"📥 Fetching full history for {ticker}...")
-    try:
-        # Module-level download with no threading & no progress bar
-        df = yf.download(
-            tickers=f"{ticker}.RO", 
-            period="max", 
-            interval="1d", 
-            progress=False, 
-            threads=False,
-            auto_adjust=True 
-        )
-    except Exception as e:
-        print(f"❌ Error fetching data for {ticker}: {e}")
-        return
-
-    if df.empty:
-        print(f"❌ No price history available for {ticker}")
-        return
-
-    # Prepare DataFrame
-    df = df.reset_index()
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns=df.columns.droplevel(0)
-    df["date"] = df["Date"].dt.strftime("%Y-%m-%d")
-    df["close_price"] = df["Close"].astype(float).round(4)
-    df["volume"] = df["Volume"].astype(int)
-    df["market_cap"] = (df["close_price"] * shares_outstanding).astype(float)
-    df["company_ticker"] = ticker
-    df["source"] = "yfinance"
-
-    # Select & add nullable columns
-    cols = ["company_ticker", "date", "close_price", "volume", "market_cap", "source"]
-    data = df[cols].copy()
-    for col in ["pe_ratio", "eps_ttm", "change_day", "change_yoy", "change_ytd"]:
-        data[col] = None
-
-    # Insert into DB
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        # Bulk insert using executemany
-        records = [tuple(row) for row in data.to_records(index=False)]
-        placeholders = ",".join(["?" for _ in range(len(data.columns))])
-        sql = f"""
-            INSERT OR REPLACE INTO stock_data ({','.join(data.columns)})
-            VALUES ({placeholders})
-        """
-        cursor.executemany(sql, records)
-        conn.commit()
-
-    print(f"✅ Stored {len(data)} rows for {ticker} into stock_data.")
-
-# 🔍 Get earnings release events
-def get_events(ticker):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT event_date, period_start, period_end
+# 🔍 Earnings release events, one row per (ticker, event_date)
+def load_earnings_events(conn, tickers):
+    placeholders = ",".join("?" for _ in tickers)
+    return pd.read_sql(f"""
+        SELECT company_ticker, event_date, period_end
         FROM company_events
-        WHERE company_ticker = ? AND event_type = 'earnings_release'
-        ORDER BY event_date
-    """, (ticker,))
-
-    rows = cursor.fetchall()
-    if not rows:
-        print(f"⚠️ No matching events found for ticker '{ticker}'.")
-        return []
-
-    print(f"📊 Retrieved {len(rows)} events for {ticker}:")  
-    for row in rows:
-        print(f"   ▶ Earnings release: {row[0]} for period {row[1]} to {row[2]}")
-
-    return [{"event_date": row[0], "period_start": row[1], "period_end": row[2]} for row in rows]
-
-# 🔍 Get net profit values
-def get_financials(ticker):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT period_start, period_end, value
-        FROM financial_data
-        WHERE company_ticker = ? AND metric_name_ro = 'Profitul atribuibil actionarilor Grupului'
-          AND aggr_type = 'cml'
-    """, (ticker,))
-    
-    rows = cursor.fetchall()
-    if not rows:
-        print(f"⚠️ No matching financial data found for ticker '{ticker}'.")
-        return {}
-
-    print(f"📈 Retrieved {len(rows)} financial entries for {ticker}:")
-    financials = {}
-    for row in rows:
-        start = pd.to_datetime(row[0]).strftime("%Y-%m-%d")
-        end = pd.to_datetime(row[1]).strftime("%Y-%m-%d")
-        value = float(row[2])
-        financials[(start, end)] = value
-        print(f"   ▶ ({start}, {end}) = {value}")
-
-
-    return financials
-
-# 🔧 Build EPS timeline from earnings events and net profits
-def build_eps_timeline(events, financials, shares):
-    eps_timeline = []
-
-    for event in events:
-        per_end = event["period_end"]
-        per_end_date = datetime.strptime(event["period_end"], "%Y-%m-%d")  # ✅ ISO parsing
-        per_year = per_end_date.year
-        per_end_iso = per_end_date.strftime("%Y-%m-%d")  # '2024-09-30'
-
-        lookup_key = (f"{per_year}-01-01", per_end_iso)
-        print(f"🔍 Looking for key: {lookup_key}")
-        print("🔑 Available keys in financials:")
-        for key in financials.keys():
-            print("   ", key)
-
-        nine_m_curr = financials.get(lookup_key)
-        print("➡️ nine_m_curr:", nine_m_curr)
-
-        nine_m_prev = financials.get((f"{per_year-1}-01-01", f"{per_year-1}-09-30"))
-        fy_prev = financials.get((f"{per_year-1}-01-01", f"{per_year-1}-12-31"))
-
-        if None in (nine_m_curr, nine_m_prev, fy_prev):
-            print(f"⚠️ Missing financial data for event on {event['event_date']} — skipping.")
-            continue
-
-        q4_prev = fy_prev - nine_m_prev
-        net_profit_ttm = nine_m_curr + q4_prev
-        eps_ttm = net_profit_ttm / shares
-
-        eps_timeline.append({
-            "from_date": event["event_date"],
-            "eps_ttm": eps_ttm
-        })
-    print(eps_timeline)
-    print(f"✅ Built EPS timeline with {len(eps_timeline)} entries.")
-    return eps_timeline
-
-
-def update_eps_in_stock_data(ticker, eps_timeline):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    for i in range(len(eps_timeline)):
-        start_date = eps_timeline[i]["from_date"]
-        end_date = eps_timeline[i + 1]["from_date"] if i + 1 < len(eps_timeline) else None
-        eps = eps_timeline[i]["eps_ttm"]
-
-        if end_date:
-            print(f"🟦 Updating EPS from {start_date} to {end_date} (excluding)... EPS = {eps}")
-            cursor.execute("""
-                UPDATE stock_data
-                SET eps_ttm = ?
-                WHERE company_ticker = ? AND date >= ? AND date < ?
-            """, (eps, ticker, start_date, end_date))
-        else:
-            print(f"🟩 Updating EPS from {start_date} onward... EPS = {eps}")
-            cursor.execute("""
-                UPDATE stock_data
-                SET eps_ttm = ?
-                WHERE company_ticker = ? AND date >= ?
-            """, (eps, ticker, start_date))
-
-    conn.commit()
-    conn.close()
-    print("✅ EPS values updated in stock_data.")
-
-def update_pe_ratio(ticker):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    print(f"🔄 Updating P/E ratio for {ticker}...")
-
-    # Only update where eps_ttm is valid (non-null and non-zero)
-    cursor.execute("""
-        UPDATE stock_data
-        SET pe_ratio = close_price / eps_ttm
-        WHERE company_ticker = ? AND eps_ttm IS NOT NULL AND eps_ttm != 0
-    """, (ticker,))
-
-    conn.commit()
-    conn.close()
-
-    print("✅ P/E ratio updated in stock_data.")
-
-def compute_yoy(df, current_date, current_price, threshold_days=5):
-    one_year_ago = current_date - timedelta(days=365)
-    df["delta"] = (df["date"] - one_year_ago).abs()
-    closest_row = df.loc[df["delta"].idxmin()]
-    
-    if closest_row["delta"].days > threshold_days:
-        return None  # Too far, don't compute
-
-    prev_price = closest_row["close_price"]
-    return ((current_price - prev_price) / prev_price) * 100 if prev_price else None
-
-
-def compute_ytd(df, current_date, current_price, threshold_days=5):
-    jan_first = datetime(current_date.year, 1, 1)
-    df["delta"] = (df["date"] - jan_first).abs()
-    closest_row = df.loc[df["delta"].idxmin()]
-    
-    if closest_row["delta"].days > threshold_days:
-        return None  # Too far from Jan 1
-
-    base_price = closest_row["close_price"]
-    return ((current_price - base_price) / base_price) * 100 if base_price else None
-
-
-def update_variations():
-    conn = sqlite3.connect(DB_PATH)
-    tickers = pd.read_sql("SELECT DISTINCT company_ticker FROM stock_data", conn)["company_ticker"]
+        WHERE event_type = 'earnings_release' AND company_ticker IN ({placeholders})
+        ORDER BY company_ticker, event_date
+    """, conn, params=list(tickers))
+
+
+# 🔍 Cumulative net profit (attributable to the group's shareholders) per reported period
+def load_net_profit(conn, tickers):
+    placeholders = ",".join("?" for _ in tickers)
+    return pd.read_sql(f"""
+        SELECT f.company_ticker, f.period_end, f.period_type, f.value
+        FROM financial_data f
+        JOIN financial_metrics m ON f.metric_name_ro = m.metric_name_ro
+        WHERE m.generalized_metric_eng = 'Net profit a.m.'
+          AND f.aggr_type = 'cml'
+          AND f.company_ticker IN ({placeholders})
+    """, conn, params=list(tickers))
+
+
+# 🔧 EPS TTM step function: the EPS in force from each earnings release onwards
+def build_eps_timeline(events, net_profit, shares_by_ticker):
+    """
+    For a release covering the cumulative period ending in month m of year Y:
+        TTM = CML(Y, m) + FY(Y-1) - CML(Y-1, m)      (TTM = FY(Y) for a year-end release)
+    Releases whose inputs are missing are dropped, so the previous EPS stays in force.
+    Returns company_ticker, from_date, eps_ttm sorted by from_date.
+    """
+    profit = net_profit.copy()
+    profit["period_end"] = pd.to_datetime(profit["period_end"])
+    profit["value"] = profit["value"].astype(float)
+    # Same period_end reported twice: prefer the annual figure, as the header card does
+    profit = (
+        profit.sort_values("period_type", key=lambda s: s.eq("annual"))
+        .drop_duplicates(["company_ticker", "period_end"], keep="last")
+        .set_index(["company_ticker", "period_end"])["value"]
+    )
+
+    timeline = events.copy()
+    timeline["from_date"] = pd.to_datetime(timeline["event_date"])
+    period_end = pd.to_datetime(timeline["period_end"])
+    prior_end = (period_end.dt.to_period("M") - 12).dt.to_timestamp(how="end").dt.normalize()
+    prior_year_end = pd.to_datetime((period_end.dt.year - 1).astype(str) + "-12-31")
+
+    def lookup(ends):
+        keys = pd.MultiIndex.from_arrays([timeline["company_ticker"], ends])
+        return pd.Series(profit.reindex(keys).to_numpy(), index=timeline.index)
+
+    current = lookup(period_end)
+    ttm = (current + lookup(prior_year_end) - lookup(prior_end)).where(period_end.dt.month != 12, current)
+
+    timeline["eps_ttm"] = ttm / timeline["company_ticker"].map(shares_by_ticker)
+    timeline = timeline.dropna(subset=["eps_ttm"])
+    return (
+        timeline.sort_values(["from_date", "period_end"])
+        .drop_duplicates(["company_ticker", "from_date"], keep="last")
+        [["company_ticker", "from_date", "eps_ttm"]]
+        .reset_index(drop=True)
+    )
+
+
+def _nullable(value):
+    return None if pd.isna(value) else float(value)
+
+
+# 🔄 eps_ttm and pe_ratio for every price row, written together
+def update_eps_and_pe(tickers=None):
+    """
+    Joins every price to the EPS TTM in force on that date (as-of join on the earnings release dates)
+    and writes eps_ttm and pe_ratio in one transaction. Only rows whose values change are written.
+    """
+    if tickers is None:
+        tickers = list(SHARES_BY_TICKER)
+    elif isinstance(tickers, str):
+        tickers = [tickers]
+
+    missing = [t for t in tickers if not SHARES_BY_TICKER.get(t)]
+    for ticker in missing:
+        print(f"❌ Number of shares not defined for {ticker}")
+    tickers = [t for t in tickers if t not in missing]
+    if not tickers:
+        return 0
+
+    placeholders = ",".join("?" for _ in tickers)
+    with read_connection() as conn:
+        events = load_earnings_events(conn, tickers)
+        net_profit = load_net_profit(conn, tickers)
+        prices = pd.read_sql(f"""
+            SELECT company_ticker, date, close_price, eps_ttm AS old_eps, pe_ratio AS old_pe
+            FROM stock_data
+            WHERE company_ticker IN ({placeholders})
+        """, conn, params=tickers)
+
+    timeline = build_eps_timeline(events, net_profit, SHARES_BY_TICKER)
+    print(f"📊 EPS timeline: {len(timeline)} release(s) with a computable TTM out of {len(events)}")
+
+    prices["as_of"] = pd.to_datetime(prices["date"])
+    prices = pd.merge_asof(
+        prices.sort_values("as_of"), timeline,
+        left_on="as_of", right_on="from_date", by="company_ticker", direction="backward",
+    )
+    eps = prices["eps_ttm"]
+    prices["pe_ratio"] = prices["close_price"] / eps.where(eps != 0)
+
+    def differs(new, old):
+        return (new != old) & ~(new.isna() & old.isna())
+
+    changed = prices[differs(prices["eps_ttm"], prices["old_eps"]) | differs(prices["pe_ratio"], prices["old_pe"])]
+    records = [
+        (_nullable(e), _nullable(pe), ticker, date)
+        for e, pe, ticker, date in zip(changed["eps_ttm"], changed["pe_ratio"], changed["company_ticker"], changed["date"])
+    ]
+
+    with write_connection() as conn:
+        conn.executemany("""
+            UPDATE stock_data
+            SET eps_ttm = ?, pe_ratio = ?
+            WHERE company_ticker = ? AND date = ?
+        """, records)
+        refresh_latest_snapshot(conn, sorted(prices["company_ticker"].unique()))
+        if records:
+            bump_data_version(conn, changed["company_ticker"].unique())
+
+    print(f"✅ EPS TTM and P/E updated: {len(records)} of {len(prices)} price row(s) changed.")
+    return len(records)
+
+
+VARIATION_THRESHOLD_DAYS = 5
+# YoY / YTD reference prices sit at most a year (+ threshold) before the row they are used for
+VARIATION_LOOKBACK_DAYS = 365 + VARIATION_THRESHOLD_DAYS + 1
+
+
+def _reference_prices(prices, targets, threshold_days=VARIATION_THRESHOLD_DAYS):
+    """
+    Close price of the trading day nearest to each target date (ties go to the earlier day),
+    or NaN when the nearest trading day is more than `threshold_days` away.
+    `prices` is sorted by date and `targets` must be sorted as well.
+    """
+    matched = pd.merge_asof(
+        pd.DataFrame({"target": targets.to_numpy()}),
+        prices[["date", "close_price"]],
+        left_on="target",
+        right_on="date",
+        direction="nearest",
+        tolerance=pd.Timedelta(days=threshold_days),
+    )
+    return matched["close_price"].to_numpy()
+
+
+def _percent_change(current, base):
+    base = pd.Series(base, index=current.index).replace(0, float("nan"))
+    return (current - base) / base * 100
+
+
+def compute_yoy(prices, threshold_days=VARIATION_THRESHOLD_DAYS):
+    """Change vs. the close nearest to 365 days earlier, for every row of `prices` (sorted by date)."""
+    base = _reference_prices(prices, prices["date"] - pd.Timedelta(days=365), threshold_days)
+    return _percent_change(prices["close_price"], base)
+
+
+def compute_ytd(prices, threshold_days=VARIATION_THRESHOLD_DAYS):
+    """Change vs. the close nearest to 1 January of the row's year, for every row of `prices` (sorted by date)."""
+    base = _reference_prices(prices, prices["date"].dt.to_period("Y").dt.start_time, threshold_days)
+    return _percent_change(prices["close_price"], base)
+
+
+def _round_or_none(value):
+    return round(value, 2) if not pd.isna(value) else None
+
+
+def update_variations(tickers=None, full=False):
+    """
+    Fills change_day / change_yoy / change_ytd in stock_data.
+
+    Recomputes from the earliest row whose change_day is NULL (new rows, and rows whose price changed anywhere
+    in the history; a ticker's first row never has one) to the last row, reading just enough history before it
+    for the reference prices. Only rows whose values change are written. `full=True` recomputes everything.
+    """
+    with read_connection() as conn:
+        if tickers is None:
+            tickers = pd.read_sql("SELECT DISTINCT company_ticker FROM stock_data", conn)["company_ticker"]
+        elif isinstance(tickers, str):
+            tickers = [tickers]
 
     for ticker in tickers:
-        df = pd.read_sql(f"SELECT date, close_price FROM stock_data WHERE company_ticker = '{ticker}'", conn)
-        df["date"] = pd.to_datetime(df["date"])
-        df = df.sort_values("date").reset_index(drop=True)
+        with read_connection() as conn:
+            first_stale = None if full else conn.execute("""
+                SELECT MIN(date) FROM stock_data
+                WHERE company_ticker = ? AND change_day IS NULL
+                  AND date > (SELECT MIN(date) FROM stock_data WHERE company_ticker = ?)
+            """, (ticker, ticker)).fetchone()[0]
+            if not full and first_stale is None:
+                print(f"✅ {ticker} variations already up to date")
+                continue
+            window_start = "" if full else (
+                pd.Timestamp(first_stale) - pd.Timedelta(days=VARIATION_LOOKBACK_DAYS)
+            ).strftime("%Y-%m-%d")
+            df = pd.read_sql("""
+                SELECT date, close_price, change_day AS old_day, change_yoy AS old_yoy, change_ytd AS old_ytd
+                FROM stock_data WHERE company_ticker = ? AND date >= ? ORDER BY date
+            """, conn, params=(ticker, window_start))
 
-        df["change_day"] = df["close_price"].pct_change() * 100
+        df["date"] = pd.to_datetime(df["date"])
+        df["change_day"] = (df["close_price"].pct_change() * 100).round(2)
+        df["change_yoy"] = compute_yoy(df).round(2)
+        df["change_ytd"] = compute_ytd(df).round(2)
+
+        if not full:
+            df = df[df["date"] >= pd.Timestamp(first_stale)]
+        changed = pd.Series(False, index=df.index)
+        for column, old in (("change_day", "old_day"), ("change_yoy", "old_yoy"), ("change_ytd", "old_ytd")):
+            changed |= (df[column] != df[old]) & ~(df[column].isna() & df[old].isna())
+        df = df[changed]
+        if df.empty:
+            print(f"✅ {ticker} variations already up to date")
+            continue
 
-        df["change_yoy"] = df.apply(lambda row: compute_yoy(df, row["date"], row["close_price"]), axis=1)
-        df["change_ytd"] = df.apply(lambda row: compute_ytd(df, row["date"], row["close_price"]), axis=1)
+        records = [
+            (_round_or_none(day), _round_or_none(yoy), _round_or_none(ytd), ticker, date)
+            for day, yoy, ytd, date in zip(
+                df["change_day"], df["change_yoy"], df["change_ytd"], df["date"].dt.strftime("%Y-%m-%d")
+            )
+        ]
 
-        # Update the table row-by-row
-        for _, row in df.iterrows():
-            update_query = """
-                UPDATE stock_data 
+        with write_connection() as conn:
+            conn.executemany("""
+                UPDATE stock_data
                 SET change_day = ?, change_yoy = ?, change_ytd = ?
                 WHERE company_ticker = ? AND date = ?
-            """
-            conn.execute(update_query, (
-                round(row["change_day"], 2) if not pd.isna(row["change_day"]) else None,
-                round(row["change_yoy"], 2) if not pd.isna(row["change_yoy"]) else None,
-                round(row["change_ytd"], 2) if not pd.isna(row["change_ytd"]) else None,
-                ticker,
-                row["date"].strftime("%Y-%m-%d")
-            ))
-
-        conn.commit()
-        print(f"✅ Updated {ticker}")
+            """, records)
+            refresh_latest_snapshot(conn, [ticker])
+            bump_data_version(conn, [ticker])
 
-    conn.close()
+        print(f"✅ Updated {ticker} ({len(records)} row(s) since {first_stale or 'the first price'})")
 
 
 if __name__ == "__main__":
-    
-    initialize_stock_table()
-    # Fetch historical price & volume data and populate stock_data table
-    for ticker in TICKERS:
-        fetch_and_store_stock_data(ticker)
-
-        # Get earnings events and financial results
-        events = get_events(ticker)
-        financials = get_financials(ticker)
+    from price_downloader import download_prices
 
-        shares = SHARES_BY_TICKER[ticker]
-        # Compute EPS timeline
-        eps_timeline = build_eps_timeline(events, financials, shares)
-
-        for eps in eps_timeline:
-            print(f"📅 From {eps['from_date']}: EPS_TTM = {round(eps['eps_ttm'], 4)}")
+    initialize_stock_table()
+    # Fetch new price & volume rows (the full history again when Yahoo re-adjusted it) for every ticker
+    download_prices(TICKERS)
 
-        # Update stock_data with EPS values and then compute ratios
-        update_eps_in_stock_data(ticker, eps_timeline)
-        update_pe_ratio(ticker)
-        update_variations()
\ No newline at end of file
+    # EPS TTM / P/E from earnings releases and reported net profit, then price variations
+    update_eps_and_pe(TICKERS)
+    update_variations(TICKERS)
@@ -0,0 +1,52 @@
+# test_query_plans.py
+# -------------------
+# Query-plan regression test: every hot query registered in migrations.HOT_QUERIES must be served by an
+# index on the migrated schema. A new query or migration that falls back to a full table scan fails here.
+#
+# The schema is built by copying financials.db to a temporary file and running apply_migrations on it,
+# so the test never touches the real database.
+#
+# Usage (from the repository root):
+#   python -m pytest app/test_query_plans.py
+#   python app/test_query_plans.py
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db import DB_PATH
+from migrations import HOT_QUERIES, MIGRATIONS, apply_migrations, check_query_plans, get_schema_version
+
+
+class QueryPlanTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        path = os.path.join(cls.tmp, "financials.db")
+        shutil.copyfile(DB_PATH, path)
+        cls.conn = sqlite3.connect(path)
+        apply_migrations(cls.conn)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.close()
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    def test_schema_is_current(self):
+        self.assertEqual(get_schema_version(self.conn), max(version for version, *_ in MIGRATIONS))
+        self.assertEqual(apply_migrations(self.conn), [])
+
+    def test_each_hot_query_uses_an_index(self):
+        for name, query in HOT_QUERIES.items():
+            with self.subTest(query=name):
+                self.assertEqual(check_query_plans(self.conn, {name: query}), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,242 +1,380 @@
 import os
+import numpy as np
 import pandas as pd
-import sqlite3
+from contextlib import contextmanager
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
+from db import DATA_DIR, DB_PATH, read_connection, write_connection
+from chart_series import refresh_chart_series
+from data_versions import bump_data_version
+from display_periods import PERIOD_COLUMNS, period_columns
+from latest_snapshot import refresh_latest_snapshot
+from numeric_values import normalize_numeric_column, quarantine_rows
+from incremental import run_incremental_recompute
 
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Path to app/ directory
-DATA_DIR = os.path.join(BASE_DIR, "data")  # Path to data/
 COMPANY_INFO_FILE = os.path.join(DATA_DIR, "company_info.csv")  # Full path to CSV
-DB_PATH = os.path.join(DATA_DIR, "financials.db")  # Full path to database
 
-# ========================== CONVERSION UTILITIES =================================================================
-def convert_excel_to_csv(ticker, statement_type, base_dir):
-    excel_file = os.path.join(base_dir, ticker, f"{ticker}_{statement_type}_history.xlsx")
-    csv_file = os.path.join(base_dir, ticker, f"{ticker}_{statement_type}_history.csv")
-    
+# ========================== WORKBOOK TO LONG FORMAT =============================================================
+# A statement workbook has STATEMENT_METADATA_ROWS rows of period metadata (company_ticker, period_start, ...)
+# followed by one row per metric, with one column per period. It is read and reshaped in memory.
+STATEMENT_METADATA_ROWS = 10
+
+
+def statement_workbook_path(ticker, statement_type, base_dir):
+    return os.path.join(base_dir, ticker, f"{ticker}_{statement_type}_history.xlsx")
+
+
+def read_statement_workbook(excel_file):
     if not os.path.exists(excel_file):
         print(f"❌ Excel file not found: {excel_file}")
         return None
-    
-    print(f"📥 Converting Excel to CSV: {excel_file} → {csv_file}")
-    df = pd.read_excel(excel_file, header=None)
-    df.to_csv(csv_file, index=False, header=False)  # Match your CSV format (no header)
-    print("✅ Excel converted to CSV.")
-    return csv_file
-
-def convert_csv_to_long_format(input_file, output_file, metadata_rows=10):
-    print("📥 Reading wide-format CSV...")
-    df = pd.read_csv(input_file, header=None)
-    metadata = df.iloc[:metadata_rows]
-    # Extract financial data and clean
-    df_metrics = df.iloc[metadata_rows:]
-    df_metrics[0] = df_metrics[0].astype(str).str.strip()
-    df_metrics_transposed = df_metrics.set_index(0).T
-    print("transposed metrics \n", df_metrics_transposed)
-
-    # Add metadata rows as new columns
-    for i in range(metadata_rows):
-        df_metrics_transposed[metadata.iloc[i, 0]] = metadata.iloc[i, 1:].values
-
-    metadata_columns = list(metadata.iloc[:, 0])
-    valid_metric_columns = df_metrics_transposed.columns.difference(metadata_columns, sort=False).tolist()
-    df_final = df_metrics_transposed[metadata_columns + valid_metric_columns]
- 
-    # Save the original order of metrics (columns)
-    metric_order = {name: i for i, name in enumerate(valid_metric_columns)}
-
-    df_long = df_final.melt(
-        id_vars=metadata_columns,
-        var_name="metric_name_ro",
-        value_name="value"
-    )
-    print("df_long: \n", df_long)
-    
-    df_long["line_order"] = df_long["metric_name_ro"].map(metric_order)
+
+    print(f"📥 Reading statement workbook: {excel_file}")
+    return pd.read_excel(excel_file, header=None)
+
+
+def _iso_dates(values):
+    """Date cells (datetimes, or text such as "2024-03-31 00:00:00") as "YYYY-MM-DD"; anything else becomes NaN."""
+    return pd.to_datetime(values, errors="coerce", format="mixed").dt.strftime("%Y-%m-%d")
+
+
+def statement_to_long_format(df, metadata_rows=STATEMENT_METADATA_ROWS):
+    """
+    Reshapes a wide statement sheet into one row per (metric, period): the metadata rows become columns,
+    line_order is the position of the metric in the sheet (repeated names share the first one and are kept
+    together) and the dates are "YYYY-MM-DD". Built with array repeats instead of transpose + melt.
+    """
+    metadata_columns = list(df.iloc[:metadata_rows, 0])
+    periods = df.iloc[:metadata_rows, 1:].T.reset_index(drop=True)
+    periods.columns = metadata_columns
+    for column in ("period_start", "period_end"):
+        if column in periods.columns:
+            periods[column] = _iso_dates(periods[column])
+
+    # Extract financial data and clean (rows named like a metadata row are not metrics)
+    names = df.iloc[metadata_rows:, 0].astype(str).str.strip()
+    is_metric = ~names.isin(metadata_columns).to_numpy()
+    line_order, _ = pd.factorize(names[is_metric], use_na_sentinel=False)
+    rows = np.argsort(line_order, kind="stable")
+    values = df.iloc[metadata_rows:, 1:].to_numpy(dtype=object)[is_metric][rows]
+
+    df_long = periods.iloc[np.tile(np.arange(len(periods)), len(rows))].reset_index(drop=True)
+    df_long["metric_name_ro"] = np.repeat(names.to_numpy()[is_metric][rows], len(periods))
+    df_long["value"] = values.ravel()
+    df_long["line_order"] = np.repeat(line_order[rows], len(periods))
 
     # Optional: Remove rows with missing metric names or values
     df_long = df_long.dropna(subset=["metric_name_ro", "value"], how="all")
 
-    df_long.to_csv(output_file, index=False)
-    print("✅ CSV successfully transformed to long format!")
+    print(f"✅ Statement reshaped to long format: {line_order.max() + 1 if len(rows) else 0} metrics × {len(periods)} periods")
     return df_long
 
 # ============================== DATABASE UPDATE ==================================================================
-def update_financials_db_from_csv(output_file, DB_PATH, ticker, statement_name):
-    print("🗃️ Updating SQLite database...")
+# Columns of the financial_data UNIQUE constraint
+FINANCIAL_DATA_KEY = [
+    "company_ticker", "statement_name", "statement_type", "period_start", "period_end",
+    "period_type", "aggr_type", "currency", "metric_name_ro"
+]
+FINANCIAL_DATA_COLUMNS = FINANCIAL_DATA_KEY + ["value", "metric_parent", "last_updated", "line_order"] + PERIOD_COLUMNS
+
+# Rows are loaded into this per-connection table, then merged into financial_data with set-based statements
+STAGING_TABLE = "financial_data_staging"
+_STAGED_ROW = " AND ".join(f"f.{column} = s.{column}" for column in FINANCIAL_DATA_KEY)
+_STAGED_ROW_CHANGED = """(
+    f.value IS NOT s.value
+    OR f.metric_parent IS NOT s.metric_parent
+    OR f.line_order IS NOT s.line_order
+    OR f.display_period IS NOT s.display_period
+)"""
+
+
+def _to_records(df):
+    """
+    Rows of `df` as plain tuples for executemany, with NaN / NaT turned into None (NULL).
+    """
+    return list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+
+
+@contextmanager
+def staged_financial_data(conn, df):
+    """
+    Loads `df` (FINANCIAL_DATA_COLUMNS, plus an optional boolean "reported" column) into the temporary staging
+    table on `conn` for the duration of the block. A row is "reported" when the file has a value for it, even one
+    that could not be stored; rows without a value (NULL) are staged only to mark their period as present.
+    Without the column every row counts as reported.
+
+    There is one staged row per key: a row with a value wins over one without, and otherwise the last one wins,
+    as with row-by-row upserts.
+    """
+    reported = df["reported"] if "reported" in df.columns else pd.Series(True, index=df.index)
+    rank = df["value"].notna().astype(int) + reported.astype(int)
+    staged = (
+        df.assign(reported=reported, _rank=rank)
+        .sort_values("_rank", kind="stable")
+        .drop_duplicates(subset=FINANCIAL_DATA_KEY, keep="last")
+    )
+    columns = FINANCIAL_DATA_COLUMNS + ["reported"]
 
-    df = pd.read_csv(output_file)
-    print(df)
-    print("📎 BEFORE enforcing statement_name:", df["statement_name"].unique() if "statement_name" in df.columns else "Column not found")
+    conn.execute(f"DROP TABLE IF EXISTS temp.{STAGING_TABLE}")
+    conn.execute(f"""
+        CREATE TEMP TABLE {STAGING_TABLE} AS
+        SELECT {', '.join(FINANCIAL_DATA_COLUMNS)}, 1 AS reported FROM financial_data WHERE 0
+    """)
+    try:
+        conn.executemany(f"""
+            INSERT INTO temp.{STAGING_TABLE} ({', '.join(columns)})
+            VALUES ({', '.join('?' for _ in columns)})
+        """, _to_records(staged[columns]))
+        conn.execute(f"CREATE UNIQUE INDEX temp.{STAGING_TABLE}_key ON {STAGING_TABLE} ({', '.join(FINANCIAL_DATA_KEY)})")
+        yield
+    finally:
+        conn.execute(f"DROP TABLE IF EXISTS temp.{STAGING_TABLE}")
+
+
+def merge_staged_financial_data(conn):
+    """
+    Merges the staged rows that have a value into financial_data with one INSERT ... ON CONFLICT DO UPDATE,
+    restricted to new and changed rows: identical rows are not touched, so the change-log triggers only see
+    real changes. Returns {"inserted", "updated", "unchanged"}.
+    """
+    inserted, updated, unchanged = conn.execute(f"""
+        SELECT
+            COALESCE(SUM(f.id IS NULL), 0),
+            COALESCE(SUM(f.id IS NOT NULL AND {_STAGED_ROW_CHANGED}), 0),
+            COALESCE(SUM(f.id IS NOT NULL AND NOT {_STAGED_ROW_CHANGED}), 0)
+        FROM temp.{STAGING_TABLE} s
+        LEFT JOIN financial_data f ON {_STAGED_ROW}
+        WHERE s.value IS NOT NULL
+    """).fetchone()
+
+    if inserted or updated:
+        conn.execute(f"""
+            INSERT INTO financial_data ({', '.join(FINANCIAL_DATA_COLUMNS)})
+            SELECT {', '.join('s.' + column for column in FINANCIAL_DATA_COLUMNS)}
+            FROM temp.{STAGING_TABLE} s
+            LEFT JOIN financial_data f ON {_STAGED_ROW}
+            WHERE s.value IS NOT NULL AND (f.id IS NULL OR {_STAGED_ROW_CHANGED})
+            ON CONFLICT ({', '.join(FINANCIAL_DATA_KEY)}) DO UPDATE SET
+                value = excluded.value,
+                metric_parent = excluded.metric_parent,
+                last_updated = excluded.last_updated,
+                line_order = excluded.line_order,
+                fiscal_year = excluded.fiscal_year,
+                fiscal_quarter = excluded.fiscal_quarter,
+                period_months = excluded.period_months,
+                display_period = excluded.display_period
+        """)
+    return {"inserted": inserted, "updated": updated, "unchanged": unchanged}
+
+
+def delete_unreported_financial_data(conn, ticker, statement_name):
+    """
+    Deletes the rows of the statement that are not staged as reported, in the (period_type, aggr_type) pairs
+    that are staged (generated QTL rows are left to generate_qtl_from_cml). Returns the number of rows deleted.
+    """
+    return conn.execute(f"""
+        DELETE FROM financial_data
+        WHERE company_ticker = ? AND statement_name = ?
+          AND (period_type, aggr_type) IN (SELECT period_type, aggr_type FROM temp.{STAGING_TABLE})
+          AND NOT EXISTS (
+              SELECT 1 FROM temp.{STAGING_TABLE} s
+              WHERE s.reported AND {_STAGED_ROW.replace('f.', 'financial_data.')}
+          )
+    """, (ticker, statement_name)).rowcount
+
+
+def update_financials_db(df, DB_PATH, ticker, statement_name, source):
+    """
+    Loads one statement in long format (see statement_to_long_format) into financial_data in a single
+    transaction: staged, merged and pruned of the rows the statement no longer reports, so readers never see
+    it half-loaded. `source` names the file in financial_data_quarantine.
+    Returns {"inserted", "updated", "unchanged", "removed", "quarantined"}.
+    """
+    print("🗃️ Updating SQLite database...")
 
     ticker = ticker.strip().upper()
     statement_name = statement_name.strip()
+    df = df.copy()
     df["company_ticker"] = df["company_ticker"].astype(str).str.strip().str.upper()
     df["statement_name"] = statement_name
     df["metric_name_ro"] = df["metric_name_ro"].astype(str).str.strip()
-
-
-    # Convert date columns to the correct format: YYYY-MM-DD
-    df["period_start"] = pd.to_datetime(df["period_start"], format="%Y-%m-%d %H:%M:%S", errors="coerce").dt.strftime("%Y-%m-%d")
-    df["period_end"] = pd.to_datetime(df["period_end"], format="%Y-%m-%d %H:%M:%S", errors="coerce").dt.strftime("%Y-%m-%d")
+    df[PERIOD_COLUMNS] = period_columns(df)
 
     # Get mapping from financial_metrics
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT metric_name_ro, metric_parent FROM financial_metrics WHERE metric_parent IS NOT NULL
-    """)
-    metric_map = {row[0]: row[1] for row in cursor.fetchall()}
+    with read_connection(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT metric_name_ro, metric_parent FROM financial_metrics WHERE metric_parent IS NOT NULL
+        """)
+        metric_map = {row[0]: row[1] for row in cursor.fetchall()}
 
     # Add metric_parent and last_updated to DataFrame
     df["metric_parent"] = df["metric_name_ro"].map(metric_map)
     df["last_updated"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    # DELETE existing entries
-    cursor.execute("""
-        DELETE FROM financial_data
-        WHERE company_ticker = ? AND statement_name = ?
-    """, (ticker, statement_name))
-    print("🧹 Existing entries deleted.")
-
-    # Insert each row
-    for _, row in df.iterrows():
-        cursor.execute("""
-            INSERT OR REPLACE INTO financial_data (
-                company_ticker, statement_name, statement_type, period_start,
-                period_end, period_type, aggr_type, currency, metric_name_ro, value,
-                metric_parent, last_updated, line_order
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            row["company_ticker"], row["statement_name"], row["statement_type"],
-            row["period_start"], row["period_end"], row["period_type"],
-            row["aggr_type"], row["currency"], row["metric_name_ro"], row["value"],
-            row.get("metric_parent"), row.get("last_updated"), row.get("line_order")
-        ))
-
-    conn.commit()
-    conn.close()
-
-    print(f"✅ Database updated: {len(df)} rows inserted for {ticker} - {statement_name}")
+    if "line_order" not in df.columns:
+        df["line_order"] = None
+
+    # Typed values only: blank cells are not stored, unparsable ones go to the quarantine
+    df["raw_value"] = df["value"]
+    df["value"], unparsable = normalize_numeric_column(df["value"])
+    quarantined = df[unparsable]
+    # A quarantined cell keeps whatever value is stored for it, so it counts as still reported
+    df["reported"] = df["value"].notna() | unparsable
+
+    with write_connection(DB_PATH) as conn:
+        with staged_financial_data(conn, df):
+            counts = merge_staged_financial_data(conn)
+            counts["removed"] = delete_unreported_financial_data(conn, ticker, statement_name)
+        counts["quarantined"] = quarantine_rows(conn, quarantined, source)
+
+        refresh_latest_snapshot(conn, [ticker])
+        refresh_chart_series(conn, [ticker])
+        bump_data_version(conn, [ticker])
+
+    print(f"✅ Database updated for {ticker} - {statement_name}: {counts['inserted']} inserted, "
+          f"{counts['updated']} updated, {counts['unchanged']} unchanged, {counts['removed']} removed")
+    if len(quarantined):
+        print(f"⚠️ {len(quarantined)} unparsable value(s) quarantined in financial_data_quarantine, e.g. "
+              f"{quarantined['metric_name_ro'].iloc[0]!r} = {quarantined['raw_value'].iloc[0]!r}")
+    return counts
 
 # ============================================= QTL GENERATOR =========================================================================
-def generate_qtl_from_cml(db_path):
-    print("🔄 Generating QTL values from CML...")
+# A quarterly (QTL) value is the difference between two consecutive cumulative (CML) values of the same series:
+# 6M - 3M = Q2, 9M - 6M = Q3, FY - 9M = Q4. Q1 needs no row (its CML value already is the quarter).
+QTL_SERIES_KEY = ["company_ticker", "statement_name", "statement_type", "currency", "metric_name_ro"]
+
+
+def _month_end_months_back(dates, months):
+    """
+    Vectorized (date - `months` months), snapped to the month end.
+    """
+    month_index = dates.dt.year * 12 + (dates.dt.month - 1) - months
+    first_of_month = pd.to_datetime({"year": month_index // 12, "month": month_index % 12 + 1, "day": 1})
+    return first_of_month + pd.offsets.MonthEnd(0)
+
+
+def compute_qtl_from_cml(df, since=None):
+    """
+    Builds the QTL rows from a DataFrame of CML rows (financial_data layout).
+    Each row is matched with the CML row of the same series ending 3 months earlier via one merge.
+    `since` ("YYYY-MM-DD") limits the output to quarters ending on or after that date.
+    Returns a DataFrame in FINANCIAL_DATA_COLUMNS layout.
+    """
+    df = df.copy()
+    df["period_end"] = pd.to_datetime(df["period_end"]).dt.normalize()
+
+    # ❌ Skip Q1 as target (we already have CML = QTL)
+    targets = df[~((df["period_end"].dt.month == 3) & (df["period_end"].dt.day == 31))]
+    if since is not None:
+        targets = targets[targets["period_end"] >= pd.Timestamp(since)]
+    targets = targets.assign(prior_end=_month_end_months_back(targets["period_end"], 3))
 
-    conn = sqlite3.connect(db_path)
+    priors = (
+        df[QTL_SERIES_KEY + ["period_end", "value"]]
+        .drop_duplicates(subset=QTL_SERIES_KEY + ["period_end"])
+        .rename(columns={"period_end": "prior_end", "value": "prior_value"})
+    )
+    merged = targets.merge(priors, on=QTL_SERIES_KEY + ["prior_end"], how="inner")
+
+    skipped = len(targets) - len(merged)
+    if skipped:
+        print(f"⏩ Skipped {skipped} CML rows with no prior CML value 3 months earlier")
+
+    qtl = merged[QTL_SERIES_KEY].copy()
+    qtl["period_start"] = (merged["prior_end"] + pd.Timedelta(days=1)).dt.strftime("%Y-%m-%d")
+    qtl["period_end"] = merged["period_end"].dt.strftime("%Y-%m-%d")
+    qtl["period_type"] = "quarter"
+    qtl["aggr_type"] = "qtl"
+    qtl["value"] = merged["value"] - merged["prior_value"]
+    qtl["metric_parent"] = None
+    qtl["last_updated"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    qtl["line_order"] = None
+    qtl[PERIOD_COLUMNS] = period_columns(qtl)
+    return qtl[FINANCIAL_DATA_COLUMNS]
+
+
+def delete_orphaned_qtl(conn, tickers=None, since=None):
+    """
+    Deletes the QTL rows in scope (`tickers`, quarters ending on or after `since`) that are not staged, i.e. whose
+    CML value or prior CML value no longer exists. Returns the tickers that lost rows.
+    """
+    query = f"""
+        SELECT f.id FROM financial_data f
+        WHERE f.period_type = 'quarter' AND f.aggr_type = 'qtl'
+          AND f.statement_name IN ('Profit&Loss', 'Cash Flow')
+          AND NOT EXISTS (SELECT 1 FROM temp.{STAGING_TABLE} s WHERE s.value IS NOT NULL AND {_STAGED_ROW})
+    """
+    params = []
+    if tickers:
+        query += f" AND f.company_ticker IN ({','.join('?' for _ in tickers)})"
+        params += list(tickers)
+    if since is not None:
+        query += " AND f.period_end >= ?"
+        params.append(since)
+
+    removed = [row[0] for row in conn.execute(
+        f"SELECT DISTINCT company_ticker FROM financial_data WHERE id IN ({query})", params
+    ).fetchall()]
+    if removed:
+        conn.execute(f"DELETE FROM financial_data WHERE id IN ({query})", params)
+    return removed
+
+
+def generate_qtl_from_cml(db_path, tickers=None, since=None):
+    """
+    Regenerates QTL rows from CML rows for Profit&Loss and Cash Flow, and removes the QTL rows whose CML values
+    are gone, in one transaction.
+    `tickers` limits the run to some companies; `since` ("YYYY-MM-DD") to quarters ending on or after that date
+    (the CML rows of the preceding quarter are read as well, so the first quarter in scope has its prior).
+    """
+    print("🔄 Generating QTL values from CML...")
 
-    df = pd.read_sql_query("""
+    query = """
         SELECT * FROM financial_data
         WHERE aggr_type = 'cml'
           AND statement_name IN ('Profit&Loss', 'Cash Flow')
-    """, conn)
+    """
+    params = []
+    if tickers:
+        query += f" AND company_ticker IN ({','.join('?' for _ in tickers)})"
+        params += list(tickers)
+    if since is not None:
+        query += " AND period_end >= ?"
+        params.append(_month_end_months_back(pd.Series([pd.Timestamp(since)]), 3)[0].strftime("%Y-%m-%d"))
+
+    with write_connection(db_path) as conn:
+        df = pd.read_sql_query(query, conn, params=params)
+        if df.empty:
+            print("⚠️ No CML data found.")
+            qtl = pd.DataFrame(columns=FINANCIAL_DATA_COLUMNS)
+        else:
+            qtl = compute_qtl_from_cml(df, since)
+        print(f"\n🧮 Prepared {len(qtl)} QTL rows. Upserting into database...")
+
+        with staged_financial_data(conn, qtl):
+            counts = merge_staged_financial_data(conn)
+            removed = delete_orphaned_qtl(conn, tickers, since)
+        print(f"🔁 QTL rows: {counts['inserted']} inserted, {counts['updated']} updated, "
+              f"{counts['unchanged']} unchanged; stale rows removed for {len(removed)} ticker(s)")
+
+        refresh_latest_snapshot(conn, sorted(set(qtl["company_ticker"]) | set(removed)))
+        changed = set(removed) | (set(qtl["company_ticker"]) if counts["inserted"] or counts["updated"] else set())
+        if changed:
+            refresh_chart_series(conn, sorted(changed))
+            bump_data_version(conn, changed)
 
-    if df.empty:
-        print("⚠️ No CML data found.")
-        conn.close()
-        return
-
-    # Ensure datetime
-    df["period_end"] = pd.to_datetime(df["period_end"]).dt.normalize()
-    df["period_start"] = pd.to_datetime(df["period_start"]).dt.normalize()
-
-    # Sort chronologically
-    df = df.sort_values("period_end")
-
-    # Index for fast lookup
-    lookup = df.set_index([
-        "company_ticker",
-        "statement_name",
-        "statement_type",
-        "currency",
-        "metric_name_ro",
-        "period_end"
-    ])
-
-    rows_to_insert = []
-
-    for _, curr in df.iterrows():
-        curr_end = pd.to_datetime(curr["period_end"]).normalize()
-
-        # ❌ Skip Q1 as target (we already have CML = QTL)
-        if curr_end.month == 3 and curr_end.day == 31:
-            continue
-
-        # Look for prior period exactly 3 months earlier
-        # Find prior period's true month-end
-        prior_end = (curr_end - relativedelta(months=3)).replace(day=1) + pd.offsets.MonthEnd(0)
-
-
-        key = (
-            curr["company_ticker"],
-            curr["statement_name"],
-            curr["statement_type"],
-            curr["currency"],
-            curr["metric_name_ro"],
-            prior_end
-        )
-
-        try:
-            prev = lookup.loc[key]
-        except KeyError:
-            print(f"⏩ Skipping {curr_end.date()} — no prior CML found at {prior_end.date()}")
-            continue
-
-        qtl_value = curr["value"] - prev["value"]
-
-        rows_to_insert.append({
-            "company_ticker": curr["company_ticker"],
-            "statement_name": curr["statement_name"],
-            "statement_type": curr["statement_type"],
-            "period_type": "quarter",
-            "aggr_type": "qtl",
-            "currency": curr["currency"],
-            "metric_name_ro": curr["metric_name_ro"],
-            "value": qtl_value,
-            "period_start": (prior_end + pd.Timedelta(days=1)).strftime("%Y-%m-%d"),
-            "period_end": curr_end.strftime("%Y-%m-%d"),
-            "metric_parent": None,
-            "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        })
-
-        print(f"✅ QTL: {curr['metric_name_ro']} | {curr['company_ticker']} | {rows_to_insert[-1]['period_start']} → {rows_to_insert[-1]['period_end']} | Δ = {qtl_value:.2f}")
-
-    print(f"\n🧮 Prepared {len(rows_to_insert)} QTL rows. Inserting into database...")
-
-    cursor = conn.cursor()
-    for row in rows_to_insert:
-        cursor.execute("""
-            INSERT OR REPLACE INTO financial_data (
-                company_ticker, statement_name, statement_type,
-                period_start, period_end, period_type, aggr_type,
-                currency, metric_name_ro, value,
-                metric_parent, last_updated
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            row["company_ticker"], row["statement_name"], row["statement_type"],
-            row["period_start"], row["period_end"], row["period_type"], row["aggr_type"],
-            row["currency"], row["metric_name_ro"], row["value"],
-            row["metric_parent"], row["last_updated"]
-        ))
-
-    conn.commit()
-    conn.close()
     print("✅ QTL generation complete and stored in financial_data.")
 
 
 # ===================================== DEBUGGING & CHECKING ========================================================
 
 def check_db_entries(DB_PATH, ticker, statement_name):
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query("""
-        SELECT * FROM financial_data
-        WHERE company_ticker = ? AND statement_name = ?
-    """, conn, params=(ticker, statement_name))
-    conn.close()
+    with read_connection(DB_PATH) as conn:
+        df = pd.read_sql_query("""
+            SELECT * FROM financial_data
+            WHERE company_ticker = ? AND statement_name = ?
+        """, conn, params=(ticker, statement_name))
 
     print(f"📊 Found {len(df)} entries in DB for {ticker} - {statement_name}")
     return df
@@ -265,14 +403,18 @@ def main():
     statement_name = statement_names[statement_code]
     base_dir = r"C:\Users\irina\Project Element\Data source"
 
-    convert_excel_to_csv(ticker, statement_code, base_dir)
-    input_file = os.path.join(base_dir, ticker, f"{ticker}_{statement_code}_history.csv")
-    output_file = os.path.join(base_dir, ticker, f"{ticker}_{statement_code}_history_long.csv")
+    excel_file = statement_workbook_path(ticker, statement_code, base_dir)
+    df_wide = read_statement_workbook(excel_file)
+    if df_wide is None:
+        return
 
-    convert_csv_to_long_format(input_file, output_file)
-    update_financials_db_from_csv(output_file, DB_PATH, ticker, statement_name)
-    generate_qtl_from_cml(DB_PATH)
+    df_long = statement_to_long_format(df_wide)
+    update_financials_db(df_long, DB_PATH, ticker, statement_name, os.path.basename(excel_file))
+    generate_qtl_from_cml(DB_PATH, tickers=[ticker])
     check_db_entries(DB_PATH, ticker, statement_name)
 
+    # Recompute only the derived metrics and ratios whose inputs changed
+    run_incremental_recompute(DB_PATH)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file